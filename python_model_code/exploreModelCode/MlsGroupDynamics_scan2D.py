@@ -52,6 +52,14 @@ mainName = 'scan2D_Jan23'
 offspr_sizeVec = np.arange(0.01, 0.5, 0.034)
 offspr_fracVec = np.arange(0.01, 1, 0.07) 
 
+#set adaptive refinement: scan starts on coarse grid with every 2^refine_levels-th point
+#of grid above, and refines cells where outputs at corners differ by more than threshold
+#or where extinction status differs, other points are interpolated from cells whose corners
+#are all simulated (isSimulated in output marks simulated points)
+use_adaptive = False
+refine_levels = 2
+refine_threshold = {'NTot_mav': 500, 'fCoop_mav': 0.05}
+
 
 #set other parameters
 model_par = {
@@ -182,9 +190,198 @@ def run_model(mainName, model_par, numCore,
     return (statData, distGrSize)
 
 
+#check if fission mode is valid
+def in_bounds(offspr_size, offspr_frac):
+    return offspr_frac >= offspr_size and offspr_frac <= (1 - offspr_size)
+
+
+#get indices of coarse grid, every stride-th index and last index
+def coarse_index(numPoint, stride):
+    idxList = list(range(0, numPoint, stride))
+    if idxList[-1] != numPoint - 1:
+        idxList.append(numPoint - 1)
+    return idxList
+
+
+#split cell (x0, x1, y0, y1) in halves along each dimension that has interior points
+def split_cell(cell):
+    x0, x1, y0, y1 = cell
+    xRange = [(x0, x1)] if x1 - x0 <= 1 else [(x0, (x0 + x1) // 2), ((x0 + x1) // 2, x1)]
+    yRange = [(y0, y1)] if y1 - y0 <= 1 else [(y0, (y0 + y1) // 2), ((y0 + y1) // 2, y1)]
+    return [(xa, xb, ya, yb) for (xa, xb) in xRange for (ya, yb) in yRange]
+
+
+#get valid corners of cell
+def cell_corners(cell, isValid):
+    x0, x1, y0, y1 = cell
+    corners = set((xx, yy) for xx in (x0, x1) for yy in (y0, y1))
+    return sorted(corner for corner in corners if isValid[corner])
+
+
+#get extinction status of runs: 0 extinct, 1 alive, 2 exceeded maxPopSize (NaN state)
+def extinction_status(cornerData):
+    return np.where(np.isnan(cornerData['NTot']), 2, cornerData['NTot'] > 0)
+
+
+#check if outputs at corners of cell differ by more than threshold
+def cell_differs(cornerData, refine_threshold):
+    # compare extinction status
+    if np.unique(extinction_status(cornerData)).size > 1:
+        return True
+    for var, threshold in refine_threshold.items():
+        values = cornerData[var]
+        if not np.all(np.isnan(values)) and np.nanmax(values) - np.nanmin(values) > threshold:
+            return True
+    return False
+
+
+#check if cell has valid points that are not simulated and need refinement
+def needs_refinement(cell, isValid, results, refine_threshold):
+    x0, x1, y0, y1 = cell
+    corners = cell_corners(cell, isValid)
+    # cell is done when all valid points are corners
+    if isValid[x0:x1+1, y0:y1+1].sum() == len(corners):
+        return False
+    # all corners are needed to interpolate, points are never extrapolated from other corners
+    if len(corners) < len(cell_corners(cell, np.ones_like(isValid))):
+        return True
+    cornerData = np.vstack([results[corner][0] for corner in corners])
+    return cell_differs(cornerData, refine_threshold)
+
+
+#interpolate results of valid points in cell from results at its corners
+#points are only interpolated when all corners they depend on are simulated and have same
+#extinction status, otherwise all fields except parameters are NaN (use isSimulated in output
+#to select simulated points), run_time is always NaN
+def interpolate_cell(cell, isValid, results, model_par, offspr_sizeVec, offspr_fracVec):
+    x0, x1, y0, y1 = cell
+    corners = cell_corners(cell, np.ones_like(isValid))
+    interpResults = {}
+    for xx in range(x0, x1 + 1):
+        for yy in range(y0, y1 + 1):
+            if not isValid[xx, yy] or (xx, yy) in results:
+                continue
+            # bilinear weights of corners, only corners with non zero weight are used
+            wx = (xx - x0) / (x1 - x0) if x1 > x0 else 0
+            wy = (yy - y0) / (y1 - y0) if y1 > y0 else 0
+            weights = np.array([(wx if cx == x1 else 1 - wx) * (wy if cy == y1 else 1 - wy)
+                                for cx, cy in corners])
+            useCorner = weights > 0
+            weights = weights[useCorner]
+            usedCorners = [corner for corner, use in zip(corners, useCorner) if use]
+            isComplete = all(corner in results for corner in usedCorners)
+            if isComplete:
+                cornerResults = [results[corner] for corner in usedCorners]
+                cornerData = np.hstack([res[0] for res in cornerResults])
+                isComplete = np.unique(extinction_status(cornerData)).size == 1
+            else:
+                cornerResults = [next(iter(results.values()))]
+
+            # weighted average of state and distributions, parameters are same at all corners
+            output = cornerResults[0][0].copy()
+            distFCoop = np.full(cornerResults[0][1].shape, np.nan)
+            distGrSize = np.full(cornerResults[0][2].shape, np.nan)
+            for field in output.dtype.names:
+                if field in model_par:
+                    continue
+                elif isComplete and field != 'run_time':
+                    output[field] = sum(ww * res[0][field] for ww, res in zip(weights, cornerResults))
+                else:
+                    output[field] = np.nan
+            if isComplete:
+                distFCoop = sum(ww * res[1] for ww, res in zip(weights, cornerResults))
+                distGrSize = sum(ww * res[2] for ww, res in zip(weights, cornerResults))
+            output['offspr_size'] = offspr_sizeVec[xx]
+            output['offspr_frac'] = offspr_fracVec[yy]
+            interpResults[(xx, yy)] = (output, distFCoop, distGrSize)
+    return interpResults
+
+
+# run model on adaptively refined grid
+def run_model_adaptive(mainName, model_par, numCore,
+                       offspr_sizeVec=offspr_sizeVec,
+                       offspr_fracVec=offspr_fracVec,
+                       refine_levels=refine_levels,
+                       refine_threshold=refine_threshold):
+    numX = offspr_sizeVec.size
+    numY = offspr_fracVec.size
+    isValid = np.array([[in_bounds(offspr_size, offspr_frac) for offspr_frac in offspr_fracVec]
+                        for offspr_size in offspr_sizeVec])
+
+    # start with cells of coarse grid
+    stride = 2 ** refine_levels
+    xIdx = coarse_index(numX, stride)
+    yIdx = coarse_index(numY, stride)
+    cellList = [(xIdx[xx], xIdx[xx+1], yIdx[yy], yIdx[yy+1])
+                for xx in range(len(xIdx) - 1) for yy in range(len(yIdx) - 1)]
+
+    results = {}
+    finalCells = []
+    while len(cellList) > 0:
+        # run model at corners that have not been simulated yet, use parallel cores
+        newPoints = sorted(set(corner for cell in cellList for corner in cell_corners(cell, isValid)
+                               if corner not in results))
+        if len(newPoints) > 0:
+            nJobs = min(len(newPoints), numCore)
+            print('refinement step with %i jobs' % len(newPoints))
+            newResults = Parallel(n_jobs=nJobs, verbose=9, timeout=1.E9)(
+                delayed(mls.single_run_finalstate)(
+                    set_fission_mode(model_par, offspr_sizeVec[xx], offspr_fracVec[yy]))
+                for xx, yy in newPoints)
+            results.update(zip(newPoints, newResults))
+
+        # split cells where outputs differ, other cells are interpolated
+        nextCellList = []
+        for cell in cellList:
+            if needs_refinement(cell, isValid, results, refine_threshold):
+                nextCellList += split_cell(cell)
+            else:
+                finalCells.append(cell)
+        cellList = nextCellList
+
+    # interpolate points that have not been simulated
+    interpResults = {}
+    for cell in finalCells:
+        cellResults = interpolate_cell(cell, isValid, results, model_par,
+                                       offspr_sizeVec, offspr_fracVec)
+        for point, result in cellResults.items():
+            interpResults.setdefault(point, result)
+    print('simulated %i of %i points' % (len(results), isValid.sum()))
+
+    # collect output in same order as run_model
+    modelParList = []
+    resultList = []
+    isSimulated = []
+    for xx in range(numX):
+        for yy in range(numY):
+            if isValid[xx, yy]:
+                modelParList.append(set_fission_mode(model_par, offspr_sizeVec[xx], offspr_fracVec[yy]))
+                resultList.append(results[(xx, yy)] if (xx, yy) in results else interpResults[(xx, yy)])
+                isSimulated.append((xx, yy) in results)
+
+    # process and store output
+    Output, endDistFCoop, endDistGrSize = zip(*resultList)
+    statData = np.vstack(Output)
+    distFCoop = np.vstack(endDistFCoop)
+    distGrSize = np.vstack(endDistGrSize)
+
+    #store output to disk
+    dataFileName = create_data_name(mainName, model_par)
+    dataFilePath = data_folder / (dataFileName + '.npz')
+    np.savez(dataFilePath, statData=statData, distFCoop=distFCoop, distGrSize=distGrSize,
+             offspr_sizeVec=offspr_sizeVec, offspr_fracVec=offspr_fracVec,
+             modelParList=modelParList, isSimulated=np.array(isSimulated),
+             date=datetime.datetime.now())
+
+    return (statData, distGrSize)
+
+
 #run parscan and make figure
 if __name__ == "__main__":
-    statData = run_model(mainName, model_par, 4)
+    if use_adaptive:
+        statData = run_model_adaptive(mainName, model_par, 4)
+    else:
+        statData = run_model(mainName, model_par, 4)
     #plotParScan.make_fig(dataFileName)
 
 
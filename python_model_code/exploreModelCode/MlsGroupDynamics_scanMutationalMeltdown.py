@@ -23,6 +23,7 @@ import sys
 sys.path.insert(0, '..')
 
 from mainCode import MlsGroupDynamics_main as mls
+from mainCode import MlsGroupDynamics_utilities as util
 from joblib import Parallel, delayed
 import numpy as np
 #import plotParScan
@@ -40,8 +41,10 @@ mainName = 'MutationMeltdown_March28'
 #set how often to repeat each condition (median value is shown in end)
 numRepeat = 3 
 
-#set  mutation rates to try
-mu_Vec = np.logspace(0,-7,29) # 8+7n
+#set range of mutation rates to search, and tolerance of max mutation rate (in log10 units)
+mu_min = 1E-7
+mu_max = 1
+mu_tol = 0.1
 
 #setup 2D parameter grid
 offspr_size_Vec = np.arange(0.01, 0.5, 0.034)
@@ -200,7 +203,7 @@ def run_meltdown_scan(model_par, numRepeat):
     #input parameters to store
     parList = ['indv_NType', 'indv_cost', 'indv_K', 
                'indv_mutR','indv_migrR', 'indv_asymmetry', 'delta_indv',
-               'gr_SFis', 'gr_CFis', 'alpha_Fis', 'K_grp', 'K_tot',
+               'gr_SFis', 'gr_CFis', 'K_grp', 'K_tot',
                'delta_grp', 'delta_tot', 'delta_size',
                'offspr_size','offspr_frac']
     
@@ -211,31 +214,19 @@ def run_meltdown_scan(model_par, numRepeat):
     for par in parList:
         outputMat[par] = model_par[par]
     
-    #loop repeats
+    #loop repeats, each repeat has own random numbers
     for rr in range(numRepeat):
-        #init state
-        idx = 0
-        hasMeltdown = True
-        #reduce mutation rate till community can survive
-        while hasMeltdown:
-            model_par['indv_mutR'] = mu_Vec[idx]
-            output, _ , _ = mls.single_run_finalstate(model_par)
-        
-            #if community survives, found max mutation burden
-            if output['NTot'][-1] > 0:
-                hasMeltdown = False
-                maxMu[rr] = model_par['indv_mutR']
-                NTot[rr] = output['NTot_mav']
-                NCoop[rr] = output['NCoop_mav']
-                NGrp[rr] = output['NGrp_mav']
-                
-            else:
-                idx += 1
-                
-            #end when lowest possible mutation rate has been reached
-            if idx >= mu_Vec.size:
-                hasMeltdown = False
-                
+        model_par_local = util.set_model_par(model_par, {'replicate_idx': rr + 1})
+        #find max mutation rate at which community can survive, with bisection
+        maxMuRep, output = mls.run_meltdown_threshold(model_par_local, mu_min, mu_max, mu_tol)
+
+        #store max mutation burden, remains NaN if community can not survive
+        if output is not None:
+            maxMu[rr] = maxMuRep
+            NTot[rr] = output['NTot_mav']
+            NCoop[rr] = output['fCoop_mav'] * output['NTot_mav']
+            NGrp[rr] = output['NGrp_mav']
+
     
     return (maxMu, NTot, NCoop, NGrp, outputMat)
 
@@ -269,7 +260,7 @@ def run_model(mainName, model_par, numRepeat):
              numRepeat  = numRepeat,
              offsprSize = offspr_size_Vec, 
              offsprFrac = offspr_frac_Vec,
-             mutR       = mu_Vec,
+             mutR       = np.array([mu_max, mu_min]),
              mode_vec   = mode_vec,
              par0_vec   = par0_vec,
              par1_vec   = par1_vec,
@@ -36,6 +36,11 @@ Define parameters
 
 numCore = 44 #number of cores to run code on
 
+#set continuation mode: each run starts from final state of neighbouring grid point
+use_continuation = False
+minT_warm = 50 #min run time of warm started runs
+verify_int = 10 #every verify_int-th warm started run is verified against cold start, 0 to skip
+
 #set name of output
 mainName = 'April13'
 
@@ -188,10 +193,26 @@ def run_model(mainName, model_par, numCore):
     modelParList = create_model_par_list(model_par)
         
     # run model, use parallel cores 
-    nJobs = min(len(modelParList), numCore)
-    print('starting with %i jobs' % len(modelParList))
-    results = Parallel(n_jobs=nJobs, verbose=9, timeout=1.E9)(
-        delayed(mls.single_run_finalstate)(par) for par in modelParList)
+    verifyResults = []
+    if use_continuation:
+        # run paths through 2D parameter grid in parallel, points on path in sequence
+        pathList = mls.continuation_paths(modelParList)
+        nJobs = min(len(pathList), numCore)
+        print('starting with %i paths' % len(pathList))
+        pathResults = Parallel(n_jobs=nJobs, verbose=9, timeout=1.E9)(
+            delayed(mls.run_model_continuation)([modelParList[idx] for idx in path],
+                                                minT_warm, verify_int) for path in pathList)
+        # put results back in order of modelParList
+        results = [None] * len(modelParList)
+        for path, (pathResult, pathVerify) in zip(pathList, pathResults):
+            for idx, result in zip(path, pathResult):
+                results[idx] = result
+            verifyResults += [(path[pp], result) for pp, result in pathVerify]
+    else:
+        nJobs = min(len(modelParList), numCore)
+        print('starting with %i jobs' % len(modelParList))
+        results = Parallel(n_jobs=nJobs, verbose=9, timeout=1.E9)(
+            delayed(mls.single_run_finalstate)(par) for par in modelParList)
 
     # process and store output
     output, distFCoop, distGrSize = zip(*results)
@@ -213,7 +234,8 @@ def run_model(mainName, model_par, numCore):
              par1       = par0_vec,
              par2       = par1_vec,
              par3       = par2_vec,
-             parList    = modelParList)
+             parList    = modelParList,
+             verifyResults = verifyResults)
 
     return None
 
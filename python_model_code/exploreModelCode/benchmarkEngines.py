@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Oct 18 2026
+
+Compare run time of direct Gillespie method, next reaction method, and tau leaping
+
+Next reaction method is included as exact reference, it is slower than direct method
+
+@author: Simon van Vliet & Gil Henriques
+Department of Zoology
+University of Britisch Columbia
+vanvliet@zoology.ubc.ca
+henriques@zoology.ubc.ca
+
+============================================================================
+Benchmark simulation engines
+============================================================================"""
+
+import sys
+sys.path.insert(0, '..')
+
+from mainCode import MlsGroupDynamics_main as mls
+from mainCode import MlsGroupDynamics_utilities as util
+import numpy as np
+import time
+
+#SET engines to compare
+engineList = ['direct', 'nrm', 'tauleap']
+
+#SET nr of replicates
+nReplicate = 3
+
+#default parameters of MlsGroupDynamics_main
+model_par_main = {
+        #time and run settings
+        "maxT":             100,  # total run time
+        "maxPopSize":       10000,  #stop simulation if population exceeds this number
+        "minT":             1,    # min run time
+        "sampleInt":        1,      # sampling interval
+        "mav_window":       10,    # average over this time window
+        "rms_window":       10,    # calc rms change over this time window
+        "rms_err_trNCoop":  1E-51,   # when to stop calculations
+        "rms_err_trNGr":    5E-51,   # when to stop calculations
+        # settings for initial condition
+        "init_groupNum":    300,     # initial # groups
+        "init_fCoop":       1,
+        "init_groupDens":   20,     # initial total cell number in group
+        # settings for individual level dynamics
+        "indv_NType":       2,
+        "indv_asymmetry":   1,      # difference in growth rate b(j+1) = b(j) / asymmetry
+        "indv_cost":        0.01,  # cost of cooperation
+        "indv_mutR":        1E-3,   # mutation rate to cheaters
+        "indv_migrR":       0,   # mutation rate to cheaters
+        "indv_K":           50,     # total group size at EQ if f_coop=1
+        "delta_indv":       1,      # zero if death rate is simply 1/k, one if death rate decreases with group size
+        # setting for group rates
+        'gr_CFis':          1/100,
+        'gr_SFis':          1/50,
+        'grp_tau':          1,
+        'delta_grp':        0,      # exponent of density dependence on group #
+        'K_grp':            0,    # carrying capacity of groups
+        'delta_tot':        1,      # exponent of density dependence on total #individual
+        'K_tot':            30000,   # carrying capacity of total individuals
+        'delta_size':       0,      # exponent of size dependence
+        # settings for fissioning
+        'offspr_size':      0.125,  # offspr_size <= 0.5 and
+        'offspr_frac':      0.8,  # offspr_size < offspr_frac < 1-offspr_size'
+        # extra settings
+        'run_idx':          1,
+        'perimeter_loc':    0
+    }
+
+#default parameters of mlsFig_scanParSpace, run for shorter time
+model_par_scan = {
+        #time and run settings
+        "maxT":             200,  # total run time
+        "maxPopSize":       1000000,  #stop simulation if population exceeds this number
+        "minT":             2500,    # min run time
+        "sampleInt":        1,      # sampling interval
+        "mav_window":       200,    # average over this time window
+        "rms_window":       200,    # calc rms change over this time window
+        "rms_err_trNCoop":  1E-2,   # when to stop calculations
+        "rms_err_trNGr":    5E-2,   # when to stop calculations
+        # settings for initial condition
+        "init_groupNum":    100,     # initial # groups
+        "init_fCoop":       1,
+        "init_groupDens":   50,     # initial total cell number in group
+        # settings for individual level dynamics
+        "indv_NType":       1,
+        "indv_asymmetry":   1,      # difference in growth rate b(j+1) = b(j) / asymmetry
+        "indv_cost":        0.01,   # cost of cooperation
+        "indv_mutR":        1E-3,   # mutation rate to cheaters
+        "indv_migrR":       0,      # mutation rate to cheaters
+        "indv_K":           100,     # total group size at EQ if f_coop=1
+        "delta_indv":       1,      # zero if death rate is simply 1/k, one if death rate decreases with group size
+        # setting for group rates
+        'gr_CFis':          0.05,
+        'gr_SFis':          0,     # measured in units of 1 / indv_K
+        'grp_tau':          1,     # constant multiplies group rates
+        'delta_grp':        0,      # exponent of density dependence on group #
+        'K_grp':            0,      # carrying capacity of groups
+        'delta_tot':        1,      # exponent of density dependence on total #individual
+        'K_tot':            1E5,    # carrying capacity of total individuals
+        'delta_size':       0,      # exponent of size dependence
+        # settings for fissioning
+        'offspr_size':      0.01,  # offspr_size <= 0.5 and
+        'offspr_frac':      0.01,    # offspr_size < offspr_frac < 1-offspr_size'
+        # extra settings
+        'run_idx':          1,
+        'replicate_idx':    1,
+        'perimeter_loc':    0
+    }
+
+
+#run model with all engines and report mean run time
+def benchmark(name, model_par):
+    for engine in engineList:
+        settings = {'engine': engine}
+        model_par_local = util.set_model_par(model_par, settings)
+        runTime = np.zeros(nReplicate)
+        finalNTot = np.zeros(nReplicate)
+        for rr in range(nReplicate):
+            start = time.time()
+            output, _, _, _, _ = mls.run_model(model_par_local)
+            runTime[rr] = time.time() - start
+            finalNTot[rr] = output['NTot'][-1]
+        print('%s - %s: run time %.2f +- %.2f s, final NTot %.0f' %
+              (name, engine, runTime.mean(), runTime.std(), finalNTot.mean()))
+    return None
+
+
+if __name__ == "__main__":
+    benchmark('main defaults', model_par_main)
+    benchmark('scanParSpace defaults', model_par_scan)
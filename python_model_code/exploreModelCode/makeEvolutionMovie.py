@@ -8,7 +8,11 @@ Code makes movie of evolution runs.
 vanvliet@zoology.ubc.ca
 """
 
+import sys
+sys.path.insert(0, '..')
+
 import numpy as np
+from mainCode import MlsGroupDynamics_utilities as util
 import matplotlib.pyplot as plt
 import matplotlib
 
@@ -70,7 +74,7 @@ def plot_heatmap(fig, ax, data, data_bg):
     return image
 
 def set_frame(frameIdx, image, dataArray, data_bg):
-    data = dataArray[frameIdx, :, :]
+    data = util.get_traitDistr_frame(dataArray, frameIdx)
     data = process_frame(data)
     
     fig, ax = plt.subplots(1, figsize=(1, 1))
@@ -83,8 +87,12 @@ def set_frame(frameIdx, image, dataArray, data_bg):
     image.set_array(a)
     return image
 
-def create_movie(data, movie_name, data_bg=None, fps=25, size=800):
-    numFrames = data.shape[0]
+# data is array of trait distributions or reader from util.load_traitDistr,
+# frames are read one at a time while movie is rendered
+# set frames to list of frame indices to only show these frames
+def create_movie(data, movie_name, data_bg=None, fps=25, size=800, frames=None):
+    if frames is None:
+        frames = np.arange(util.get_traitDistr_numFrame(data))
     
     if not data_bg is None:
         data_bg /= np.nanmax(data_bg)
@@ -95,10 +103,10 @@ def create_movie(data, movie_name, data_bg=None, fps=25, size=800):
     ax.axis("off")
 
     # Initialise plot
-    image = plot_heatmap(fig, ax, data[0, :, :], data_bg)
+    image = plot_heatmap(fig, ax, util.get_traitDistr_frame(data, frames[0]), data_bg)
 
     animation = FuncAnimation(fig, set_frame, 
-        frames=np.arange(numFrames), 
+        frames=frames, 
         fargs=(image, data, data_bg),
         interval=1000 / fps)
 
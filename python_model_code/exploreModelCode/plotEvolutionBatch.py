@@ -15,6 +15,7 @@ sys.path.insert(0, '..')
 import numpy as np
 #import plotEvolutionMovie as evomo
 from mainCode import MlsGroupDynamics_plotUtilities as pltutl
+from mainCode import MlsGroupDynamics_utilities as util
 from pathlib import Path
 import matplotlib.pyplot as plt
 import matplotlib
@@ -86,15 +87,16 @@ def add_evo_traject(ax, outputEvo):
     return None
 
 def plot_evo_heatmap_time(axs, traitDistr):
-    numT = traitDistr.shape[0]
+    numT = util.get_traitDistr_numFrame(traitDistr)
     timeColor = cm.cool(np.linspace(0, 1, numT))
     alpha = np.linspace(0.4, 0.8, numT)
     
-    xVec = np.linspace(0,0.5,traitDistr.shape[2])
-    yVec = np.linspace(0,1,traitDistr.shape[1])
+    frameShape = util.get_traitDistr_frame(traitDistr, 0).shape
+    xVec = np.linspace(0,0.5,frameShape[1])
+    yVec = np.linspace(0,1,frameShape[0])
 
     for tt in range(numT):
-        currData = traitDistr[tt, :, :]
+        currData = util.get_traitDistr_frame(traitDistr, tt)
         loc = np.nonzero(currData)
         xLoc = xVec[loc[1]]
         yLoc = yVec[loc[0]]
@@ -113,7 +115,7 @@ def plot_evo_heatmap_time(axs, traitDistr):
 
 
 def plot_evo_heatmap(ax, traitDistr):
-    currData = traitDistr[-1, :, :]
+    currData = util.get_traitDistr_frame(traitDistr, -1)
     image = ax.imshow(currData, cmap='hot',
                 interpolation='nearest',
                 extent=[0, 1, 0, 1],
@@ -172,8 +174,8 @@ for gr_SFis in gr_SFis_vec:
                 # Load evolution data
                 data_file = np.load(fileNameEv, allow_pickle=True)
                 outputEvo = data_file['output']
-                traitDistr = data_file['traitDistr']
                 data_file.close()
+                traitDistr = util.load_traitDistr(fileNameEv)
                 
 #                traitDistr = traitDistr[::20,:,:]
 #                outputEvo = outputEvo[::20]
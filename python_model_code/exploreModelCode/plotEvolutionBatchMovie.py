@@ -16,6 +16,7 @@ sys.path.insert(0, '..')
 import numpy as np
 import makeEvolutionMovie as evomo
 from mainCode import MlsGroupDynamics_plotUtilities as pltutl
+from mainCode import MlsGroupDynamics_utilities as util
 from pathlib import Path
 import glob
 
@@ -63,16 +64,14 @@ for gr_SFis in gr_SFis_vec:
             
             # plot evolution trajectories
             for fileNameEv in filesEv:
-                # Load evolution data
-                data_file = np.load(fileNameEv, allow_pickle=True)
-                traitDistr = data_file['traitDistr']
-                data_file.close()
-                
-                traitDistr = traitDistr[:,:,:]
+                # Open evolution data, frames are read when needed
+                traitDistr = util.load_traitDistr(fileNameEv)
+                numFrame = util.get_traitDistr_numFrame(traitDistr)
                 
                 figureName = fileNameEv[:-4] + '.mp4'
                 movieDir = fig_FolderPath / figureName
             
-                evomo.create_movie(traitDistr[0::10, :, :], movieDir, 
-                                   data_bg=data2D, fps=25, size=800)
+                evomo.create_movie(traitDistr, movieDir, 
+                                   data_bg=data2D, fps=25, size=800,
+                                   frames=np.arange(0, numFrame, 10))
 
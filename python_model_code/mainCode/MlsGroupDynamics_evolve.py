@@ -19,7 +19,7 @@ Import dependencies & define global constants
 ============================================================================"""
 
 from numba.types import Tuple, UniTuple
-from numba import jit, f8, i8
+from numba import jit, void, f8, i8, u8, b1
 import math
 import numpy as np
 from mainCode import MlsGroupDynamics_utilities as util
@@ -39,6 +39,8 @@ stateVar = ['NTot', 'NCoop', 'fCoop',
 
 sizeGroupMatInit = 300
 sizeGroupMatIncrement = 100
+#initial number of occupied trait bins that can be stored per group, doubles when needed
+binCapInit = 16
 
 #setup bins and vectors for group traits
 nBinOffsprSize = 100
@@ -50,6 +52,9 @@ binsOffsprFrac = np.linspace(0, 1, nBinOffsprFrac+1)
 binCenterOffsprSize = (binsOffsprSize[1::]+binsOffsprSize[0:-1])/2
 binCenterOffsprFrac = (binsOffsprFrac[1::]+binsOffsprFrac[0:-1])/2
 
+#number of trait bins per cell type
+nBinTrait = nBinOffsprFrac * nBinOffsprSize
+
 #init matrix to keep mutations inbounds
 offsprFracMatrix = np.zeros((nBinOffsprFrac, nBinOffsprSize),dtype=int)
 for ff in range(nBinOffsprFrac):
@@ -77,18 +82,143 @@ for ff in range(nBinOffsprFrac):
 Init functions 
 ============================================================================"""
 
-#enlarges 4D group trait matrix incase there are not enough empty spaces for new groups
-@jit(Tuple((f8[:, :, :, ::1], f8[::1]))(f8[:, :, :, ::1], f8[::1]), nopython=True)
-def expand_grpMat(grpMat, grpLUT):
-    matShape = grpMat.shape
-    newGrSize = matShape[1] + sizeGroupMatIncrement
+# groups are stored sparse: each group slot holds list of occupied trait bins,
+# sorted by key = (cell type * nBinOffsprFrac + fracIdx) * nBinOffsprSize + sizeIdx
+#   binKey[slot, i] is key of i-th occupied bin of group slot
+#   binCount[slot, i] is number of cells in i-th occupied bin of group slot
+#   binNum[slot] is number of occupied bins of group slot
+#   freeSlot[0] is number of free slots, freeSlot[1:freeSlot[0]+1] is stack of free slots
+# memory scales with number of occupied bins instead of with number of trait bins
+
+#create empty group store, all slots are free, lowest slot is on top of stack
+@jit(Tuple((i8[:, ::1], f8[:, ::1], i8[::1], i8[::1]))(i8, i8), nopython=True, cache=True)
+def init_grpStore(nSlot, binCap):
+    binKey = np.zeros((nSlot, binCap), dtype=np.int64)
+    binCount = np.zeros((nSlot, binCap))
+    binNum = np.zeros(nSlot, dtype=np.int64)
+    freeSlot = np.empty(nSlot + 1, dtype=np.int64)
+    freeSlot[0] = nSlot
+    freeSlot[1:] = np.arange(nSlot - 1, -1, -1)
+    return (binKey, binCount, binNum, freeSlot)
+
+
+#enlarges group store incase there are not enough empty slots for new groups
+@jit(Tuple((i8[:, ::1], f8[:, ::1], i8[::1], i8[::1], i8[::1], i8[::1]))
+     (i8[:, ::1], f8[:, ::1], i8[::1], i8[::1], i8[::1], i8[::1]), nopython=True, cache=True)
+def expand_grpStore(binKey, binCount, binNum, freeSlot, grpLUT, slotLUT):
+    nSlot, binCap = binKey.shape
+    newNSlot = nSlot + sizeGroupMatIncrement
     #create new matrices
-    grpMatNew = np.zeros((matShape[0], newGrSize, matShape[2], matShape[3]))
-    grpLUTNew = np.full(newGrSize, np.nan)
+    binKeyNew, binCountNew, binNumNew, freeSlotNew = init_grpStore(newNSlot, binCap)
+    grpLUTNew = np.full(newNSlot, -1, dtype=np.int64)
+    slotLUTNew = np.full(newNSlot, -1, dtype=np.int64)
     #store old values
-    grpMatNew[:, 0:matShape[1], :, :] = grpMat
-    grpLUTNew[0:matShape[1]] = grpLUT
-    return (grpMatNew, grpLUTNew) 
+    binKeyNew[0:nSlot, :] = binKey
+    binCountNew[0:nSlot, :] = binCount
+    binNumNew[0:nSlot] = binNum
+    grpLUTNew[0:nSlot] = grpLUT
+    slotLUTNew[0:nSlot] = slotLUT
+    #old free slots stay on top of new slots
+    nFree = freeSlot[0]
+    freeSlotNew[sizeGroupMatIncrement + 1:sizeGroupMatIncrement + nFree + 1] = freeSlot[1:nFree + 1]
+    freeSlotNew[0] = sizeGroupMatIncrement + nFree
+    return (binKeyNew, binCountNew, binNumNew, freeSlotNew, grpLUTNew, slotLUTNew)
+
+
+#doubles number of bins that can be stored per group
+@jit(Tuple((i8[:, ::1], f8[:, ::1]))(i8[:, ::1], f8[:, ::1]), nopython=True, cache=True)
+def expand_bins(binKey, binCount):
+    nSlot, binCap = binKey.shape
+    binKeyNew = np.zeros((nSlot, 2 * binCap), dtype=np.int64)
+    binCountNew = np.zeros((nSlot, 2 * binCap))
+    binKeyNew[:, 0:binCap] = binKey
+    binCountNew[:, 0:binCap] = binCount
+    return (binKeyNew, binCountNew)
+
+
+#take free slot from top of stack
+@jit(i8(i8[::1]), nopython=True, cache=True)
+def alloc_slot(freeSlot):
+    slotIdx = freeSlot[freeSlot[0]]
+    freeSlot[0] -= 1
+    return slotIdx
+
+
+#empty slot and put it back on stack
+@jit(void(i8[::1], i8[::1], i8), nopython=True, cache=True)
+def release_slot(binNum, freeSlot, slotIdx):
+    binNum[slotIdx] = 0
+    freeSlot[0] += 1
+    freeSlot[freeSlot[0]] = slotIdx
+    return None
+
+
+#add cells to bin of group, bins are kept sorted by key
+#group should have at least one unused bin, returns True if group has no unused bin left
+@jit(b1(i8[:, ::1], f8[:, ::1], i8[::1], i8, i8, f8), nopython=True, cache=True)
+def add_cells(binKey, binCount, binNum, slotIdx, key, nCell):
+    #find position of bin, groups have only few bins
+    nBin = binNum[slotIdx]
+    binIdx = 0
+    while binIdx < nBin and binKey[slotIdx, binIdx] < key:
+        binIdx += 1
+
+    if binIdx < nBin and binKey[slotIdx, binIdx] == key:
+        binCount[slotIdx, binIdx] += nCell
+    else:
+        #insert new bin, shift bins with higher key
+        for ii in range(nBin, binIdx, -1):
+            binKey[slotIdx, ii] = binKey[slotIdx, ii - 1]
+            binCount[slotIdx, ii] = binCount[slotIdx, ii - 1]
+        binKey[slotIdx, binIdx] = key
+        binCount[slotIdx, binIdx] = nCell
+        binNum[slotIdx] = nBin + 1
+    return binNum[slotIdx] == binKey.shape[1]
+
+
+#remove single cell from bin of group, bin is removed when it becomes empty
+@jit(void(i8[:, ::1], f8[:, ::1], i8[::1], i8, i8), nopython=True, cache=True)
+def remove_cell(binKey, binCount, binNum, slotIdx, binIdx):
+    binCount[slotIdx, binIdx] -= 1
+    if binCount[slotIdx, binIdx] == 0:
+        nBin = binNum[slotIdx]
+        for ii in range(binIdx, nBin - 1):
+            binKey[slotIdx, ii] = binKey[slotIdx, ii + 1]
+            binCount[slotIdx, ii] = binCount[slotIdx, ii + 1]
+        binNum[slotIdx] = nBin - 1
+    return None
+
+
+#select random cell of given type in group, weighted by number of cells in bin
+#returns index of bin
+@jit(i8(i8[:, ::1], f8[:, ::1], i8[::1], i8, i8, f8), nopython=True, cache=True)
+def select_cell(binKey, binCount, binNum, slotIdx, typeIdx, randNum):
+    keyLow = typeIdx * nBinTrait
+    keyHigh = keyLow + nBinTrait
+    #bins of same type are adjacent as bins are sorted by key
+    numCell = 0.
+    for ii in range(binNum[slotIdx]):
+        if binKey[slotIdx, ii] >= keyLow and binKey[slotIdx, ii] < keyHigh:
+            numCell += binCount[slotIdx, ii]
+    # rescale uniform random number [0,1] to total number of cells
+    randNumScaled = randNum * numCell
+    cumCount = 0.
+    for ii in range(binNum[slotIdx]):
+        if binKey[slotIdx, ii] >= keyLow and binKey[slotIdx, ii] < keyHigh:
+            cumCount += binCount[slotIdx, ii]
+            if cumCount > randNumScaled:
+                return ii
+    return -1
+
+
+#convert bin key to cell type, offspring fraction index, and offspring size index
+@jit(UniTuple(i8, 3)(i8), nopython=True, cache=True)
+def decode_key(key):
+    typeIdx = key // nBinTrait
+    fracIdx = (key // nBinOffsprSize) % nBinOffsprFrac
+    sizeIdx = key % nBinOffsprSize
+    return (typeIdx, fracIdx, sizeIdx)
+
 
 # initialize outputMat matrix
 def init_outputMat_matrix(model_par):
@@ -112,8 +242,15 @@ def init_outputMat_matrix(model_par):
     outputMat = np.full(numTSample, np.nan, dType)
     outputMat['time'][0] = 0
 
-    # init matrix to track distribution replication strategies 
-    traitDistr = np.full((numTSample, nBinOffsprFrac, nBinOffsprSize), np.nan)
+    # init matrix to track distribution replication strategies,
+    # or stream them to file if traitDistr_file is set
+    if 'traitDistr_file' in model_par:
+        decimate = model_par['traitDistr_decimate'] if 'traitDistr_decimate' in model_par else 1
+        traitDistr = util.open_traitDistr_file(model_par['traitDistr_file'], 
+                                               (nBinOffsprFrac, nBinOffsprSize), 
+                                               decimate=decimate)
+    else:
+        traitDistr = np.full((numTSample, nBinOffsprFrac, nBinOffsprSize), np.nan)
 
     return (outputMat, traitDistr)
 
@@ -121,15 +258,13 @@ def init_outputMat_matrix(model_par):
 # initialize group matrix
 # each column is a group and lists number of [A,A',B,B'] cells
 def init_grpMat(model_par):
-    # grpMat is 4D matrix of:
-    #   [cell type / group id / fraction cells to offspring / fractional size of offspring]
+    # group store (binKey, binCount, binNum, freeSlot) holds traits of cells in each group slot
     # grpMat2D is 2D matrix of:
     #   [cell type / group id]
-    # grpLUT maps location of group i within 4D grpMat to location of group i in 2D grpMat2D
-    #   grpLUT[i] is column index of group i within grpMat2D
-    #   np.nan indicates unassigned groups
-    #   to go from group j (column index) in grpMat2D to index i in 4D grpMat use:
-    #   i = np.nonzero(grpLUT==j)
+    # grpLUT and slotLUT map between group slots in group store and columns of grpMat2D
+    #   grpLUT[i] is column index of group in slot i within grpMat2D, -1 indicates free slot
+    #   slotLUT[j] is slot of group j (column index) in grpMat2D, -1 indicates no group
+    #   both are updated in O(1) when groups are added or removed
     
     #get properties
     NGroup = int(model_par["init_groupNum"])
@@ -158,42 +293,73 @@ def init_grpMat(model_par):
     nDef  = round(model_par["init_groupDens"] * (1 - model_par['init_fCoop']) / model_par['indv_NType'])
     
     # init all groups with zero
-    grpMat = np.zeros((NType * 2, sizeGroupMatInit, nBinOffsprFrac, nBinOffsprSize), order='C')
+    # each group starts with one bin per cell type, and needs one unused bin
+    nSlot = max(sizeGroupMatInit, NGroup + 1)
+    binKey, binCount, binNum, freeSlot = init_grpStore(nSlot, max(binCapInit, 2 * NType + 1))
     grpMat2D = np.zeros((NType * 2, NGroup), order='C')
 
     # set group prop
-    grpMat[0::2, 0:NGroup, offspr_frac_idx, offspr_size_idx] = nCoop
-    grpMat[1::2, 0:NGroup, offspr_frac_idx, offspr_size_idx] = nDef
+    for gg in range(NGroup):
+        slotIdx = alloc_slot(freeSlot)
+        for tt in range(NType * 2):
+            nCell = nCoop if (tt % 2) == 0 else nDef
+            if nCell > 0:
+                key = (tt * nBinOffsprFrac + offspr_frac_idx) * nBinOffsprSize + offspr_size_idx
+                add_cells(binKey, binCount, binNum, slotIdx, key, nCell)
     grpMat2D[0::2, :] = nCoop
     grpMat2D[1::2, :] = nDef
     
-    #create group LUT to connect 4D and 2D matrices
-    grpLUT = np.full(sizeGroupMatInit, np.nan)
+    #create group LUTs to connect group store and 2D matrix
+    grpLUT = np.full(nSlot, -1, dtype=np.int64)
     grpLUT[0:NGroup] = np.arange(NGroup)
+    slotLUT = np.full(nSlot, -1, dtype=np.int64)
+    slotLUT[0:NGroup] = np.arange(NGroup)
 
-    return (grpMat, grpMat2D, grpLUT)
+    return (binKey, binCount, binNum, freeSlot, grpMat2D, grpLUT, slotLUT)
 
 
 """============================================================================
 Sample model code 
 ============================================================================"""
-@jit(Tuple((f8[:, ::1], f8, f8))(f8[:, :, :, ::1], f8[:]), nopython=True)
-def summarize_grpMat(grpMat, grpLUT):
-    #matrix with number per type
-    #find existing groups and sum over all groups and cell types
-    hasGrps = np.logical_not(np.isnan(grpLUT))
-    traitDistr = grpMat[:,hasGrps,:,:].sum(axis=0).sum(axis=0) 
-    cellNumTot = traitDistr.sum()
-    #calculate mean trait values using marginal distributions
-    marginalSize = traitDistr.sum(axis=0) / cellNumTot
-    marginalFrac = traitDistr.sum(axis=1) / cellNumTot
-    av_size = np.sum(binCenterOffsprSize * marginalSize)
-    av_frac = np.sum(binCenterOffsprFrac * marginalFrac)
-
-    return (traitDistr, av_size, av_frac)
+# trait histogram of all cells (traitHist) and its marginals (margFrac, margSize) are
+# updated incrementally on each birth, death, and group extinction,
+# migration and fission do not change them
+
+#add nCell cells (negative to remove) with trait of bin key to trait histogram
+@jit(void(f8[:, ::1], f8[::1], f8[::1], i8, f8), nopython=True, cache=True)
+def update_trait_hist(traitHist, margFrac, margSize, key, nCell):
+    _, fracIdx, sizeIdx = decode_key(key)
+    traitHist[fracIdx, sizeIdx] += nCell
+    margFrac[fracIdx] += nCell
+    margSize[sizeIdx] += nCell
+    return None
+
+
+#count trait histogram of all cells and its marginals
+@jit(Tuple((f8[:, ::1], f8[::1], f8[::1]))(i8[:, ::1], f8[:, ::1], i8[::1], i8[::1]), nopython=True, cache=True)
+def init_trait_hist(binKey, binCount, binNum, grpLUT):
+    #sum over all existing groups and cell types
+    traitHist = np.zeros((nBinOffsprFrac, nBinOffsprSize))
+    margFrac = np.zeros(nBinOffsprFrac)
+    margSize = np.zeros(nBinOffsprSize)
+    for slotIdx in range(grpLUT.size):
+        if grpLUT[slotIdx] >= 0:
+            for ii in range(binNum[slotIdx]):
+                update_trait_hist(traitHist, margFrac, margSize,
+                                  binKey[slotIdx, ii], binCount[slotIdx, ii])
+    return (traitHist, margFrac, margSize)
+
+
+#calculate mean trait values using marginal distributions
+@jit(UniTuple(f8, 2)(f8[::1], f8[::1]), nopython=True, cache=True)
+def summarize_trait_hist(margFrac, margSize):
+    cellNumTot = margSize.sum()
+    av_size = np.sum(binCenterOffsprSize * (margSize / cellNumTot))
+    av_frac = np.sum(binCenterOffsprFrac * (margFrac / cellNumTot))
+    return (av_size, av_frac)
 
 # sample model
-def sample_model(grpMatrix, grpMat2D, grpLUT, outputMat, traitDistr, 
+def sample_model(traitHist, margFrac, margSize, grpMat2D, outputMat, traitDistr, 
     sample_idx, currT, mavInt, rmsInt, stateVarPlus):
     # store time
     outputMat['time'][sample_idx] = currT
@@ -203,8 +369,8 @@ def sample_model(grpMatrix, grpMat2D, grpLUT, outputMat, traitDistr,
     NGroup = shapegrpMat[1]
     NType = int(shapegrpMat[0] / 2)
 
-    # summarize groups
-    traitDistrCurr, av_size, av_frac = summarize_grpMat(grpMatrix, grpLUT)
+    # summarize traits
+    av_size, av_frac = summarize_trait_hist(margFrac, margSize)
 
     # get group statistics
     NTot, NCoop, groupSizeAv, groupSizeMed, NTot_type, fCoop_group, grSizeVec = mls.calc_cell_stat(
@@ -235,7 +401,7 @@ def sample_model(grpMatrix, grpMat2D, grpLUT, outputMat, traitDistr,
             outputMat[outname][sample_idx] = mav
 
     # store distribution of traits
-    traitDistr[sample_idx, :, :] = traitDistrCurr / NTot
+    util.store_traitDistr_frame(traitDistr, sample_idx, traitHist / NTot)
 
     sample_idx += 1
     return sample_idx
@@ -252,7 +418,8 @@ def sample_nan(grpMatrix, outputMat, traitDistr,
         outputMat[varname][sample_idx] = np.nan
         outputMat[outname][sample_idx] = np.nan
 
-    traitDistr[sample_idx, :, :] = np.nan
+    util.store_traitDistr_frame(traitDistr, sample_idx, 
+                                np.full((nBinOffsprFrac, nBinOffsprSize), np.nan))
 
     return None
 
@@ -268,7 +435,8 @@ def sample_extinction(outputMat, traitDistr, sample_idx, currT, stateVarPlus):
         outputMat[outname][sample_idx] = 0      
 
     # calc distribution groupsizes
-    traitDistr[sample_idx, :, :] = 0
+    util.store_traitDistr_frame(traitDistr, sample_idx, 
+                                np.zeros((nBinOffsprFrac, nBinOffsprSize)))
     sample_idx += 1
 
     return sample_idx
@@ -277,27 +445,33 @@ def sample_extinction(outputMat, traitDistr, sample_idx, currT, stateVarPlus):
 Sub functions individual dynamics 
 ============================================================================"""
 # process individual level events
-@jit(i8(f8[:, :, :, ::1], f8[:, ::1], f8[::1], f8[::1], f8[::1], i8, i8, f8, f8, f8), nopython=True)
-def process_indv_event(grpMat, grpMat2D, grpLUT, indvRate, rand, 
-                       NType, NGroup, mutR_type, mutR_size, mutR_frac):
-    # Note: grpMat and grpMat2D are updated in place, they don't have to be returned 
+# returns group of event, group that died (-1 if none), and whether group has no unused bin left
+@jit(Tuple((i8, i8, b1))(i8[:, ::1], f8[:, ::1], i8[::1], f8[:, ::1], i8[::1], f8[:, ::1], f8[::1], f8[::1],
+        f8[::1], f8[::1], i8, i8, f8, f8, f8), nopython=True, cache=True)
+def process_indv_event(binKey, binCount, binNum, grpMat2D, slotLUT, traitHist, margFrac, margSize,
+                       indvTree, rand, NType, NGroup, mutR_type, mutR_size, mutR_frac):
+    # Note: group store, grpMat2D, and trait histogram are updated in place, they don't have to be returned 
+    # rates are stored per column of grpMat2D, NGroup is its capacity
     NTypeWMut = NType*2
     
-    # select random event based on propensity
-    eventID = util.select_random_event(indvRate, rand[0])
+    # select random event based on propensity stored in sum tree
+    eventID = util.select_random_event_sumtree(indvTree, rand[0])
     # get event type
     eventType = math.floor(eventID / NGroup)
     # get event group
     grpIdx2D = eventID % NGroup  # % is modulo operator
     typeIdx = eventType % NTypeWMut
-    #find corresponding group in 4D array
-    grpIdx4D = int(np.nonzero(grpLUT==grpIdx2D)[0].item())
+    #find corresponding group slot
+    slotIdx = slotLUT[grpIdx2D]
     
     #find reproduction trait of affected cell
-    fracIdx, sizeIdx = util.select_random_event_2D(grpMat[typeIdx, grpIdx4D, :, :], rand[1]) 
+    binIdx = select_cell(binKey, binCount, binNum, slotIdx, typeIdx, rand[1])
+    key = binKey[slotIdx, binIdx]
+    _, fracIdx, sizeIdx = decode_key(key)
 
     # track if any groups die in process
     groupDeathID = -1  # -1 is no death
+    isFull = False
 
     #process event 
     if eventType < NTypeWMut:  # birth event
@@ -325,16 +499,22 @@ def process_indv_event(grpMat, grpMat2D, grpLUT, indvRate, rand,
         #make sure we stay inside allowed trait space
         offsprFracIdx = offsprFracMatrix[offsprFracIdx, offsprSizeIdx]
         
-        # place new offspring
-        grpMat[offsprTypeIdx, grpIdx4D, offsprFracIdx, offsprSizeIdx] += 1
+        # place new offspring, without mutation it goes to bin of parent
+        offsprKey = (offsprTypeIdx * nBinOffsprFrac + offsprFracIdx) * nBinOffsprSize + offsprSizeIdx
+        if offsprKey == key:
+            binCount[slotIdx, binIdx] += 1
+        else:
+            isFull = add_cells(binKey, binCount, binNum, slotIdx, offsprKey, 1.)
         grpMat2D[offsprTypeIdx, grpIdx2D] += 1
+        update_trait_hist(traitHist, margFrac, margSize, offsprKey, 1.)
 
     else:  # death event
         # remove cell from group
-        if grpMat[typeIdx, grpIdx4D, fracIdx, sizeIdx]==0:
+        if binIdx < 0:
             raise NameError("no cell to kill")
-        grpMat[typeIdx, grpIdx4D, fracIdx, sizeIdx] -= 1
+        remove_cell(binKey, binCount, binNum, slotIdx, binIdx)
         grpMat2D[typeIdx, grpIdx2D] -= 1
+        update_trait_hist(traitHist, margFrac, margSize, key, -1.)
 
         # kill group if last cell died
         # use two stage check for increased speed
@@ -343,7 +523,7 @@ def process_indv_event(grpMat, grpMat2D, grpLUT, indvRate, rand,
             if NINGroup == 0:  # all other types are zero too
                 groupDeathID = int(grpIdx2D)
 
-    return groupDeathID
+    return (grpIdx2D, groupDeathID, isFull)
 
 
 """============================================================================
@@ -351,29 +531,32 @@ Sub functions migration dynamics
 ============================================================================"""
 
 # process migration event
-@jit(i8(f8[:, :, :, ::1], f8[:, ::1], f8[::1], f8[::1], i8, i8, f8[::1]), nopython=True)
-def process_migration_event(grpMat, grpMat2D, grpLUT, grSizeVec, NGroup, NType, rand):
-    # Note: grpMat is updated in place, it does not need to be returned
+# returns source group, target group, group that died (-1 if none), 
+# and whether target group has no unused bin left
+@jit(Tuple((i8, i8, i8, b1))(i8[:, ::1], f8[:, ::1], i8[::1], f8[:, ::1], i8[::1], f8[::1], i8, i8, f8[::1]), nopython=True, cache=True)
+def process_migration_event(binKey, binCount, binNum, grpMat2D, slotLUT, sizeTree, NGroup, NType, rand):
+    # Note: group store is updated in place, it does not need to be returned
 
-    # select random group of origin based on size
-    grpIDSource = util.select_random_event(grSizeVec, rand[0])
-    #find corresponding group in 4D array
-    grpIdSource4D = int(np.nonzero(grpLUT==grpIDSource)[0].item())
+    # select random group of origin based on size stored in sum tree
+    grpIDSource = util.select_random_event_sumtree(sizeTree, rand[0])
+    #find corresponding group slot
+    slotSource = slotLUT[grpIDSource]
 
     # select random type of migrant based on population size
     typeIdx = util.select_random_event(grpMat2D[:, grpIDSource], rand[1])
         
     # find trait of affected cell
-    fracIdx, sizeIdx = util.select_random_event_2D(grpMat[typeIdx, grpIDSource, :, :], rand[2])
+    binIdx = select_cell(binKey, binCount, binNum, slotSource, typeIdx, rand[2])
+    key = binKey[slotSource, binIdx]
     
     # select random target group
     grpIDTarget = int(np.floor(rand[3] * NGroup))
-    #find corresponding group in 4D array
-    grpIdTarget4D = np.nonzero(grpLUT==grpIDTarget)[0].item()
+    #find corresponding group slot
+    slotTarget = slotLUT[grpIDTarget]
 
     #perform migration
-    grpMat[typeIdx, grpIdSource4D, fracIdx, sizeIdx] -= 1
-    grpMat[typeIdx, grpIdTarget4D, fracIdx, sizeIdx] += 1
+    remove_cell(binKey, binCount, binNum, slotSource, binIdx)
+    isFull = add_cells(binKey, binCount, binNum, slotTarget, key, 1.)
     
     grpMat2D[typeIdx, grpIDSource] -= 1
     grpMat2D[typeIdx, grpIDTarget] += 1
@@ -388,165 +571,144 @@ def process_migration_event(grpMat, grpMat2D, grpLUT, grSizeVec, NGroup, NType,
         if NINGroup == 0:  # all other types are zero too
             groupDeathID = int(grpIDSource)
 
-    return groupDeathID
+    return (grpIDSource, grpIDTarget, groupDeathID, isFull)
 
 
 """============================================================================
 Sub functions group dynamics 
 ============================================================================"""
 
-# remove group from group matrix
-@jit(f8[:, ::1](f8[:, :, :, ::1], f8[:, ::1], f8[:], i8), nopython=True)
-def remove_group(grpMat, grpMat2D, grpLUT, groupDeathID):
-    #grpMat and grpLUT modified in place
-    #first remove group from 4D matrix by setting its index to -1
-    #find corresponding group in 4D array
-    grpIdTarget4D = int(np.nonzero(grpLUT==groupDeathID)[0].item())
-    #for safety set group traits to zero (should not be needed, remove for speed)
-    grpLUT[grpIdTarget4D] = np.nan
-    grpMat[:, grpIdTarget4D, :, :] = 0
+# grpMat2D is capacity padded buffer, only first NGroup columns contain live groups,
+# groups are added at end and removed by moving last group in their place 
+# rates are stored per column and updated incrementally (see mls.insert_group, mls.delete_group)
+
+# remove group, last group is moved to column of removed group, and update rates
+# returns new number of groups and change in total population size
+@jit(Tuple((i8, f8))(i8[:, ::1], f8[:, ::1], i8[::1], i8[::1], f8[:, ::1], i8, i8[::1], i8[::1],
+                     f8[:, ::1], f8[::1], f8[::1], i8, f8[::1], 
+                     f8[::1], f8[::1], f8[::1], f8[::1],
+                     f8[::1], f8, f8, f8, f8, f8, f8, f8[::1]), nopython=True, cache=True)
+def remove_group(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT,
+                 traitHist, margFrac, margSize, groupDeathID, grSizeVec,
+                 indvTree, fisTree, extTree, sizeTree,
+                 birthRVec, deathR, delta_indv, gr_CFis, gr_SFis, K_ind, delta_size, coopPart):
+    #group store, LUTs, and trait histogram modified in place
+    #first remove remaining cells from trait histogram and free slot of group
+    slotIdx = slotLUT[groupDeathID]
+    for ii in range(binNum[slotIdx]):
+        update_trait_hist(traitHist, margFrac, margSize,
+                          binKey[slotIdx, ii], -binCount[slotIdx, ii])
+    grpLUT[slotIdx] = -1
+    release_slot(binNum, freeSlot, slotIdx)
     
-    #now remove group from 2D matrix
-    NGrp = grpMat2D.shape[1]
-    hasDied = np.zeros(NGrp)
-    hasDied[groupDeathID] = 1
-    # copy remaining groups to new matrix
-    grpMat2DNew = grpMat2D[:, hasDied == 0]
-    grpMat2DNew = grpMat2DNew.copy()
+    #update LUTs to reflect new position of last group
+    lastGrp = NGroup - 1
+    if groupDeathID < lastGrp:
+        lastSlot = slotLUT[lastGrp]
+        grpLUT[lastSlot] = groupDeathID
+        slotLUT[groupDeathID] = lastSlot
+    slotLUT[lastGrp] = -1
     
-    #update grpLUT to reflect changed positions
-    grpLUT[grpLUT > groupDeathID] -= 1
-    
-    return grpMat2DNew
-
-@jit(Tuple((f8, f8, f8))(f8[:, :, ::1]), nopython=True, debug=True)
-def calc_mean_group_prop(parentGroup):
-    #parent group: type / frac  / size  
-    #sum over all cell types   
-    parTraitMatrix = parentGroup.sum(axis=0)
+    #now remove group from 2D matrix and rates, last group is moved in its place
+    return mls.delete_group(grpMat2D, NGroup, groupDeathID, grSizeVec,
+                            indvTree, fisTree, extTree, sizeTree,
+                            birthRVec, deathR, delta_indv,
+                            gr_CFis, gr_SFis, K_ind, delta_size, coopPart)
+
+@jit(Tuple((f8, f8, f8))(i8[::1], f8[::1]), nopython=True, cache=True)
+def calc_mean_group_prop(parKey, parCount):
+    #parent group: sorted bin keys and number of cells in bin
+    #sum over all cell types
+    marginalSize = np.zeros(nBinOffsprSize)
+    marginalFrac = np.zeros(nBinOffsprFrac)
+    for ii in range(parKey.size):
+        _, fracIdx, sizeIdx = decode_key(parKey[ii])
+        marginalSize[sizeIdx] += parCount[ii]
+        marginalFrac[fracIdx] += parCount[ii]
     #number of cells in parents
-    NCellPar = parTraitMatrix.sum()
+    NCellPar = marginalSize.sum()
 
     #calculate average trait values using marginal distributions 
-    marginalSize = parTraitMatrix.sum(axis=0) / NCellPar
-    marginalFrac = parTraitMatrix.sum(axis=1) / NCellPar
+    marginalSize = marginalSize / NCellPar
+    marginalFrac = marginalFrac / NCellPar
     offspr_size = np.sum(binCenterOffsprSize * marginalSize)
     offspr_frac = np.sum(binCenterOffsprFrac * marginalFrac)
     return(offspr_size, offspr_frac, NCellPar)
 
 
-@jit(Tuple((f8[:, :, :, ::1], f8[:, ::1], f8[::1]))(f8[:, :, :, ::1], f8[:, ::1], f8[::1], i8), nopython=True)
-def fission_group(grpMat, grpMat2D, grpLUT, eventGroup):  
-    #find corresponding group in 4D array
-    grpIdx4D = int(np.nonzero(grpLUT==eventGroup)[0].item())
+# fission of group, first new group takes column of parent, others are added at end
+# grpMat2D is grown when it has not enough spare capacity
+# rates of new groups are not updated here, changed columns are eventGroup and 
+# the columns from old to new number of groups
+# offspring sizes and cells are drawn from stream rngState
+@jit(Tuple((i8[:, ::1], f8[:, ::1], i8[::1], i8[::1], f8[:, ::1], i8[::1], i8[::1], i8))
+     (i8[:, ::1], f8[:, ::1], i8[::1], i8[::1], f8[:, ::1], i8, i8[::1], i8[::1], i8, u8[::1]), 
+     nopython=True, cache=True)
+def fission_group(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT, eventGroup,
+                  rngState):  
+    #find corresponding group slot
+    slotIdx = slotLUT[eventGroup]
     
     #get parent group
-    parentGroup = grpMat[:, grpIdx4D, :, :].copy()
+    nBinPar = binNum[slotIdx]
+    parKey = binKey[slotIdx, 0:nBinPar].copy()
+    parCount = binCount[slotIdx, 0:nBinPar].copy()
     #get group properties
-    offspr_size, offspr_frac, NCellPar = calc_mean_group_prop(parentGroup)
-    NCellPar = int(parentGroup.sum())
+    offspr_size, offspr_frac, NCellPar = calc_mean_group_prop(parKey, parCount)
+    NCellPar = int(parCount.sum())
     
-    #distribute cells   
-    destinationIdx, nOffspring = mls.distribute_offspring(offspr_size, 
-                                                          offspr_frac, 
-                                                          NCellPar)
+    #draw offspring sizes
+    offsprSize, nParRemain = mls.draw_offspring_size(offspr_size, 
+                                                     offspr_frac, 
+                                                     NCellPar, rngState)
+    nOffspring = offsprSize.size
     
     if nOffspring > 0: 
-        if np.sum(destinationIdx==-1) > 0:
+        if nParRemain > 0:
             #consider parent to be new group, remove old parent
-            destinationIdx += 1
             nPar = 1
         else:
             nPar = 0
                 
-        #remove parent from 4D matrice (copy stored in parentGroup)
-        grpLUT[grpIdx4D] = np.nan
-        grpMat[:, grpIdx4D, :, :] = 0
+        #remove parent from group store (copy stored in parKey and parCount)
+        grpLUT[slotIdx] = -1
+        release_slot(binNum, freeSlot, slotIdx)
         
-        #find empty spots for new groups
-        emptyPlaces = np.nonzero(np.isnan(grpLUT))[0]    
-        #check if there are enough empty sites, if not grow matrix
-        if nOffspring > emptyPlaces.size - 1:
-            grpMat, grpLUT = expand_grpMat(grpMat, grpLUT)
-            emptyPlaces = np.nonzero(np.isnan(grpLUT))[0]  
-      
-        #init new 2D array  
-        matShape2D = grpMat2D.shape
+        #check if there are enough free slots, if not grow store
         nGrpAdded = nOffspring + nPar
-        nGrpNew = matShape2D[1] + nGrpAdded - 1
-        grpMat2DNew = np.zeros((matShape2D[0], nGrpNew))
-        isParent = np.zeros(matShape2D[1])
-        isParent[eventGroup] = 1
-        
-        #store existing groups at end, exclude parent  
-        grpMat2DNew[:, nGrpAdded::] = grpMat2D[:, isParent==0]
-        grpMat2DNew = grpMat2DNew.copy()
-        
-        #update grpLUT to reflect new positions
-        grpLUT[grpLUT > eventGroup] += (nGrpAdded - 1)
-        grpLUT[grpLUT < eventGroup] += nGrpAdded
-        grpLUT[emptyPlaces[0:nGrpAdded]] = np.arange(nGrpAdded)
+        while nGrpAdded > freeSlot[0]:
+            binKey, binCount, binNum, freeSlot, grpLUT, slotLUT = expand_grpStore(
+                binKey, binCount, binNum, freeSlot, grpLUT, slotLUT)
+      
+        #existing groups keep their column, grow 2D matrix if needed
+        NGroupNew = NGroup + nGrpAdded - 1
+        if NGroupNew > grpMat2D.shape[1]:
+            grpMat2D = mls.grow_groupMat(grpMat2D, NGroup, 2 * NGroupNew)
+        grpMat2D[:, eventGroup] = 0
         
-        #find non zero elements
-        ttIDx, ffIdx, ssIdx = np.nonzero(parentGroup)
-        #loop all cells in parentgroup and assign to new group
-        idx = 0
-        for ii in range(ttIDx.size):
-            numCell = parentGroup[ttIDx[ii], ffIdx[ii], ssIdx[ii]]
-            while numCell>0:
-                currDest = destinationIdx[idx]
-                currDest4D = emptyPlaces[currDest]
-                grpMat[ttIDx[ii],
-                        currDest4D,
-                        ffIdx[ii],
-                        ssIdx[ii]] += 1
-                
-                grpMat2DNew[ttIDx[ii],
-                            currDest] += 1
-                numCell -= 1
-                idx += 1   
-                                             
-    else:
-        #nothing happens
-        grpMat2DNew = grpMat2D
+        #distribute cells over parent (if it remains) and offspring
+        #each type / trait combination is a category
+        destSize = np.empty(nGrpAdded, dtype=np.int64)
+        destSize[0:nPar] = nParRemain
+        destSize[nPar::] = offsprSize
+        destMat = mls.split_group(parCount, destSize, rngState)
+        for currDest in range(nGrpAdded):
+            destCol = eventGroup if currDest == 0 else NGroup + currDest - 1
+            destSlot = alloc_slot(freeSlot)
+            grpLUT[destSlot] = destCol
+            slotLUT[destCol] = destSlot
+            #bins stay sorted, empty bins are skipped
+            nBin = 0
+            for ii in range(nBinPar):
+                if destMat[ii, currDest] > 0:
+                    binKey[destSlot, nBin] = parKey[ii]
+                    binCount[destSlot, nBin] = destMat[ii, currDest]
+                    grpMat2D[parKey[ii] // nBinTrait, destCol] += destMat[ii, currDest]
+                    nBin += 1
+            binNum[destSlot] = nBin
+        NGroup = NGroupNew
                 
-    return (grpMat, grpMat2DNew, grpLUT)
-
-# process individual level events
-@jit(Tuple((f8[:, :, :, ::1], f8[:, ::1], f8[::1]))(f8[:, :, :, ::1], f8[:, ::1], f8[::1], f8[::1], f8[::1]), nopython=True)
-def process_group_event(grpMat, grpMat2D, grpLUT, grpRate, rand):
-    # get number of groups
-    NGroup = grpMat2D.shape[1]
-
-    # select random event based on propensity
-    eventID = util.select_random_event(grpRate, rand[0])
-    # get event type
-    eventType = math.floor(eventID/NGroup)
-    # get event group
-    eventGroup = eventID % NGroup  # % is modulo operator
-    
-    if eventType < 1:
-        # fission event - add new group and split cells
-        grpMat, grpMat2D, grpLUT = fission_group(grpMat, grpMat2D, grpLUT, eventGroup)
-    else:
-        # extinction event - remove group
-        grpMat2D = remove_group(grpMat, grpMat2D, grpLUT, eventGroup)
-    return (grpMat, grpMat2D, grpLUT)
-
-
-#calc group properties
-# calc total number of individuals per group, use matrix product for speed
-@jit(Tuple((f8[:, ::1], f8[::1], f8))(f8[:, :, :, ::1], f8[::1], f8[::1]), nopython=True)
-def calc_group_state(grpMat, onesNType, onesNGrp):
-    #matrix with number per type
-    grpMat2D = grpMat.sum(axis=3).sum(axis=2)
-    #vector with size of each group
-    grSizeVec = onesNType @ grpMat2D
-    #float total number of individuals
-    NTot = onesNGrp @ grSizeVec
-
-    return(grpMat2D, grSizeVec, NTot)
-
+    return (binKey, binCount, binNum, freeSlot, grpMat2D, grpLUT, slotLUT, NGroup)
 
 
 """============================================================================
@@ -554,6 +716,8 @@ Main model code
 ============================================================================"""
 
 # main model
+# if traitDistr_file is set, trait distributions are streamed to that file 
+# (see util.open_traitDistr_file) and only the last one is returned
 def run_model(model_par):
     
     #create state variables
@@ -584,13 +748,15 @@ def run_model(model_par):
         
     # init counters
     currT = 0
-    ttR = 0
     sampleIdx = 0
     
-    # get matrix with random numbers
-    rndSize1 = 7
-    rndSize0 = int(1E6)
-    randMat = util.create_randMat(rndSize0, rndSize1)
+    #get seed of random number generator: explicit seed, derived from master seed,
+    #or fresh entropy from OS if neither is set
+    seed = util.get_run_seed(model_par)
+
+    # init streaming random number generator, rand stores numbers of current time step
+    rngState = util.create_rng(seed)
+    rand = np.empty(7)
     
     # initialize outputMat matrix
     outputMat, traitDistr = init_outputMat_matrix(model_par)
@@ -599,97 +765,142 @@ def run_model(model_par):
     onesNType, birthRVec, deathR = mls.adjust_indv_rates(model_par)
     
     # initialize group matrix
-    grpMat, grpMat2D, grpLUT = init_grpMat(model_par)
+    binKey, binCount, binNum, freeSlot, grpMat2D, grpLUT, slotLUT = init_grpMat(model_par)
+    traitHist, margFrac, margSize = init_trait_hist(binKey, binCount, binNum, grpLUT)
     NGroup = grpMat2D.shape[1]
 
-    #init dynamic helper vectors
-    onesNGrp, onesIndR, onesGrR, indvRate, grpRate = mls.create_helper_vector(
-        NGroup, NType)
-
     # get first sample of init state
-    sampleIdx = sample_model(grpMat, grpMat2D, grpLUT, 
+    sampleIdx = sample_model(traitHist, margFrac, margSize, grpMat2D, 
                              outputMat, traitDistr, 
                              sampleIdx, currT, mavInt, rmsInt, 
                              stateVarPlus)
 
+    #copy groups to buffer with spare capacity, and init rates
+    #rates are stored per column and updated incrementally after each event
+    grpMat2D = mls.grow_groupMat(grpMat2D, NGroup, 2 * NGroup)
+    grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree = \
+        mls.init_rate_trees(grpMat2D, NGroup, birthRVec, deathR, delta_indv,
+                            gr_CFis, gr_SFis, indv_K, delta_size)
+    #work buffer for rate updates
+    coopPart = np.empty(NType)
+    #set when event fills last unused bin of a group
+    isFull = False
+
     # loop time steps
     while currT <= maxT:
-        # reset rand matrix when used up
-        if ttR >= rndSize0:
-            randMat = util.create_randMat(rndSize0, rndSize1)
-            ttR = 0 
-
-        #calc group state
-        grSizeVec, NTot = mls.calc_group_state(grpMat2D, 
-                                               onesNType, onesNGrp)    
-
-        # calc rates of individual level events
-        mls.calc_indv_rates(indvRate, grpMat2D, grSizeVec, birthRVec,
-                            deathR, delta_indv, NType, NGroup)
-        
-        
-        # calc rates of group events
-        mls.calc_group_rates(grpRate, grpMat2D, grSizeVec, NTot, NGroup,
-                            gr_CFis, gr_SFis, K_grp, K_tot,
-                            delta_grp, delta_tot, delta_size)
-
-        # calculate total propensities
-        indvProp = indv_tau * (onesIndR @ indvRate)
-        grpProp = onesGrR @ grpRate
+        # get random numbers of current time step
+        util.fill_rand(rngState, rand)
+
+        # calc density dependent part of extinction rate, shared by all groups
+        extinctFactor = mls.calc_extinction_factor(NTot, NGroup, K_grp, K_tot,
+                                                   delta_grp, delta_tot)
+
+        # calculate total propensities, stored in root of sum trees
+        indvProp = indv_tau * indvTree[1]
+        fisProp = fisTree[1]
+        extProp = extinctFactor * extTree[1]
+        grpProp = fisProp + extProp
         migrProp = inv_migrR * NTot
         totProp = indvProp + grpProp + migrProp
 
         # calc time step
-        dt = -1 * math.log(randMat[ttR, 1]) / totProp
+        dt = -1 * math.log(rand[1]) / totProp
 
         # select group or individual event
-        rescaledRand = randMat[ttR, 0] * totProp
-        groupsHaveChanged = False
+        rescaledRand = rand[0] * totProp
         if rescaledRand < indvProp:
             # individual level event - select and process individual level event
-            groupDeathID = process_indv_event(grpMat, grpMat2D, grpLUT, indvRate, 
-                                              randMat[ttR, 2:7], NType, NGroup, 
-                                              mutR_type, mutR_size, mutR_frac)
+            # rates are stored per column, pass capacity to decode event
+            eventGroup, groupDeathID, isFull = process_indv_event(binKey, binCount, binNum, grpMat2D, slotLUT,
+                                                          traitHist, margFrac, margSize, indvTree, 
+                                                          rand[2:7], NType, grpMat2D.shape[1], 
+                                                          mutR_type, mutR_size, mutR_frac)
             if groupDeathID > -1:  # remove empty group
-                grpMat2D = remove_group(grpMat, grpMat2D, grpLUT, groupDeathID)
-                groupsHaveChanged = True
+                NGroup, dNTot = remove_group(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, 
+                                             grpLUT, slotLUT, traitHist, margFrac, margSize, 
+                                             groupDeathID, grSizeVec,
+                                             indvTree, fisTree, extTree, sizeTree,
+                                             birthRVec, deathR, delta_indv,
+                                             gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            else:  # only rates of event group change
+                dNTot = mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, grpMat2D,
+                                               grSizeVec, eventGroup, birthRVec, deathR,
+                                               delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            NTot += dNTot
         elif rescaledRand < (indvProp + migrProp):
             # migration event - select and process migration event
-            groupDeathID = process_migration_event(grpMat, grpMat2D, grpLUT, grSizeVec, 
-                                                   NGroup, NType, randMat[ttR, 2:6])
+            grpIDSource, grpIDTarget, groupDeathID, isFull = process_migration_event(
+                binKey, binCount, binNum, grpMat2D, slotLUT, sizeTree, NGroup, NType, rand[2:6])
+            # update target first, it can be moved when source is removed
+            mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, grpMat2D,
+                                   grSizeVec, grpIDTarget, birthRVec, deathR,
+                                   delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
             if groupDeathID > -1:  # remove empty group
-                grpMat2D = remove_group(grpMat, grpMat2D, grpLUT, groupDeathID)
-                groupsHaveChanged = True
+                NGroup, _ = remove_group(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, 
+                                         grpLUT, slotLUT, traitHist, margFrac, margSize, 
+                                         groupDeathID, grSizeVec,
+                                         indvTree, fisTree, extTree, sizeTree,
+                                         birthRVec, deathR, delta_indv,
+                                         gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            else:  # only rates of source and target group change
+                mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, grpMat2D,
+                                       grSizeVec, grpIDSource, birthRVec, deathR,
+                                       delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+        elif rand[2] * grpProp < fisProp:
+            # fission event - select group, add new groups and split cells
+            eventGroup = util.select_random_event_sumtree(fisTree, rand[3])
+            grpCap = grpMat2D.shape[1]
+            NGroupOld = NGroup
+            binKey, binCount, binNum, freeSlot, grpMat2D, grpLUT, slotLUT, NGroup = fission_group(
+                binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT, eventGroup,
+                rngState)
+            if grpMat2D.shape[1] > grpCap:
+                # buffer has grown, rates are recalculated for new capacity
+                grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree = \
+                    mls.init_rate_trees(grpMat2D, NGroup, birthRVec, deathR, delta_indv,
+                                        gr_CFis, gr_SFis, indv_K, delta_size)
+            else:
+                # update rates of parent column and of new columns
+                for grpIdx in [eventGroup] + list(range(NGroupOld, NGroup)):
+                    NTot += mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, grpMat2D,
+                                                   grSizeVec, grpIdx, birthRVec, deathR, delta_indv,
+                                                   gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
         else:
-            # group level event - select and process group level event
-            grpMat, grpMat2D, grpLUT= process_group_event(grpMat, grpMat2D, grpLUT, grpRate, randMat[ttR, 2:4])
-            groupsHaveChanged = True
+            # extinction event - select and remove group
+            eventGroup = util.select_random_event_sumtree(extTree, rand[3])
+            NGroup, dNTot = remove_group(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, 
+                                         grpLUT, slotLUT, traitHist, margFrac, margSize, 
+                                         eventGroup, grSizeVec,
+                                         indvTree, fisTree, extTree, sizeTree,
+                                         birthRVec, deathR, delta_indv,
+                                         gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            NTot += dNTot
+
+        # events add at most one bin to one group, keep one unused bin in each group
+        # fission and extinction do not add bins, offspring have at most as many bins as parent
+        if isFull:
+            binKey, binCount = expand_bins(binKey, binCount)
+            isFull = False
          
-        # update group matrices if needed    
-        if groupsHaveChanged:
-            NGroup = grpMat2D.shape[1]
-            if NGroup > 0:  #update group matrices
-                onesNGrp, onesIndR, onesGrR, indvRate, grpRate = mls.create_helper_vector(
-                    NGroup, NType) 
-            else: #otherwise, if all groups have died, end simulation
-                sampleIdx = sample_extinction(outputMat, traitDistr, sampleIdx, currT, stateVarPlus)
-                print('System has gone extinct')
-                break
+        # if all groups have died, end simulation
+        if NGroup == 0:
+            sampleIdx = sample_extinction(outputMat, traitDistr, sampleIdx, currT, stateVarPlus)
+            print('System has gone extinct')
+            break
 
         # update time
         currT += dt
-        ttR += 1
         # sample model at intervals
         nextSampleT = sampleInt * sampleIdx
         if currT >= nextSampleT:
-            sampleIdx = sample_model(grpMat, grpMat2D, grpLUT, 
+            sampleIdx = sample_model(traitHist, margFrac, margSize, grpMat2D[:, 0:NGroup], 
                              outputMat, traitDistr, 
                              sampleIdx, currT, mavInt, rmsInt, 
                              stateVarPlus)
             
     # cut off non existing time points at end
     outputMat = outputMat[0:sampleIdx]
-    traitDistr = traitDistr[0:sampleIdx, :, :]
+    traitDistr = util.close_traitDistr(traitDistr, sampleIdx)
     
     if outputMat['NCoop'][-1] == 0:
         outputMat['NCoop_mav'][-1] = 0
@@ -709,7 +920,9 @@ def single_run_save(model_par, mainName):
         
         mainName {[string]} -- [filename for data file, appended with parameter settings]
     Returns:
-        [numpy 2D array] -- [trait distribution at last timepoint]
+        [numpy 3D array] -- [trait distribution at last timepoint only (1 x nBinOffsprFrac x nBinOffsprSize),
+                             distributions of all timepoints are stored in .npz file as sparse 
+                             float32 frames, read them with util.load_traitDistr / util.get_traitDistr_frame]
     """
     #create file name, append mainName with parameter settings
     parNameAbbrev = {
@@ -742,11 +955,13 @@ def single_run_save(model_par, mainName):
     parName = ''.join(parName)
     fileName = mainName + parName + '.npz'
     
-    #run model and save data to disk
+    #run model and save data to disk, random numbers are derived from master seed if no seed is set
+    #trait distributions are streamed to same file while model runs
+    model_par = util.set_run_seed(model_par)
+    model_par['traitDistr_file'] = fileName
     try: 
         outputMat, traitDistr = run_model(model_par)  
-        np.savez(fileName, output=outputMat, traitDistr=traitDistr,
-                 model_par=[model_par])
+        util.append_npz(fileName, output=outputMat, model_par=[model_par])
     except:
         print("error with run")
         traitDistr = np.full((1, nBinOffsprFrac, nBinOffsprSize), np.nan)
@@ -19,7 +19,7 @@ Import dependencies & define global constants
 ============================================================================"""
 
 from numba.types import Tuple, UniTuple
-from numba import jit, f8, i8
+from numba import jit, void, f8, i8, u8
 import math
 import numpy as np
 from mainCode import MlsGroupDynamics_utilities as util
@@ -95,8 +95,15 @@ def init_outputMat_matrix(model_par):
     outputMat = np.full(numTSample, np.nan, dType)
     outputMat['time'][0] = 0
 
-    # init matrix to track distribution replication strategies 
-    traitDistr = np.full((numTSample, nBinOffsprFrac, nBinOffsprSize), np.nan)
+    # init matrix to track distribution replication strategies,
+    # or stream them to file if traitDistr_file is set
+    if 'traitDistr_file' in model_par:
+        decimate = model_par['traitDistr_decimate'] if 'traitDistr_decimate' in model_par else 1
+        traitDistr = util.open_traitDistr_file(model_par['traitDistr_file'], 
+                                               (nBinOffsprFrac, nBinOffsprSize), 
+                                               decimate=decimate)
+    else:
+        traitDistr = np.full((numTSample, nBinOffsprFrac, nBinOffsprSize), np.nan)
 
     return (outputMat, traitDistr)
 
@@ -147,24 +154,40 @@ def init_traitMat(model_par):
 """============================================================================
 Sample model code 
 ============================================================================"""
-@jit(Tuple((f8[:, ::1], f8, f8))(i8[:, ::1]), nopython=True)
-def summarize_traitMat(traitMat):
-    #matrix with number per type
-    #find existing groups and sum over all groups and cell types
-    traitDistr = np.zeros((nBinOffsprFrac, nBinOffsprSize))
-    grpNum = traitMat.shape[1]
-    
-    for i in range(grpNum):
-        traitDistr[traitMat[0,i], traitMat[1,i]] += 1
-    
-    #calculate mean trait values using marginal distributions
-    av_size = np.sum(binCenterOffsprSize[traitMat[1, :]]) / grpNum
-    av_frac = np.sum(binCenterOffsprFrac[traitMat[0, :]]) / grpNum
-
-    return (traitDistr, av_size, av_frac)
+# trait histogram of all groups (traitHist) and its marginals (margFrac, margSize) are
+# updated incrementally on each fission and group death
+
+#add nGroup groups (negative to remove) with traits fracIdx, sizeIdx to trait histogram
+@jit(void(f8[:, ::1], f8[::1], f8[::1], i8, i8, f8), nopython=True, cache=True)
+def update_trait_hist(traitHist, margFrac, margSize, fracIdx, sizeIdx, nGroup):
+    traitHist[fracIdx, sizeIdx] += nGroup
+    margFrac[fracIdx] += nGroup
+    margSize[sizeIdx] += nGroup
+    return None
+
+
+#count trait histogram of all groups and its marginals
+@jit(Tuple((f8[:, ::1], f8[::1], f8[::1]))(i8[:, ::1]), nopython=True, cache=True)
+def init_trait_hist(traitMat):
+    traitHist = np.zeros((nBinOffsprFrac, nBinOffsprSize))
+    margFrac = np.zeros(nBinOffsprFrac)
+    margSize = np.zeros(nBinOffsprSize)
+    for i in range(traitMat.shape[1]):
+        update_trait_hist(traitHist, margFrac, margSize, 
+                          traitMat[0, i], traitMat[1, i], 1.)
+    return (traitHist, margFrac, margSize)
+
+
+#calculate mean trait values using marginal distributions
+@jit(UniTuple(f8, 2)(f8[::1], f8[::1]), nopython=True, cache=True)
+def summarize_trait_hist(margFrac, margSize):
+    grpNum = margSize.sum()
+    av_size = np.sum(binCenterOffsprSize * margSize) / grpNum
+    av_frac = np.sum(binCenterOffsprFrac * margFrac) / grpNum
+    return (av_size, av_frac)
 
 # sample model
-def sample_model(traitMat, grpMat, outputMat, traitDistr, 
+def sample_model(traitHist, margFrac, margSize, grpMat, outputMat, traitDistr, 
     sample_idx, currT, mavInt, rmsInt, stateVarPlus):
     # store time
     outputMat['time'][sample_idx] = currT
@@ -174,8 +197,8 @@ def sample_model(traitMat, grpMat, outputMat, traitDistr,
     NGroup = shapetraitMat[1]
     NType = int(shapetraitMat[0] / 2)
 
-    # summarize groups
-    traitDistrCurr, av_size, av_frac = summarize_traitMat(traitMat)
+    # summarize traits
+    av_size, av_frac = summarize_trait_hist(margFrac, margSize)
 
     # get group statistics
     NTot, NCoop, groupSizeAv, groupSizeMed, NTot_type, fCoop_group, grSizeVec = mls.calc_cell_stat(
@@ -206,7 +229,7 @@ def sample_model(traitMat, grpMat, outputMat, traitDistr,
             outputMat[outname][sample_idx] = mav
 
     # store distribution of traits
-    traitDistr[sample_idx, :, :] = traitDistrCurr / NTot
+    util.store_traitDistr_frame(traitDistr, sample_idx, traitHist / NTot)
 
     sample_idx += 1
     return sample_idx
@@ -223,7 +246,8 @@ def sample_extinction(outputMat, traitDistr, sample_idx, currT, stateVarPlus):
         outputMat[outname][sample_idx] = 0
 
     # calc distribution groupsizes
-    traitDistr[sample_idx, :, :] = 0
+    util.store_traitDistr_frame(traitDistr, sample_idx, 
+                                np.zeros((nBinOffsprFrac, nBinOffsprSize)))
     sample_idx += 1
 
     return sample_idx
@@ -233,25 +257,39 @@ def sample_extinction(outputMat, traitDistr, sample_idx, currT, stateVarPlus):
 Sub functions group dynamics 
 ============================================================================"""
 
-# remove group from group matrix
-@jit(Tuple((i8[:, ::1], f8[:, ::1]))(i8[:, ::1], f8[:, ::1], i8), nopython=True)
-def remove_group(traitMat, grpMat, groupDeathID):
-    #find group that died
-    NGrp = grpMat.shape[1]
-    hasDied = np.zeros(NGrp)
-    hasDied[groupDeathID] = 1
-    # copy remaining groups to new matrix
-    grpMatNew = grpMat[:, hasDied == 0]
-    grpMatNew = grpMatNew.copy()
-   
-    # copy traits of remaining groups to new matrix
-    traitMatNew = traitMat[:, hasDied == 0]
-    traitMatNew = traitMatNew.copy()
-        
-    return (traitMatNew, grpMatNew)
-
-
-@jit(UniTuple(i8, 2)(f8, f8, i8, i8, f8[::1]), nopython=True)
+# groups are stored in capacity padded grpMat and traitMat buffers, updated in place:
+# live groups are stored in first NGrp columns, groups are added at end
+# and removed by moving last group in their place (see mls.insert_group, mls.delete_group)
+
+# create trait matrix with capacity grpCap and copy traits of groups into it
+@jit(i8[:, ::1](i8[:, ::1], i8, i8), nopython=True, cache=True)
+def grow_traitMat(traitMat, NGrp, grpCap):
+    newMat = np.zeros((2, grpCap), dtype=np.int64)
+    newMat[:, 0:NGrp] = traitMat[:, 0:NGrp]
+    return newMat
+
+
+# remove group, last group and its traits are moved in its place, and update rates
+# returns new number of groups and change in total population size
+@jit(Tuple((i8, f8))(f8[:, ::1], i8[:, ::1], i8, i8, f8[::1], 
+                     f8[::1], f8[::1], f8[::1], f8[::1],
+                     f8[:, ::1], f8[::1], f8[::1],
+                     f8[::1], f8, f8, f8, f8, f8, f8, f8[::1]), nopython=True, cache=True)
+def delete_group(grpMat, traitMat, NGrp, grpIdx, grSizeVec, 
+                 indvTree, fisTree, extTree, sizeTree,
+                 traitHist, margFrac, margSize,
+                 birthRVec, deathR, delta_indv, gr_CFis, gr_SFis, K_ind, delta_size, coopPart):
+    #remove group from trait histogram, and move traits of last group
+    update_trait_hist(traitHist, margFrac, margSize, 
+                      traitMat[0, grpIdx], traitMat[1, grpIdx], -1.)
+    traitMat[:, grpIdx] = traitMat[:, NGrp - 1]
+    return mls.delete_group(grpMat, NGrp, grpIdx, grSizeVec,
+                            indvTree, fisTree, extTree, sizeTree,
+                            birthRVec, deathR, delta_indv,
+                            gr_CFis, gr_SFis, K_ind, delta_size, coopPart)
+
+
+@jit(UniTuple(i8, 2)(f8, f8, i8, i8, f8[::1]), nopython=True, cache=True)
 def mutate_group(mutR_frac, mutR_size, fracIdx, sizeIdx, rand):
     #check for mutation in offspring size
     if rand[0].item() < mutR_size / 2:  # offspring size mutates to lower value
@@ -273,116 +311,188 @@ def mutate_group(mutR_frac, mutR_size, fracIdx, sizeIdx, rand):
     offsprFracIdx = offsprFracMatrix[offsprFracIdx, offsprSizeIdx]
     
     return (offsprFracIdx, offsprSizeIdx)
-    
-@jit(Tuple((i8[:, ::1], f8[:, ::1]))(i8[:, ::1], f8[:, ::1], i8, f8, f8), nopython=True)
-def fission_group(traitMat, grpMat, eventGroup, mutR_frac, mutR_size):
-    #get parent
-    parentGroup = grpMat[:, eventGroup].copy()
-    
-    #get parent properties
-    fracIdx = traitMat[0, eventGroup]
-    sizeIdx = traitMat[1, eventGroup]
-    offspr_frac = binCenterOffsprFrac[fracIdx]
-    offspr_size = binCenterOffsprSize[sizeIdx]
-    NCellPar = int(parentGroup.sum())
-    
-    #distribute cells   
-    destIdx, nOffspring = mls.distribute_offspring(offspr_size,
-                                                   offspr_frac, 
-                                                   NCellPar)  
-    
-    if nOffspring > 0: 
-        if np.sum(destIdx==-1) > 0:
-            #consider parent to be new group, remove old parent
-            destIdx += 1
-            nPar = 1
-        else:
-            nPar = 0
-                
-        #init new 2D array  
-        matShape2D = grpMat.shape
-        nGrpAdded = nOffspring + nPar
-        nGrpNew = matShape2D[1] + nGrpAdded - 1
-        isParent = np.zeros(matShape2D[1])
-        isParent[eventGroup] = 1
-        
-        grpMatNew = np.zeros((matShape2D[0], nGrpNew))
-        traitMatNew = np.zeros((2, nGrpNew), dtype=i8)
-        
-        #store existing groups at end, exclude parent  
-        grpMatNew[:, nGrpAdded::] = grpMat[:, isParent==0]
-        grpMatNew = grpMatNew.copy()
-        
-        traitMatNew[:, nGrpAdded::] = traitMat[:, isParent==0]
-        traitMatNew = traitMatNew.copy()
-        
-        #find non zero elements
-        ttIDxTuple = np.nonzero(parentGroup)
-        ttIDxVec = ttIDxTuple[0]
-        
-        #loop all cells in parentgroup and assign to new group
-        idx = 0
-        for ttIDx in ttIDxVec:
-            numCell = parentGroup[ttIDx]
-            while numCell>0:
-                currDest = destIdx[idx]
-                grpMatNew[ttIDx, currDest] += 1
-                numCell -= 1
-                idx += 1   
-        
-        #mutate offspring groups
-        rndMat = np.random.random((nOffspring,2))
-        idx = 0
-        if nPar==1: #re-assign parent traits 
-            traitMatNew[0, idx] = fracIdx
-            traitMatNew[1, idx] = sizeIdx
-            idx += 1
-        for n in range(nOffspring):
-            #mutate offspring
-            offsprFracIdx, offsprSizeIdx = mutate_group(mutR_frac, mutR_size, 
-                                                        fracIdx, sizeIdx, 
-                                                        rndMat[n,:])
-             
-            traitMatNew[0, idx] = offsprFracIdx
-            traitMatNew[1, idx] = offsprSizeIdx
-            idx += 1
-                                             
-    else:
-        #nothing happens
-        grpMatNew = grpMat
-        traitMatNew = traitMat
-                
-    return (traitMatNew, grpMatNew)
-
-# process group level events
-@jit(Tuple((i8[:, ::1], f8[:, ::1]))(i8[:, ::1], f8[:, ::1], f8[::1], f8[::1], f8, f8), nopython=True)
-def process_group_event(traitMat, grpMat, grpRate, rand, mutR_frac, mutR_size):
-    # get number of groups
-    NGroup = grpMat.shape[1]
-
-    # select random event based on propensity
-    eventID = util.select_random_event(grpRate, rand[0])
-    # get event type
-    eventType = math.floor(eventID/NGroup)
-    # get event group
-    eventGroup = eventID % NGroup  # % is modulo operator
-    
-    if eventType < 1:
-        # fission event - add new group and split cells
-        traitMat, grpMat = fission_group(traitMat, grpMat, 
-                                        eventGroup,
-                                        mutR_frac, mutR_size)
-    else:
-        # extinction event - remove group
-        traitMat, grpMat = remove_group(traitMat, grpMat, eventGroup)
-    return (traitMat, grpMat)
 
 
 """============================================================================
 Main model code
 ============================================================================"""
 
+# run event loop of model till next sample time, till all groups have died, or till maxT
+# entire Gillespie loop is compiled, grpMat and traitMat are capacity padded buffers
+# that are updated in place, only first NGrp columns contain live groups
+# rates are stored in sum trees (see mls.init_rate_trees) that are updated incrementally 
+# after each event, trees are passed in and returned so they are kept between samples
+# events do not allocate memory, except when group store has to grow
+@jit(Tuple((f8[:, ::1], i8[:, ::1], i8, f8, 
+            f8[::1], f8, f8[::1], f8[::1], f8[::1], f8[::1]))(
+        f8[:, ::1], i8[:, ::1], i8, u8[::1], f8[:, ::1], f8[::1], f8[::1],
+        f8[::1], f8, f8[::1], f8[::1], f8[::1], f8[::1],
+        f8, f8, f8,
+        f8[::1], f8, f8, f8, f8, f8, f8, f8,
+        f8, f8, f8, f8, f8, f8, f8, f8), nopython=True, nogil=True, cache=True)
+def run_event_loop(grpMat, traitMat, NGrp, rngState, traitHist, margFrac, margSize,
+                   grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree,
+                   currT, nextSampleT, maxT,
+                   birthRVec, deathR, delta_indv, indv_tau, inv_migrR, mutR_type, mutR_size, mutR_frac,
+                   gr_CFis, gr_SFis, K_grp, K_tot, indv_K, delta_grp, delta_tot, delta_size):
+    # get sizes
+    NTypeWMut = grpMat.shape[0]
+    NType = NTypeWMut // 2
+
+    #work buffer for rate updates
+    coopPart = np.empty(NType)
+
+    #work buffers for fission, grown when needed
+    parentGroup = np.empty(NTypeWMut)
+    pool = np.empty(NTypeWMut)
+    destSize = np.empty(16, dtype=np.int64)
+    destMat = np.empty((NTypeWMut, 16))
+    randMut = np.empty(2)
+
+    #random numbers of current time step, drawn from streaming generator
+    rand = np.empty(5)
+
+    # loop time steps
+    while currT <= maxT:
+        # calc density dependent part of extinction rate, shared by all groups
+        extinctFactor = mls.calc_extinction_factor(NTot, NGrp, K_grp, K_tot,
+                                                   delta_grp, delta_tot)
+
+        # calculate total propensities, stored in root of sum trees
+        indvProp = indv_tau * indvTree[1]
+        fisProp = fisTree[1]
+        extProp = extinctFactor * extTree[1]
+        grpProp = fisProp + extProp
+        migrProp = inv_migrR * NTot
+        totProp = indvProp + grpProp + migrProp
+
+        # get random numbers of current time step
+        util.fill_rand(rngState, rand)
+
+        # calc time step
+        dt = -1 * math.log(rand[1]) / totProp
+
+        # select group or individual event
+        rescaledRand = rand[0] * totProp
+        if rescaledRand < indvProp:
+            # individual level event - select and process individual level event
+            # rates are stored per group slot, pass capacity to decode event
+            eventID = util.select_random_event_sumtree(indvTree, rand[2])
+            eventGroup, groupDeathID = mls.perform_indv_event(grpMat, eventID, mutR_type,
+                                                              rand[3], NType, grpMat.shape[1])
+            if groupDeathID > -1:  # remove empty group
+                NGrp, dNTot = delete_group(grpMat, traitMat, NGrp, groupDeathID, grSizeVec,
+                                           indvTree, fisTree, extTree, sizeTree,
+                                           traitHist, margFrac, margSize,
+                                           birthRVec, deathR, delta_indv,
+                                           gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            else:  # only rates of event group change
+                dNTot = mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, grpMat,
+                                               grSizeVec, eventGroup, birthRVec, deathR,
+                                               delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            NTot += dNTot
+        elif rescaledRand < (indvProp + migrProp):
+            # migration event - select and process migration event
+            grpIDSource, grpIDTarget, groupDeathID = \
+                mls.process_migration_event(grpMat, sizeTree, NGrp, NType, rand[2:5])
+            # update target first, it can be moved when source is removed
+            mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, grpMat,
+                                   grSizeVec, grpIDTarget, birthRVec, deathR,
+                                   delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            if groupDeathID > -1:  # remove empty group
+                NGrp, _ = delete_group(grpMat, traitMat, NGrp, groupDeathID, grSizeVec,
+                                       indvTree, fisTree, extTree, sizeTree,
+                                       traitHist, margFrac, margSize,
+                                       birthRVec, deathR, delta_indv,
+                                       gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            else:  # only rates of source and target group change
+                mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, grpMat,
+                                       grSizeVec, grpIDSource, birthRVec, deathR,
+                                       delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+        else:
+            # group level event - select fission or extinction, then select group
+            if rand[2] * grpProp < fisProp:
+                eventGroup = util.select_random_event_sumtree(fisTree, rand[3])
+                # fission event - draw offspring with traits of parent
+                fracIdx = traitMat[0, eventGroup]
+                sizeIdx = traitMat[1, eventGroup]
+                nOffspring, nPerOff, nLastOff, nParRemain = mls.draw_offspring_number(
+                    binCenterOffsprSize[sizeIdx], binCenterOffsprFrac[fracIdx], 
+                    int(grSizeVec[eventGroup]), rngState)
+
+                # only add daughters if not empty
+                if nOffspring > 0:
+                    # grow group store if needed, rates are recalculated for new capacity
+                    if NGrp + nOffspring > grpMat.shape[1]:
+                        grpMat = mls.grow_groupMat(grpMat, NGrp, 2 * (NGrp + nOffspring))
+                        traitMat = grow_traitMat(traitMat, NGrp, grpMat.shape[1])
+                        grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree = \
+                            mls.init_rate_trees(grpMat, NGrp, birthRVec, deathR, delta_indv,
+                                                gr_CFis, gr_SFis, indv_K, delta_size)
+                    if nOffspring + 1 > destSize.size:
+                        destSize = np.empty(2 * (nOffspring + 1), dtype=np.int64)
+                        destMat = np.empty((NTypeWMut, destSize.size))
+
+                    #distribute cells over offspring, last destination is parent
+                    destSize[0:nOffspring] = nPerOff
+                    destSize[nOffspring - 1] = nLastOff
+                    destSize[nOffspring] = nParRemain
+                    parentGroup[:] = grpMat[:, eventGroup]
+                    mls.split_group_inplace(parentGroup, destSize, nOffspring + 1, 
+                                            destMat, pool, rngState)
+
+                    # add new daughter groups with mutated traits at end
+                    for oo in range(nOffspring):
+                        util.fill_rand(rngState, randMut)
+                        offsprFracIdx, offsprSizeIdx = mutate_group(mutR_frac, mutR_size, 
+                                                                    fracIdx, sizeIdx, randMut)
+                        traitMat[0, NGrp] = offsprFracIdx
+                        traitMat[1, NGrp] = offsprSizeIdx
+                        update_trait_hist(traitHist, margFrac, margSize, 
+                                          offsprFracIdx, offsprSizeIdx, 1.)
+                        NGrp, dNTot = mls.insert_group(grpMat, NGrp, destMat[:, oo], grSizeVec,
+                                                       indvTree, fisTree, extTree, sizeTree,
+                                                       birthRVec, deathR, delta_indv,
+                                                       gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                        NTot += dNTot
+
+                    if nParRemain > 0: # update parent, it keeps its traits
+                        grpMat[:, eventGroup] = destMat[:, nOffspring]
+                        dNTot = mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, 
+                                                       grpMat, grSizeVec, eventGroup, 
+                                                       birthRVec, deathR, delta_indv, 
+                                                       gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                    else: #remove parent
+                        NGrp, dNTot = delete_group(grpMat, traitMat, NGrp, eventGroup, grSizeVec,
+                                                   indvTree, fisTree, extTree, sizeTree,
+                                                   traitHist, margFrac, margSize,
+                                                   birthRVec, deathR, delta_indv,
+                                                   gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                    NTot += dNTot
+            else:
+                # extinction event - remove group
+                eventGroup = util.select_random_event_sumtree(extTree, rand[3])
+                NGrp, dNTot = delete_group(grpMat, traitMat, NGrp, eventGroup, grSizeVec,
+                                           indvTree, fisTree, extTree, sizeTree,
+                                           traitHist, margFrac, margSize,
+                                           birthRVec, deathR, delta_indv,
+                                           gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                NTot += dNTot
+
+        if NGrp == 0:  # if all groups have died, end simulation
+            break
+
+        # update time, return to python to sample model
+        currT += dt
+        if currT >= nextSampleT:
+            break
+
+    return (grpMat, traitMat, NGrp, currT, grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree)
+
+
 # main model
+# if traitDistr_file is set, trait distributions are streamed to that file 
+# (see util.open_traitDistr_file) and only the last one is returned
 def run_model(model_par):
     
     #create state variables
@@ -414,13 +524,14 @@ def run_model(model_par):
         
     # init counters
     currT = 0
-    ttR = 0
     sampleIdx = 0
     
-    # get matrix with random numbers
-    rndSize1 = 7
-    rndSize0 = int(1E6)
-    randMat = util.create_randMat(rndSize0, rndSize1)
+    #get seed of random number generator: explicit seed, derived from master seed,
+    #or fresh entropy from OS if neither is set
+    seed = util.get_run_seed(model_par)
+
+    # init streaming random number generator
+    rngState = util.create_rng(seed)
     
     # initialize outputMat matrix
     outputMat, traitDistr = init_outputMat_matrix(model_par)
@@ -430,99 +541,47 @@ def run_model(model_par):
     
     # initialize group matrix
     traitMat, grpMat = init_traitMat(model_par)
+    traitHist, margFrac, margSize = init_trait_hist(traitMat)
     NGroup = grpMat.shape[1]
 
-    #init dynamic helper vectors
-    onesNGrp, onesIndR, onesGrR, indvRate, grpRate = mls.create_helper_vector(
-        NGroup, NType)
-
     # get first sample of init state
-    sampleIdx = sample_model(traitMat, grpMat, 
+    sampleIdx = sample_model(traitHist, margFrac, margSize, grpMat, 
                              outputMat, traitDistr, 
                              sampleIdx, currT, mavInt, rmsInt, 
                              stateVarPlus)
 
-    # loop time steps
+    #copy groups to group store with spare capacity
+    grpMat = mls.grow_groupMat(grpMat, NGroup, 2 * NGroup)
+    traitMat = grow_traitMat(traitMat, NGroup, grpMat.shape[1])
+
+    #init rates, they are kept and updated incrementally by event loop
+    rateTrees = mls.init_rate_trees(grpMat, NGroup, birthRVec, deathR, delta_indv,
+                                    gr_CFis, gr_SFis, indv_K, delta_size)
+
+    # run compiled event loop till next sample time
     while currT <= maxT:
-        # reset rand matrix when used up
-        if ttR >= rndSize0:
-            randMat = util.create_randMat(rndSize0, rndSize1)
-            ttR = 0 
-
-        #calc group state
-        grSizeVec, NTot = mls.calc_group_state(grpMat, 
-                                               onesNType, onesNGrp)    
-
-        # calc rates of individual level events
-        mls.calc_indv_rates(indvRate, grpMat, grSizeVec, birthRVec,
-                            deathR, delta_indv, NType, NGroup)
-        
-        
-        # calc rates of group events
-        mls.calc_group_rates(grpRate, grpMat, grSizeVec, NTot, NGroup,
-                            gr_CFis, gr_SFis, alpha_Fis, K_grp, K_tot,
-                            delta_grp, delta_tot, delta_size)
-
-        # calculate total propensities
-        indvProp = indv_tau * (onesIndR @ indvRate)
-        grpProp = onesGrR @ grpRate
-        migrProp = inv_migrR * NTot
-        totProp = indvProp + grpProp + migrProp
+        nextSampleT = sampleInt * sampleIdx
+        grpMat, traitMat, NGroup, currT, *rateTrees = run_event_loop(
+            grpMat, traitMat, NGroup, rngState, traitHist, margFrac, margSize,
+            *rateTrees, currT, nextSampleT, maxT,
+            birthRVec, deathR, delta_indv, indv_tau, inv_migrR, mutR_type, mutR_size, mutR_frac,
+            gr_CFis, gr_SFis, K_grp, K_tot, indv_K, delta_grp, delta_tot, delta_size)
 
-        # calc time step
-        dt = -1 * math.log(randMat[ttR, 1]) / totProp
+        if NGroup == 0: #if all groups have died, end simulation
+            sampleIdx = sample_extinction(outputMat, traitDistr, sampleIdx, currT, stateVarPlus)
+            print('System has gone extinct')
+            break
 
-        # select group or individual event
-        rescaledRand = randMat[ttR, 0] * totProp
-        groupsHaveChanged = False
-        if rescaledRand < indvProp:
-            # individual level event - select and process individual level event
-            groupDeathID = mls.process_indv_event(grpMat, indvRate, 
-                                                  mutR_type, randMat[ttR, 2:4], 
-                                                  NType, NGroup)
-            if groupDeathID > -1:  # remove empty group
-                traitMat, grpMat = remove_group(traitMat, grpMat, groupDeathID)
-                groupsHaveChanged = True
-        elif rescaledRand < (indvProp + migrProp):
-            # migration event - select and process migration event
-            groupDeathID = mls.process_migration_event(grpMat, grSizeVec,
-                                                       NGroup, NType, 
-                                                       randMat[ttR, 2:5])
-            if groupDeathID > -1:  # remove empty group
-                traitMat, grpMat = remove_group(traitMat, grpMat, groupDeathID)
-                groupsHaveChanged = True
-        else:
-            # group level event - select and process group level event
-            traitMat, grpMat = process_group_event(traitMat, grpMat, 
-                                                    grpRate, randMat[ttR, 2:4],
-                                                    mutR_frac, mutR_size)
-            groupsHaveChanged = True
-         
-        # update group matrices if needed    
-        if groupsHaveChanged:
-            NGroup = grpMat.shape[1]
-            if NGroup > 0:  #update group matrices
-                onesNGrp, onesIndR, onesGrR, indvRate, grpRate = mls.create_helper_vector(
-                    NGroup, NType) 
-            else: #otherwise, if all groups have died, end simulation
-                sampleIdx = sample_extinction(outputMat, traitDistr, sampleIdx, currT, stateVarPlus)
-                print('System has gone extinct')
-                break
-
-        # update time
-        currT += dt
-        ttR += 1
         # sample model at intervals
-        nextSampleT = sampleInt * sampleIdx
         if currT >= nextSampleT:
-            sampleIdx = sample_model(traitMat, grpMat, 
+            sampleIdx = sample_model(traitHist, margFrac, margSize, grpMat[:, 0:NGroup], 
                              outputMat, traitDistr, 
                              sampleIdx, currT, mavInt, rmsInt, 
                              stateVarPlus)
             
     # cut off non existing time points at end
     outputMat = outputMat[0:sampleIdx]
-    traitDistr = traitDistr[0:sampleIdx, :, :]
+    traitDistr = util.close_traitDistr(traitDistr, sampleIdx)
     
     if outputMat['NCoop'][-1] == 0:
         outputMat['NCoop_mav'][-1] = 0
@@ -542,7 +601,9 @@ def single_run_save(model_par, mainName):
         
         mainName {[string]} -- [filename for data file, appended with parameter settings]
     Returns:
-        [numpy array] -- [trait distribution at last timepoint]
+        [numpy 3D array] -- [trait distribution at last timepoint only (1 x nBinOffsprFrac x nBinOffsprSize),
+                             distributions of all timepoints are stored in .npz file as sparse 
+                             float32 frames, read them with util.load_traitDistr / util.get_traitDistr_frame]
     """
     #create file name, append mainName with parameter settings
     parNameAbbrev = {
@@ -575,11 +636,13 @@ def single_run_save(model_par, mainName):
     parName = ''.join(parName)
     fileName = mainName + parName + '.npz'
     
-    #run model and save data to disk
+    #run model and save data to disk, random numbers are derived from master seed if no seed is set
+    #trait distributions are streamed to same file while model runs
+    model_par = util.set_run_seed(model_par)
+    model_par['traitDistr_file'] = fileName
     #try: 
     outputMat, traitDistr = run_model(model_par)  
-    np.savez(fileName, output=outputMat, traitDistr=traitDistr,
-             model_par=[model_par])
+    util.append_npz(fileName, output=outputMat, model_par=[model_par])
 #    except:
 #        print("error with run")
 #        traitDistr = np.full((1, nBinOffsprFrac, nBinOffsprSize), np.nan)
@@ -19,14 +19,21 @@ Import dependencies & define global constants
 ============================================================================"""
 
 from numba.types import UniTuple, Tuple
-from numba import jit, void, f8, i8
+from numba import jit, void, f8, i8, u8, b1
 import math
 import numpy as np
+import scipy.stats as stats
 from mainCode import MlsGroupDynamics_utilities as util
+from concurrent.futures import ThreadPoolExecutor
 import time
 
 #output variables to store
 stateVar = ['NTot', 'fCoop', 'NGrp', 'groupSizeAv', 'groupSizeMed']
+nStateVar = len(stateVar)
+
+#min expected number of individual events per group covered by tau leap, 
+#leap costs about as much as this number of exact events per leaped group
+TAU_MIN_EVENT = 10
 
 
 """============================================================================
@@ -35,11 +42,18 @@ Init functions
 
 
 # initialize output matrix
+# if final_state_only is set outputs are ring buffers that only hold samples needed
+# for moving average and rms error, and distributions only hold last sample
 def init_output_matrix(model_par):
     # get parameters
-    sampleInt = model_par['sampleInt']
-    maxT = model_par['maxT']
-    numTSample = int(np.ceil(maxT / sampleInt) + 1)
+    maxT, _, sampleInt, mavInt, rmsInt = calc_time_steps(model_par)
+    numTSample = calc_num_sample(maxT, sampleInt)
+    if 'final_state_only' in model_par and model_par['final_state_only']:
+        numTRow = max(mavInt, rmsInt) + 1
+        numTRowDist = 1
+    else:
+        numTRow = numTSample
+        numTRowDist = numTSample
 
     #create list of state variables to store
     addVar = ['rms_err_NTot', 'rms_err_NGrp', 'time']
@@ -55,22 +69,43 @@ def init_output_matrix(model_par):
     dType = np.dtype(dTypeList)
 
     # initialize outputs to NaN
-    output = np.full(numTSample, np.nan, dType)
+    output = np.full(numTRow, np.nan, dType)
     output['time'][0] = 0
 
     # init matrix to track distribution fraction of cooperators
     nBinFCoop = 20
     binFCoop = np.linspace(0, 1, nBinFCoop)
-    distFCoop = np.full((numTSample, nBinFCoop-1), np.nan)
+    distFCoop = np.full((numTRowDist, nBinFCoop-1), np.nan)
 
     # init matrix to track distribution fraction of cooperators
     nMax = model_par['indv_K'] #expected EQ. group size if all cooperator
     binGrSize = np.arange(0., nMax+1.)
-    distGrSize = np.full((numTSample, int(nMax)), np.nan)
+    distGrSize = np.full((numTRowDist, int(nMax)), np.nan)
 
     return (output, distFCoop, binFCoop, distGrSize, binGrSize)
 
 
+# initialize running sums used to calc moving average and rms error
+# stores sum over moving average window of each state variable, followed by
+# shift, shifted sum and shifted sum of squares of NTot_mav and NGrp_mav over rms window
+def init_window_stat(model_par):
+    nVar = nStateVar + 2 * int(model_par['indv_NType'])
+    runStat = np.zeros(nVar + 6)
+    return runStat
+
+
+# initialize batch means of statistical stopping rule, stores sums of current batch
+# followed by means of all batches of 5 samples of NTot, fCoop, and NGrp
+def init_stop_stat(model_par):
+    if 'stop_rule' in model_par and model_par['stop_rule'] == 'batchmeans':
+        maxT, _, sampleInt, _, _ = calc_time_steps(model_par)
+        numTBatch = calc_num_sample(maxT, sampleInt) // 5 + 1
+    else:
+        numTBatch = 1
+    stopStat = np.zeros((numTBatch, 3))
+    return stopStat
+
+
 # initialize group matrix
 # each column is a group and lists number of [A,A',B,B'] cells
 def init_groupMat(model_par):
@@ -98,7 +133,7 @@ Sample model code
 ============================================================================"""
 
 #create distribution
-@jit(f8[:](f8[:], f8[:]), nopython=True)
+@jit(f8[:](f8[:], f8[:]), nopython=True, cache=True)
 def calc_distri(dataVec, binEdges):
     NGrp = dataVec.size
     # get distribution of average cooperator fraction per host
@@ -107,7 +142,7 @@ def calc_distri(dataVec, binEdges):
     return distribution
 
 # calculate average cooperator fraction in total population
-@jit(Tuple((f8, f8, f8, f8, f8[:], f8[:], f8[:]))(f8[:, :]), nopython=True)
+@jit(Tuple((f8, f8, f8, f8, f8[:], f8[:], f8[:]))(f8[:, :]), nopython=True, cache=True)
 def calc_cell_stat(groupMat):
     # calc total number of individuals per group, use matrix product for speed
     grSizeVec = groupMat.sum(0)
@@ -185,36 +220,6 @@ def sample_model(groupMatrix, output, distFCoop, binFCoop,
     sample_idx += 1
     return sample_idx
 
-# sample model
-def sample_nan(groupMatrix, output, distFCoop, binFCoop,
-                 distGrSize, binGrSize, sample_idx, currT, mavInt, rmsInt, stateVarPlus):
-    # store time
-    output['time'][sample_idx] = currT
-
-    # calc number of groups
-    shapeGroupMat= groupMatrix.shape
-    NType = int(shapeGroupMat[0] / 2)
-
-    # calc total population sizes
-    for tt in range(NType):
-        output['N%i' %tt][sample_idx] = np.nan
-        output['N%imut' %tt][sample_idx] = np.nan
-
-    output['NTot'][sample_idx] = np.nan
-    output['fCoop'][sample_idx] = np.nan
-
-    output['NGrp'][sample_idx] = np.nan
-    output['groupSizeAv'][sample_idx] = np.nan
-    output['groupSizeMed'][sample_idx] = np.nan
-
-    #calc moving average
-    for varname in stateVarPlus:
-        outname = varname + '_mav'
-        output[outname][sample_idx] = np.nan
-
-    sample_idx += 1
-    return sample_idx
-
 # sample model
 def sample_extinction(output, distFCoop, binFCoop,
                       distGrSize, sample_idx, currT, stateVarPlus):
@@ -252,63 +257,356 @@ def sample_group_prop_end(groupMat):
     return (grSizeVec, fCoop_group)
 
 
+"""============================================================================
+Compiled sample model code, used inside compiled event loop
+output is 2D float view of structured output matrix, columns are ordered as:
+    stateVarPlus / stateVarPlus_mav / rms_err_NTot / rms_err_NGrp / time
+outputs are used as ring buffers: sample i is stored in row i % number of rows,
+with full output matrix this is row i
+============================================================================"""
+
+# calc number of samples of run
+@jit(i8(f8, f8), nopython=True, cache=True)
+def calc_num_sample(maxT, sampleInt):
+    return int(math.ceil(maxT / sampleInt)) + 1
+
+
+# update running sums of window and calc moving averages and rms errors of sample
+# sums are updated in O(1) per sample, and are recalculated from stored samples
+# every max(mavInt, rmsInt) samples to prevent accumulation of rounding errors
+@jit(void(f8[:, ::1], f8[::1], i8, i8, i8), nopython=True, cache=True)
+def update_window_stat(output, runStat, sample_idx, mavInt, rmsInt):
+    nRow = output.shape[0]
+    nVar = runStat.size - 6
+    row = sample_idx % nRow
+    isReset = (sample_idx % max(mavInt, rmsInt)) == 0
+
+    # update sum of state variables over moving average window
+    if isReset:
+        runStat[0:nVar] = 0
+        for ii in range(max(0, sample_idx - mavInt + 1), sample_idx + 1):
+            for vv in range(nVar):
+                runStat[vv] += output[ii % nRow, vv]
+    else:
+        oldRow = (sample_idx - mavInt) % nRow
+        for vv in range(nVar):
+            runStat[vv] += output[row, vv]
+            if sample_idx >= mavInt:
+                runStat[vv] -= output[oldRow, vv]
+
+    #calc moving average
+    if sample_idx >= 1:
+        nMav = min(sample_idx + 1, mavInt)
+        for vv in range(nVar):
+            output[row, nVar + vv] = runStat[vv] / nMav
+
+    # update sums of NTot_mav and NGrp_mav over rms window, moving average is
+    # not defined for first sample, sums are shifted by sampled value at last reset
+    for kk in range(2):
+        col = nVar + 2 * kk
+        idx = nVar + 3 * kk
+        if isReset:
+            runStat[idx] = output[row, 2 * kk]
+            runStat[idx + 1] = 0
+            runStat[idx + 2] = 0
+            for ii in range(max(1, sample_idx - rmsInt + 1), sample_idx + 1):
+                dev = output[ii % nRow, col] - runStat[idx]
+                runStat[idx + 1] += dev
+                runStat[idx + 2] += dev * dev
+        elif sample_idx >= 1:
+            dev = output[row, col] - runStat[idx]
+            runStat[idx + 1] += dev
+            runStat[idx + 2] += dev * dev
+            if sample_idx - rmsInt >= 1:
+                dev = output[(sample_idx - rmsInt) % nRow, col] - runStat[idx]
+                runStat[idx + 1] -= dev
+                runStat[idx + 2] -= dev * dev
+
+    # calc rms error relative to moving average
+    if sample_idx >= rmsInt:
+        rmsErr = np.zeros(2)
+        for kk in range(2):
+            idx = nVar + 3 * kk
+            av = runStat[idx + 1] / rmsInt
+            rmsErr[kk] = math.sqrt(max(runStat[idx + 2] / rmsInt - av * av, 0.))
+        if output[row, nVar] > 0:
+            output[row, 2 * nVar] = rmsErr[0] / output[row, nVar]
+        else:
+            output[row, 2 * nVar] = np.nan
+        output[row, 2 * nVar + 1] = rmsErr[1] / output[row, nVar + 2]
+
+    return None
+
+
+# sample model
+@jit(i8(f8[:, :], f8[:, ::1], f8[:, ::1], f8[::1], f8[:, ::1], f8[::1], f8[::1],
+        i8, f8, i8, i8), nopython=True, cache=True)
+def sample_model_jit(groupMatrix, output, distFCoop, binFCoop,
+                     distGrSize, binGrSize, runStat, sample_idx, currT, mavInt, rmsInt):
+    # get column indices
+    NType = int(groupMatrix.shape[0] / 2)
+    idxTime = 2 * (nStateVar + 2 * NType) + 2
+    row = sample_idx % output.shape[0]
+    rowDist = sample_idx % distFCoop.shape[0]
+
+    # store time
+    output[row, idxTime] = currT
+
+    # calc number of groups
+    NGrp = groupMatrix.shape[1]
+
+    # get group statistics
+    NTot, NCoop, groupSizeAv, groupSizeMed, NTot_type, fCoop_group, grSizeVec = calc_cell_stat(
+        groupMatrix)
+
+    # calc total population sizes
+    for tt in range(NType):
+        output[row, nStateVar + tt] = NTot_type[tt*2]
+        output[row, nStateVar + NType + tt] = NTot_type[tt*2+1]
+
+    output[row, 0] = NTot
+    output[row, 1] = NCoop / NTot
+    output[row, 2] = NGrp
+    output[row, 3] = groupSizeAv
+    output[row, 4] = groupSizeMed
+
+    # calc moving average and rms error
+    update_window_stat(output, runStat, sample_idx, mavInt, rmsInt)
+
+    # calc distribution groupsizes
+    distGrSize[rowDist, :] = calc_distri(grSizeVec, binGrSize)
+
+    # calc distribution fraction cooperator
+    distFCoop[rowDist, :] = calc_distri(fCoop_group, binFCoop)
+
+    sample_idx += 1
+    return sample_idx
+
+
+# sample model
+@jit(i8(f8[:, ::1], i8, f8, i8), nopython=True, cache=True)
+def sample_nan_jit(output, sample_idx, currT, NType):
+    nVar = nStateVar + 2 * NType
+    row = sample_idx % output.shape[0]
+    # store time
+    output[row, 2 * nVar + 2] = currT
+    # set state variables and moving averages to nan
+    output[row, 0:2 * nVar] = np.nan
+
+    sample_idx += 1
+    return sample_idx
+
+
+# sample model
+@jit(i8(f8[:, ::1], f8[:, ::1], f8[:, ::1], i8, f8, i8), nopython=True, cache=True)
+def sample_extinction_jit(output, distFCoop, distGrSize, sample_idx, currT, NType):
+    nVar = nStateVar + 2 * NType
+    row = sample_idx % output.shape[0]
+    rowDist = sample_idx % distFCoop.shape[0]
+    # store time
+    output[row, 2 * nVar + 2] = currT
+    # set state variables, moving averages and rms errors to zero
+    output[row, 0:2 * nVar + 2] = 0
+
+    # calc distribution groupsizes
+    distGrSize[rowDist, :] = 0
+
+    # calc distribution fraction cooperator
+    distFCoop[rowDist, :] = 0
+
+    sample_idx += 1
+    return sample_idx
+
+
+"""============================================================================
+Statistical stopping rule
+NTot, fCoop and NGrp are averaged over batches of 5 samples, batch means are
+stored in rows 1 and higher of stopStat, row 0 holds sums of current batch
+warm-up is removed with MSER-5 truncation (White 1997), run stops when half width
+of batch means confidence interval of remaining samples is below stop_relPrec
+times mean, for all three variables
+============================================================================"""
+
+# add last sample to batch of 5 samples, returns True if batch is complete
+@jit(b1(f8[:, ::1], f8[:, ::1], i8, i8), nopython=True, cache=True)
+def update_batch_means(stopStat, output, sampleIdx, lastRow):
+    for vv in range(3):
+        stopStat[0, vv] += output[lastRow, vv]
+    if sampleIdx % 5 > 0:
+        return False
+    # store mean of complete batch
+    batchIdx = sampleIdx // 5
+    for vv in range(3):
+        stopStat[batchIdx, vv] = stopStat[0, vv] / 5
+        stopStat[0, vv] = 0
+    return True
+
+
+# check if mean of NTot, fCoop and NGrp is estimated with requested precision
+@jit(b1(f8[:, ::1], i8, f8, i8, f8), nopython=True, cache=True)
+def check_batch_means(stopStat, nBatch5, stop_relPrec, stop_nBatch, stop_tQuant):
+    for vv in range(3):
+        # MSER-5: find truncation point d that minimizes variance of mean of remaining batches
+        # only first half is searched, if optimum is at end of search warm-up has not ended
+        maxTrunc = nBatch5 // 2
+        sumZ = 0.
+        sumZ2 = 0.
+        minMser = np.inf
+        dTrunc = 0
+        for dd in range(nBatch5 - 1, -1, -1):
+            zz = stopStat[dd + 1, vv]
+            sumZ += zz
+            sumZ2 += zz * zz
+            if dd <= maxTrunc:
+                nRemain = nBatch5 - dd
+                mser = (sumZ2 - sumZ * sumZ / nRemain) / (nRemain * nRemain)
+                if mser <= minMser:
+                    minMser = mser
+                    dTrunc = dd
+        if dTrunc == maxTrunc:
+            return False
+
+        # group remaining batches in stop_nBatch batches, earliest leftover batches are skipped
+        batchSize = (nBatch5 - dTrunc) // stop_nBatch
+        if batchSize < 1:
+            return False
+        startIdx = nBatch5 - batchSize * stop_nBatch + 1
+        sumY = 0.
+        sumY2 = 0.
+        for bb in range(stop_nBatch):
+            yy = stopStat[startIdx + bb * batchSize: startIdx + (bb + 1) * batchSize, vv].mean()
+            sumY += yy
+            sumY2 += yy * yy
+
+        # calc half width of confidence interval of mean
+        meanY = sumY / stop_nBatch
+        varY = max(sumY2 - sumY * meanY, 0.) / (stop_nBatch - 1)
+        halfWidth = stop_tQuant * math.sqrt(varY / stop_nBatch)
+        if halfWidth > stop_relPrec * abs(meanY):
+            return False
+
+    return True
+
+
+# sample model at intervals and check if run should end
+# returns new sample index, whether run has ended, and whether to return to python
+# if stop_relPrec > 0 statistical stopping rule is used, otherwise rms error thresholds
+@jit(Tuple((i8, b1, b1))(f8[:, :], f8[:, ::1], f8[:, ::1], f8[::1], f8[:, ::1], f8[::1],
+                        f8[::1], f8[:, ::1], i8, i8, i8, f8, f8, f8, i8, i8, f8, f8, f8,
+                        f8, i8, f8),
+     nopython=True, cache=True)
+def sample_and_check(groupMat, output, distFCoop, binFCoop, distGrSize, binGrSize,
+                     runStat, stopStat,
+                     sampleIdx, sampleStop, numTSample, currT, minTRun, sampleInt, mavInt, rmsInt,
+                     rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+                     stop_relPrec, stop_nBatch, stop_tQuant):
+    NType = int(groupMat.shape[0] / 2)
+    nVar = nStateVar + 2 * NType
+    idxRmsNTot = 2 * nVar
+    idxRmsNGrp = 2 * nVar + 1
+    # row of last sample
+    lastRow = (sampleIdx - 1) % output.shape[0]
+
+    # sample model at intervals
+    nextSampleT = sampleInt * sampleIdx
+    if currT >= nextSampleT and sampleIdx < numTSample:
+        sampleIdx = sample_model_jit(groupMat, output, distFCoop, binFCoop,
+                                     distGrSize, binGrSize, runStat, sampleIdx, currT,
+                                     mavInt, rmsInt)
+        lastRow = (sampleIdx - 1) % output.shape[0]
+        # check if steady state has been reached
+        if stop_relPrec > 0:
+            isBatchReady = update_batch_means(stopStat, output, sampleIdx, lastRow)
+            if isBatchReady and currT > minTRun:
+                if check_batch_means(stopStat, sampleIdx // 5, stop_relPrec,
+                                     stop_nBatch, stop_tQuant):
+                    return (sampleIdx, True, True)
+        elif currT > minTRun:
+            NCoopStable = output[lastRow, idxRmsNTot] < rms_err_trNCoop
+            NGrpStable = output[lastRow, idxRmsNGrp] < rms_err_trNGr
+
+            if NCoopStable and NGrpStable:
+                return (sampleIdx, True, True)
+
+        # check if population size remains in bounds
+        if output[lastRow, 0] > maxPopSize:
+            sampleIdx = sample_nan_jit(output, sampleIdx - 1, currT, NType)
+            return (sampleIdx, True, True)
+
+        # return to python when batch of samples is ready
+        if sampleIdx >= sampleStop:
+            return (sampleIdx, False, True)
+
+    # check if simulation ends before reaching steady state
+    if output[lastRow, 0] > maxPopSize:
+        sampleIdx = sample_nan_jit(output, sampleIdx - 1, currT, NType)
+        return (sampleIdx, True, True)
+
+    return (sampleIdx, False, False)
+
+
 """============================================================================
 Sub functions individual dynamics
 ============================================================================"""
 
-# calculate birth and death rate for all groups and types
-# @jit provides speedup by compling this function at start of execution
-# To use @jit provide the data type of output and input, nopython=true makes compilation faster
-@jit(void(f8[::1], f8[:, ::1], f8[::1], f8[::1], f8, f8, i8, i8), nopython=True)
-def calc_indv_rates(rates, groupMat, grSizeVec, birthRVec, deathR, delta_indv, NType, NGrp):
+# calc density of cooperating partners of all types in single group, stored in coopPart
+# for type tt this is product of densities of all other types: n1/N * .. * n(tt-1)/N * n(tt+1)/N * ...
+# for single type it is density of cooperators: n0/N
+# uses products of types before (prefix) and after (suffix) tt, so cost is linear in NType
+@jit(void(f8[::1], f8[:, ::1], i8, f8, i8), nopython=True, cache=True)
+def calc_coop_part(coopPart, groupMat, grpIdx, grSize, NType):
+    if NType == 1:
+        coopPart[0] = groupMat[0, grpIdx] / grSize
+    else:
+        prefix = 1.
+        for tt in range(NType):
+            coopPart[tt] = prefix
+            prefix *= groupMat[tt * 2, grpIdx] / grSize
+        suffix = 1.
+        for tt in range(NType - 1, -1, -1):
+            coopPart[tt] *= suffix
+            suffix *= groupMat[tt * 2, grpIdx] / grSize
+    return None
+
+# recalculate birth and death rate of all types in single group, and update sum tree
+# leaf (eventType * NGrp + grpIdx) holds rate of event, with NGrp the capacity of groupMat:
+# eventType 0 .. 2*NType-1 is birth of cell type, 2*NType .. 4*NType-1 is death of cell type
+# coopPart (NType) is work buffer, allocated once by caller
+@jit(void(f8[::1], f8[:, ::1], i8, f8, f8[::1], f8, f8, i8, i8, f8[::1]), nopython=True, cache=True)
+def update_indv_rates(indvTree, groupMat, grpIdx, grSize, birthRVec, deathR, delta_indv, NType, NGrp,
+                      coopPart):
+    #calc density of cooperating partners of all types
+    calc_coop_part(coopPart, groupMat, grpIdx, grSize, NType)
 
     #loop cell types
     for tt in range(NType):
         #setup indices
         cIdx = 2 * tt
         dIdx = 2 * tt + 1
-        bIdxC1 = cIdx * NGrp
-        bIdxD1 = dIdx * NGrp
+        bIdxC1 = cIdx * NGrp + grpIdx
+        bIdxD1 = dIdx * NGrp + grpIdx
         dIdxC1 = bIdxC1 + 2 * NType * NGrp
         dIdxD1 = bIdxD1 + 2 * NType * NGrp
 
-        #calc density of cooperating partners
-        if NType == 1:
-            #coopPart = n0/grSizeVec
-            coopPart = groupMat[0, :] / grSizeVec
-        else:
-            #coopPart for type 1 = n2/grSizeVec * n3/grSizeVec * ... * n(NType)/grSizeVec
-            #coopPart for type 2 = n1/grSizeVec * n3/N_gr * ... * n(NType)/N_gr
-            #etc
-            #vector of ones with size NGrp
-            coopPart = np.ones(NGrp)
-            for pp in range(NType):
-                if pp != tt: #exclude self
-                    coopPart *= groupMat[pp*2, :] / grSizeVec
-
         # calc rates
-        rates[bIdxC1: bIdxC1 + NGrp] = birthRVec[cIdx] * coopPart * groupMat[cIdx, :]
-        rates[bIdxD1: bIdxD1 + NGrp] = birthRVec[dIdx] * coopPart * groupMat[dIdx, :]
-
+        util.update_sumtree(indvTree, bIdxC1, birthRVec[cIdx] * coopPart[tt] * groupMat[cIdx, grpIdx])
+        util.update_sumtree(indvTree, bIdxD1, birthRVec[dIdx] * coopPart[tt] * groupMat[dIdx, grpIdx])
 
         if delta_indv != 0:
-            rates[dIdxC1: dIdxC1 + NGrp] = deathR * groupMat[cIdx, :] * (grSizeVec ** delta_indv)
-            rates[dIdxD1: dIdxD1 + NGrp] = deathR * groupMat[dIdx, :] * (grSizeVec ** delta_indv)
+            util.update_sumtree(indvTree, dIdxC1, deathR * groupMat[cIdx, grpIdx] * (grSize ** delta_indv))
+            util.update_sumtree(indvTree, dIdxD1, deathR * groupMat[dIdx, grpIdx] * (grSize ** delta_indv))
         else:
-            rates[dIdxC1: dIdxC1 + NGrp] = deathR * groupMat[cIdx, :]
-            rates[dIdxD1: dIdxD1 + NGrp] = deathR * groupMat[dIdx, :]
+            util.update_sumtree(indvTree, dIdxC1, deathR * groupMat[cIdx, grpIdx])
+            util.update_sumtree(indvTree, dIdxD1, deathR * groupMat[dIdx, grpIdx])
 
     return None
 
-# process individual level events
-@jit(i8(f8[:, ::1], f8[::1], f8, f8[::1], i8, i8), nopython=True)
-def process_indv_event(groupMat, indvRate, mutR, rand, NType, NGrp):
+# perform individual level event eventID, events are ordered as in update_indv_rates
+@jit(UniTuple(i8, 2)(f8[:, ::1], i8, f8, f8, i8, i8), nopython=True, cache=True)
+def perform_indv_event(groupMat, eventID, mutR, randMut, NType, NGrp):
     # Note: groupMat is updated in place, it does not need to be returned
     NTypeWMut = NType*2
 
-    # select random event based on propensity
-    eventID = util.select_random_event(indvRate, rand[0])
-
     # get event type
     eventType = math.floor(eventID/NGrp)
     # get event group
@@ -321,7 +619,7 @@ def process_indv_event(groupMat, indvRate, mutR, rand, NType, NGrp):
         # add cell to group, check for mutations first
         cellType = eventType
         if (cellType % 2) == 0:  # Wild type cell, can mutate
-            if rand[1] < mutR:  # birth with mutation
+            if randMut < mutR:  # birth with mutation
                 groupMat[cellType+1, eventGroup] += 1
             else:  # birth without mutation
                 groupMat[cellType, eventGroup] += 1
@@ -340,7 +638,18 @@ def process_indv_event(groupMat, indvRate, mutR, rand, NType, NGrp):
             if NINGrp == 0:  # all other types are zero too
                 groupDeathID = int(eventGroup)
 
-    return groupDeathID
+    return (eventGroup, groupDeathID)
+
+
+# process individual level events
+@jit(UniTuple(i8, 2)(f8[:, ::1], f8[::1], f8, f8[::1], i8, i8), nopython=True, cache=True)
+def process_indv_event(groupMat, indvTree, mutR, rand, NType, NGrp):
+    # Note: groupMat is updated in place, it does not need to be returned
+
+    # select random event based on propensity stored in sum tree
+    eventID = util.select_random_event_sumtree(indvTree, rand[0])
+
+    return perform_indv_event(groupMat, eventID, mutR, rand[1], NType, NGrp)
 
 
 """============================================================================
@@ -348,12 +657,12 @@ Sub functions migration dynamics
 ============================================================================"""
 
 # process migration event
-@jit(i8(f8[:, ::1], f8[::1], i8, i8, f8[::1]), nopython=True)
-def process_migration_event(groupMat, grSizeVec, NGrp, NType, rand):
+@jit(UniTuple(i8, 3)(f8[:, ::1], f8[::1], i8, i8, f8[::1]), nopython=True, cache=True)
+def process_migration_event(groupMat, sizeTree, NGrp, NType, rand):
     # Note: groupMat is updated in place, it does not need to be returned
 
-    # select random group of origin based on size
-    grpIDSource = util.select_random_event(grSizeVec, rand[0])
+    # select random group of origin based on size stored in sum tree
+    grpIDSource = util.select_random_event_sumtree(sizeTree, rand[0])
 
     # select random type of migrant based on population size
     cellType = util.select_random_event(groupMat[:, grpIDSource], rand[1])
@@ -376,44 +685,37 @@ def process_migration_event(groupMat, grSizeVec, NGrp, NType, rand):
         if NINGrp == 0:  # all other types are zero too
             groupDeathID = int(grpIDSource)
 
-    return groupDeathID
+    return (grpIDSource, grpIDTarget, groupDeathID)
 
 
 """============================================================================
 Sub functions group dynamics
 ============================================================================"""
 
-# remove group from group matrix
-@jit(Tuple((f8[:, ::1], i8))(f8[:, ::1], i8), nopython=True)
-def remove_group(groupMat, groupDeathID):
-    # Note: groupMat is re-created, it has to be returned
-    # create helper vector
-    NGrp = groupMat.shape[1]
-    hasDied = np.zeros(NGrp)
-    hasDied[groupDeathID] = 1
-
-    # copy remaining groups to new matrix
-    groupMat = groupMat[:, hasDied == 0]
-    NGrp -= 1
-
-    return (groupMat, NGrp)
-
-
-# calculate fission and extinction rate of all groups
-@jit(void(f8[::1], f8[:, ::1], f8[::1], f8, i8, f8, f8, f8, f8, f8, f8, f8, f8), nopython=True)
-def calc_group_rates(grpRate, groupMat, grSizeVec, NTot, NGrp,
-    gr_CFis, gr_SFis, K_grp, K_tot, K_ind,
-    delta_grp, delta_tot, delta_size):
-
+# calculate fission rate and size dependent part of extinction rate of single group
+# extinction rate of group is extinctFactor * sizeEffect, see calc_extinction_factor
+@jit(UniTuple(f8, 2)(f8, f8, f8, f8, f8), nopython=True, cache=True)
+def calc_group_rates_single(grSize, gr_CFis, gr_SFis, K_ind, delta_size):
     beta = 1E9 #large constant that insures group fission when they reach K_ind
 
     # calc fission rate
     if gr_SFis == np.inf:
-        fissionR = (grSizeVec > K_ind) * beta + gr_CFis
+        fissionR = (grSize > K_ind) * beta + gr_CFis
     else:
-        fissionR = grSizeVec * gr_SFis + gr_CFis
+        fissionR = grSize * gr_SFis + gr_CFis
 
-    # calc extinction rate
+    # calc size dependence of extinction rate
+    if delta_size != 0:
+        sizeEffect = (1/grSize) ** delta_size
+    else:
+        sizeEffect = 1.
+
+    return (fissionR, sizeEffect)
+
+
+# calculate density dependent part of extinction rate, shared by all groups
+@jit(f8(f8, i8, f8, f8, f8, f8), nopython=True, cache=True)
+def calc_extinction_factor(NTot, NGrp, K_grp, K_tot, delta_grp, delta_tot):
     if delta_grp != 0:
         groupDep = (NGrp / K_grp) ** delta_grp
     else:
@@ -424,85 +726,115 @@ def calc_group_rates(grpRate, groupMat, grSizeVec, NTot, NGrp,
     else:
         popDep = 1
 
-    if delta_size != 0:
-        sizeEffect = (1/grSizeVec) ** delta_size
-        #sizeEffect = sizeEffect /  (onesGrp @ sizeEffect)
-        extinctR = groupDep * popDep * sizeEffect
-    else:
-        extinctR = groupDep * popDep * np.ones(NGrp)
-
-    # combine all rates in single vector
-    grpRate[0:NGrp] = fissionR
-    grpRate[NGrp::] = extinctR
-
-    return None
-
+    return groupDep * popDep
 
-@jit(Tuple((i8[:],i8))(f8, f8, i8), nopython=True)
-def distribute_offspring(offspr_size, offspr_frac, NCellPar):
-    #vector with destination index for all cells
-    #initialize to -1: stay with parent
-    destinationIdx = np.full(NCellPar, -1)
 
+# draw number of offspring groups, returns number of offspring, size of all but last offspring,
+# size of last offspring, and number of cells remaining in parent
+# random numbers are drawn from stream rngState
+@jit(UniTuple(i8, 4)(f8, f8, i8, u8[::1]), nopython=True, cache=True)
+def draw_offspring_number(offspr_size, offspr_frac, NCellPar, rngState):
     # calc expected values
     nPerOff_expect = offspr_size * NCellPar
     nToOff_expect = offspr_frac * NCellPar
 
     #draw total number of cells passed to offspring from Poisson distribution
-    nToOff = util.truncated_poisson(nToOff_expect, NCellPar)
+    nToOff = util.truncated_poisson(nToOff_expect, NCellPar, rngState)
 
     if nToOff > 0 and nPerOff_expect>0:
         #draw size of offspring groups from truncated Poisson
         #min group size is 1, max is nToOff
-        nPerOff = max(1, util.truncated_poisson(nPerOff_expect, nToOff))
-
-        #first process full offspring
-        nOffFull = int(np.floor(nToOff/nPerOff))
-        nToOffFull = nOffFull*nPerOff
-        destinationIdx[0:nToOffFull] = np.kron(np.arange(nOffFull), np.ones(nPerOff))
-        #assign remaining cell to last offspring group
-        destinationIdx[nToOffFull:nToOff] = nOffFull
+        nPerOff = max(1, util.truncated_poisson(nPerOff_expect, nToOff, rngState))
 
-        nOffspring = nOffFull
-        if nToOffFull < nToOff:
-            nOffspring += 1
-
-        #random shuffle matrix
-        destinationIdx = np.random.permutation(destinationIdx)
+        #full offspring, remaining cells go to last offspring group
+        nOffFull = nToOff // nPerOff
+        nRemain = nToOff - nOffFull * nPerOff
+        nOffspring = nOffFull + 1 if nRemain > 0 else nOffFull
+        nLastOff = nRemain if nRemain > 0 else nPerOff
     else:
         nOffspring = 0
+        nPerOff = 0
+        nLastOff = 0
+        nToOff = 0
+
+    return (nOffspring, nPerOff, nLastOff, NCellPar - nToOff)
+
+
+# draw sizes of offspring groups, returns sizes of offspring and number of cells remaining in parent
+@jit(Tuple((i8[::1], i8))(f8, f8, i8, u8[::1]), nopython=True, cache=True)
+def draw_offspring_size(offspr_size, offspr_frac, NCellPar, rngState):
+    nOffspring, nPerOff, nLastOff, nParRemain = draw_offspring_number(
+        offspr_size, offspr_frac, NCellPar, rngState)
+
+    offsprSize = np.full(nOffspring, nPerOff, dtype=np.int64)
+    if nOffspring > 0:
+        offsprSize[-1] = nLastOff
+
+    return (offsprSize, nParRemain)
+
+
+# split cells of group over destination groups of given size, cells are assigned at random
+# composition has number of cells in each category (e.g. cell type)
+# draws multivariate hypergeometric by conditional hypergeometric draw per category,
+# cost scales with categories x destinations instead of with number of cells
+# result is written to first nDest columns of existing destMat
+# pool is work vector with same size as composition, no arrays are allocated
+@jit(void(f8[::1], i8[::1], i8, f8[:, ::1], f8[::1], u8[::1]), nopython=True, cache=True)
+def split_group_inplace(composition, destSize, nDest, destMat, pool, rngState):
+    nCat = composition.size
+    pool[:] = composition
+    nPool = int(pool.sum())
+    destMat[:, 0:nDest] = 0
+
+    for dd in range(nDest - 1):
+        #cells still to draw, and cells in pool in categories not yet considered
+        nLeft = destSize[dd]
+        nRest = nPool
+        for cc in range(nCat):
+            if nLeft == 0:
+                break
+            #empty categories do not have to be drawn
+            nCell = int(pool[cc])
+            nRest -= nCell
+            if nCell == 0:
+                continue
+            nDraw = util.hypergeometric(nCell, nRest, nLeft, rngState)
+            destMat[cc, dd] = nDraw
+            pool[cc] -= nDraw
+            nLeft -= nDraw
+        nPool -= destSize[dd]
+    #last destination gets remaining cells
+    destMat[:, nDest - 1] = pool
+
+    return None
+
+
+# same as split_group_inplace, but returns new matrix with result
+@jit(f8[:, ::1](f8[::1], i8[::1], u8[::1]), nopython=True, cache=True)
+def split_group(composition, destSize, rngState):
+    destMat = np.zeros((composition.size, destSize.size))
+    pool = np.empty(composition.size)
+    split_group_inplace(composition, destSize, destSize.size, destMat, pool, rngState)
+    return destMat
 
-    return (destinationIdx, nOffspring)
 
-@jit(Tuple((f8[::1],f8[:, ::1],i8))(f8[::1], f8, f8), nopython=True)
-def fission_group(parentGroup, offspr_size, offspr_frac):
+@jit(Tuple((f8[::1],f8[:, ::1],i8))(f8[::1], f8, f8, u8[::1]), nopython=True, cache=True)
+def fission_group(parentGroup, offspr_size, offspr_frac, rngState):
     #get group properties
     NCellPar = int(parentGroup.sum())
-    matShape = parentGroup.shape
-    #distribute cells
-    destinationIdx, nOffspring = distribute_offspring(offspr_size,
-                                                      offspr_frac,
-                                                      NCellPar)
+    #draw offspring sizes
+    offsprSize, nParRemain = draw_offspring_size(offspr_size, offspr_frac, NCellPar, rngState)
+    nOffspring = offsprSize.size
+
     if  nOffspring>0:
-        #init offspring and parremt array
-        offspring = np.zeros((matShape[0], nOffspring))
-        parrentNew = np.zeros(matShape[0])
-
-        #find non zero elements
-        ttIDxTuple = np.nonzero(parentGroup)
-        ttIDxVec = ttIDxTuple[0]
-        #loop all cells in parentgroup and assign to new group
-        idx = 0
-        for ttIDx in ttIDxVec:
-            numCell = parentGroup[ttIDx]
-            while numCell>0:
-                currDest = destinationIdx[idx]
-                if currDest == -1: #stays in parrent
-                    parrentNew[ttIDx] += 1
-                else:
-                    offspring[ttIDx, currDest] += 1
-                numCell -= 1
-                idx += 1
+        #distribute cells over offspring, last destination is parent
+        destSize = np.empty(nOffspring + 1, dtype=np.int64)
+        destSize[0:nOffspring] = offsprSize
+        destSize[nOffspring] = nParRemain
+        destMat = split_group(parentGroup, destSize, rngState)
+
+        offspring = destMat[:, 0:nOffspring].copy()
+        parrentNew = destMat[:, nOffspring].copy()
     else:
         #nothing happens
         parrentNew = parentGroup
@@ -510,70 +842,268 @@ def fission_group(parentGroup, offspr_size, offspr_frac):
 
     return (parrentNew, offspring, nOffspring)
 
-# process individual level events
-@jit(Tuple((f8[:, ::1], i8, i8, i8))(f8[:, ::1], f8[::1], f8[::1], f8, f8, i8, i8), nopython=True)
-def process_group_event(groupMat, grpRate, rand, offspr_size, offspr_frac, NBGrp, NDGrp):
-    # get number of groups
-    NGrp = groupMat.shape[1]
-
-    # select random event based on propensity
-    eventID = util.select_random_event(grpRate, rand[0])
-
-    # get event type
-    eveNType = math.floor(eventID/NGrp)
-    # get event group
-    eventGroup = eventID % NGrp  # % is modulo operator
-
-    if eveNType < 1:
-        # fission event - add new group and split cells
-        # get parent composition
-        parentGroup = groupMat[:, eventGroup].copy()
-
-        #perform fission process
-        if offspr_size > 0:
-            parrentNew, offspring, nOffspring = fission_group(parentGroup, offspr_size, offspr_frac)
-
-            # only add daughter if not empty
-            if offspring.size > 0:
-                if parrentNew.sum() > 0: # update parrent
-                    groupMat[:, eventGroup] = parrentNew
-                else: #remove parrent
-                    groupMat, NGrp = remove_group(groupMat, eventGroup)
-                    NDGrp += 1
-                # add new daughter group
-                groupMat = np.column_stack((groupMat, offspring))
-                NBGrp += nOffspring
-
-            NGrp = groupMat.shape[1]
-
-    else:
-        # extinction event - remove group
-        groupMat, NGrp = remove_group(groupMat, eventGroup)
-        NDGrp += 1
+# create helper vectors for dot products and sum trees to store rates
+# rates are stored in leafs of sum trees, use util.sumtree_leafs to access them
+@jit(UniTuple(f8[::1], 4)(i8, i8), nopython=True, cache=True)
+def create_helper_vector(NGrp, NType):
+    onesGrp = np.ones(NGrp)
+    #init sum trees for individual events, group events, and group sizes
+    indvTree = util.create_sumtree(4 * NType * NGrp)
+    grpTree = util.create_sumtree(2 * NGrp)
+    sizeTree = util.create_sumtree(NGrp)
+
+    return(onesGrp, indvTree, grpTree, sizeTree)
+
+
+# recalculate all rates of single group after its composition has changed
+# updates group size in place, and sum trees in O(NType * log(NGrp)) time
+# coopPart (NType) is work buffer, allocate once per event loop
+# returns change in group size
+@jit(f8(f8[::1], f8[::1], f8[::1], f8[::1], f8[:, ::1], f8[::1], i8,
+        f8[::1], f8, f8, f8, f8, f8, f8, f8[::1]), nopython=True, cache=True)
+def update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat, grSizeVec, grpIdx,
+                       birthRVec, deathR, delta_indv, gr_CFis, gr_SFis, K_ind, delta_size,
+                       coopPart):
+    NType = int(groupMat.shape[0] / 2)
+    grpCap = groupMat.shape[1]
+
+    grSize = groupMat[:, grpIdx].sum()
+    dSize = grSize - grSizeVec[grpIdx]
+    grSizeVec[grpIdx] = grSize
+
+    update_indv_rates(indvTree, groupMat, grpIdx, grSize, birthRVec,
+                      deathR, delta_indv, NType, grpCap, coopPart)
+
+    fissionR, sizeEffect = calc_group_rates_single(grSize, gr_CFis, gr_SFis,
+                                                   K_ind, delta_size)
+    util.update_sumtree(fisTree, grpIdx, fissionR)
+    util.update_sumtree(extTree, grpIdx, sizeEffect)
+    util.update_sumtree(sizeTree, grpIdx, grSize)
+
+    return dSize
+
+
+# set all rates of empty group slot to zero
+# returns change in group size
+@jit(f8(f8[::1], f8[::1], f8[::1], f8[::1], f8[::1], i8, i8), nopython=True, cache=True)
+def clear_group_rates(indvTree, fisTree, extTree, sizeTree, grSizeVec, grpIdx, NType):
+    grpCap = grSizeVec.size
+    for eventType in range(4 * NType):
+        util.update_sumtree(indvTree, eventType * grpCap + grpIdx, 0.)
+    util.update_sumtree(fisTree, grpIdx, 0.)
+    util.update_sumtree(extTree, grpIdx, 0.)
+    util.update_sumtree(sizeTree, grpIdx, 0.)
+
+    dSize = -grSizeVec[grpIdx]
+    grSizeVec[grpIdx] = 0
+    return dSize
+
+
+# calculate all rates from scratch and store them in sum trees
+# groupMat can have spare capacity, only first NGrp columns contain live groups
+# rates are stored per group slot, so single groups can be updated with update_group_rates
+# extinction tree only stores size effect, multiply with calc_extinction_factor to get rates
+@jit(Tuple((f8[::1], f8, f8[::1], f8[::1], f8[::1], f8[::1]))(
+        f8[:, ::1], i8, f8[::1], f8, f8, f8, f8, f8, f8), nopython=True, cache=True)
+def init_rate_trees(groupMat, NGrp, birthRVec, deathR, delta_indv,
+                    gr_CFis, gr_SFis, K_ind, delta_size):
+    NType = int(groupMat.shape[0] / 2)
+    grpCap = groupMat.shape[1]
+
+    #init sum trees with size of full capacity, empty slots have zero rates
+    _, indvTree, fisTree, sizeTree = create_helper_vector(grpCap, NType)
+    extTree = util.create_sumtree(grpCap)
+    grSizeVec = np.zeros(grpCap)
+    coopPart = np.empty(NType)
+
+    # calc rates of all live groups
+    NTot = 0.
+    for gg in range(NGrp):
+        NTot += update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                   grSizeVec, gg, birthRVec, deathR, delta_indv,
+                                   gr_CFis, gr_SFis, K_ind, delta_size, coopPart)
+
+    return (grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree)
 
-    return (groupMat, NGrp, NBGrp, NDGrp)
 
+"""============================================================================
+Group store: groupMat with spare capacity
+live groups are stored in first NGrp columns, remaining columns are zero
+groups are added at end and removed by moving last group in their place
+============================================================================"""
 
-# create helper vectors for dot products
-def create_helper_vector(NGrp, NType):
-    onesGrp = np.ones(NGrp)
-    onesIndR = np.ones(NGrp * NType * 4)
-    onesGrpR = np.ones(NGrp * 2)
-    #init rates matrix
-    indvRate = np.ones(4 * NType * NGrp)
-    grpRate = np.ones(2 * NGrp)
+# create group matrix with spare capacity and copy groups into it
+@jit(f8[:, ::1](f8[:, ::1], i8, i8), nopython=True, cache=True)
+def grow_groupMat(groupMat, NGrp, minCap):
+    grpCap = max(groupMat.shape[1], 8)
+    while grpCap < minCap:
+        grpCap *= 2
+    newMat = np.zeros((groupMat.shape[0], grpCap))
+    newMat[:, 0:NGrp] = groupMat[:, 0:NGrp]
+    return newMat
+
+
+# add group in first empty slot and calc its rates
+# groupMat must have spare capacity, use grow_groupMat first if needed
+# returns new number of groups and change in total population size
+@jit(Tuple((i8, f8))(f8[:, ::1], i8, f8[:], f8[::1], f8[::1], f8[::1], f8[::1], f8[::1],
+                    f8[::1], f8, f8, f8, f8, f8, f8, f8[::1]), nopython=True, cache=True)
+def insert_group(groupMat, NGrp, newGroup, grSizeVec,
+                 indvTree, fisTree, extTree, sizeTree,
+                 birthRVec, deathR, delta_indv, gr_CFis, gr_SFis, K_ind, delta_size, coopPart):
+    groupMat[:, NGrp] = newGroup
+    dNTot = update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                               grSizeVec, NGrp, birthRVec, deathR, delta_indv,
+                               gr_CFis, gr_SFis, K_ind, delta_size, coopPart)
+    NGrp += 1
+    return (NGrp, dNTot)
+
+
+# remove group by moving last group into its slot, and update rates of both slots
+# returns new number of groups and change in total population size
+@jit(Tuple((i8, f8))(f8[:, ::1], i8, i8, f8[::1], f8[::1], f8[::1], f8[::1], f8[::1],
+                    f8[::1], f8, f8, f8, f8, f8, f8, f8[::1]), nopython=True, cache=True)
+def delete_group(groupMat, NGrp, grpIdx, grSizeVec,
+                 indvTree, fisTree, extTree, sizeTree,
+                 birthRVec, deathR, delta_indv, gr_CFis, gr_SFis, K_ind, delta_size, coopPart):
+    NType = int(groupMat.shape[0] / 2)
+    lastIdx = NGrp - 1
+    dNTot = 0.
+    if grpIdx < lastIdx:
+        # move last group in place of removed one
+        groupMat[:, grpIdx] = groupMat[:, lastIdx]
+        dNTot += update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                    grSizeVec, grpIdx, birthRVec, deathR, delta_indv,
+                                    gr_CFis, gr_SFis, K_ind, delta_size, coopPart)
+    # clear last slot
+    groupMat[:, lastIdx] = 0
+    dNTot += clear_group_rates(indvTree, fisTree, extTree, sizeTree,
+                               grSizeVec, lastIdx, NType)
+    NGrp -= 1
+    return (NGrp, dNTot)
 
-    return(onesGrp, onesIndR, onesGrpR, indvRate, grpRate)
 
+"""============================================================================
+Tau leaping of individual level events (Cao, Gillespie & Petzold 2006)
+births and deaths in groups with at least tau_minSize cells are leaped over
+with Poisson distributed event counts, leap size is chosen such that the
+expected relative change in the number of each cell type is below tau_eps
+individual events in smaller groups, migration, and group events are exact
+============================================================================"""
 
-# calc total number of individuals per group, use matrix product for speed
-@jit(Tuple((f8[::1], f8))(f8[:, ::1], f8[::1], f8[::1]), nopython=True)
-def calc_group_state(groupMat, oneVecType, onesGrp):
-    #vector with size of each group
-    grSizeVec = oneVecType @ groupMat
-    #float total number of individuals
-    NTot = onesGrp @ grSizeVec
-    return(grSizeVec, NTot)
+# calc leap size, number of leaped groups, and total propensity of individual events
+# in small (critical) groups
+@jit(UniTuple(f8, 3)(f8[::1], f8[:, ::1], f8[::1], i8, f8, f8, f8), nopython=True, cache=True)
+def calc_tau_leap(indvTree, groupMat, grSizeVec, NGrp, mutR, tau_eps, tau_minSize):
+    NTypeWMut = groupMat.shape[0]
+    grpCap = groupMat.shape[1]
+    rates = util.sumtree_leafs(indvTree, 2 * NTypeWMut * grpCap)
+
+    critProp = 0.
+    tauLeap = np.inf
+    nLeapGrp = 0.
+    for gg in range(NGrp):
+        if grSizeVec[gg] < tau_minSize:
+            # individual events in small groups are simulated exactly
+            for eventType in range(2 * NTypeWMut):
+                critProp += rates[eventType * grpCap + gg]
+        else:
+            nLeapGrp += 1
+            for tt in range(NTypeWMut):
+                birthR = rates[tt * grpCap + gg]
+                deathR = rates[(tt + NTypeWMut) * grpCap + gg]
+                # calc mean and variance of change in cell number per unit time
+                if (tt % 2) == 0:  # Wild type cell, offspring can mutate
+                    mu = birthR * (1 - mutR) - deathR
+                    sigma2 = birthR * (1 - mutR) + deathR
+                else:  # cheater cell, receives mutants of wild type
+                    parentBirthR = rates[(tt - 1) * grpCap + gg] * mutR
+                    mu = birthR + parentBirthR - deathR
+                    sigma2 = birthR + parentBirthR + deathR
+                # allowed change in cell number
+                maxChange = max(tau_eps * groupMat[tt, gg], 1.)
+                if mu != 0:
+                    tauLeap = min(tauLeap, maxChange / abs(mu))
+                if sigma2 > 0:
+                    tauLeap = min(tauLeap, maxChange ** 2 / sigma2)
+
+    return (critProp, tauLeap, nLeapGrp)
+
+
+# calc total propensity of individual events in small (critical) groups
+@jit(f8(f8[::1], f8[::1], i8, i8, f8), nopython=True, cache=True)
+def calc_crit_prop(indvTree, grSizeVec, NGrp, NType, tau_minSize):
+    grpCap = grSizeVec.size
+    rates = util.sumtree_leafs(indvTree, 4 * NType * grpCap)
+
+    critProp = 0.
+    for gg in range(NGrp):
+        if grSizeVec[gg] < tau_minSize:
+            for eventType in range(4 * NType):
+                critProp += rates[eventType * grpCap + gg]
+    return critProp
+
+
+# select individual event in small (critical) group, events are ordered as in update_indv_rates
+@jit(i8(f8[::1], f8[::1], i8, i8, f8, f8, f8), nopython=True, cache=True)
+def select_critical_event(indvTree, grSizeVec, NGrp, NType, tau_minSize, critProp, randNum):
+    grpCap = grSizeVec.size
+    rates = util.sumtree_leafs(indvTree, 4 * NType * grpCap)
+
+    # rescale uniform random number [0,1] to total propensity
+    randNumScaled = randNum * critProp
+    eventID = -1
+    for gg in range(NGrp):
+        if grSizeVec[gg] < tau_minSize:
+            for eventType in range(4 * NType):
+                rate = rates[eventType * grpCap + gg]
+                if rate > 0:
+                    eventID = eventType * grpCap + gg
+                    randNumScaled -= rate
+                    if randNumScaled < 0:
+                        return eventID
+    # can be reached due to rounding errors, return last event with non zero rate
+    return eventID
+
+
+# leap individual events in large groups over time tau
+# returns False, and leaves groupMat unchanged, if cell numbers would become negative
+# or if a group would lose all its cells, as extinction of last cell has to be exact
+@jit(b1(f8[:, ::1], f8[:, ::1], f8[::1], f8[::1], i8, f8, f8, f8, u8[::1]), nopython=True, cache=True)
+def leap_indv_events(groupMat, deltaMat, indvTree, grSizeVec, NGrp, mutR, tau, tau_minSize,
+                     rngState):
+    NTypeWMut = groupMat.shape[0]
+    grpCap = groupMat.shape[1]
+    rates = util.sumtree_leafs(indvTree, 2 * NTypeWMut * grpCap)
+
+    # draw number of events
+    for gg in range(NGrp):
+        if grSizeVec[gg] >= tau_minSize:
+            grSizeNew = grSizeVec[gg]
+            for tt in range(NTypeWMut):
+                deltaMat[tt, gg] = 0
+            for tt in range(NTypeWMut):
+                nBirth = util.rand_poisson(rates[tt * grpCap + gg] * tau, rngState)
+                nDeath = util.rand_poisson(rates[(tt + NTypeWMut) * grpCap + gg] * tau, rngState)
+                if (tt % 2) == 0 and nBirth > 0:  # Wild type cell, offspring can mutate
+                    nMut = util.rand_binomial(nBirth, mutR, rngState)
+                    deltaMat[tt + 1, gg] += nMut
+                    nBirth -= nMut
+                deltaMat[tt, gg] += nBirth - nDeath
+                grSizeNew += nBirth - nDeath
+            if grSizeNew < 1:
+                return False
+            for tt in range(NTypeWMut):
+                if groupMat[tt, gg] + deltaMat[tt, gg] < 0:
+                    return False
+
+    # update cell numbers
+    for gg in range(NGrp):
+        if grSizeVec[gg] >= tau_minSize:
+            for tt in range(NTypeWMut):
+                groupMat[tt, gg] += deltaMat[tt, gg]
+
+    return True
 
 
 def calc_time_steps(model_par):
@@ -620,14 +1150,680 @@ def adjust_indv_rates(model_par):
 Main model code
 ============================================================================"""
 
-# main model
-def run_model(model_par):
-    stateVarPlus = stateVar + \
-        ['N%i' % x for x in range(model_par['indv_NType'])] + \
-        ['N%imut' % x for x in range(model_par['indv_NType'])]
+# run event loop of model till next batch of samples is ready, or till run ends
+# entire Gillespie loop is compiled, only returns to python every sampleStop samples
+# loop releases the GIL, so runs can execute in parallel threads (see run_model_parallel)
+# if tau_eps > 0 individual events in groups with at least tau_minSize cells are tau leaped
+@jit(Tuple((f8[:, ::1], f8, i8, i8, i8, b1))(
+        f8[:, ::1], u8[::1],
+        f8[:, ::1], f8[:, ::1], f8[::1], f8[:, ::1], f8[::1], f8[::1], f8[:, ::1],
+        f8, i8, i8, i8, i8,
+        f8[::1], f8, f8, f8, f8, f8,
+        f8, f8, f8, f8, f8, f8, f8, f8,
+        f8, f8,
+        f8, f8, f8, i8, i8, f8, f8, f8,
+        f8, i8, f8,
+        f8, f8), nopython=True, nogil=True, cache=True)
+def run_event_loop(groupMat, rngState,
+                   output, distFCoop, binFCoop, distGrSize, binGrSize, runStat, stopStat,
+                   currT, sampleIdx, sampleStop, NBGrp, NDGrp,
+                   birthRVec, indv_deathR, delta_indv, indv_mutR, inv_migrR, grp_tau,
+                   gr_CFis, gr_SFis, K_grp, K_tot, indv_K, delta_grp, delta_tot, delta_size,
+                   offspr_size, offspr_frac,
+                   maxT, minTRun, sampleInt, mavInt, rmsInt,
+                   rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+                   stop_relPrec, stop_nBatch, stop_tQuant,
+                   tau_eps, tau_minSize):
+    # get sizes
+    NType = int(groupMat.shape[0] / 2)
+    NGrp = groupMat.shape[1]
+    numTSample = calc_num_sample(maxT, sampleInt)
+
+    #copy groups to group store with spare capacity
+    groupMat = grow_groupMat(groupMat, NGrp, 2 * NGrp)
+
+    #init rates, they are updated incrementally after each event
+    grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree = \
+        init_rate_trees(groupMat, NGrp, birthRVec, indv_deathR, delta_indv,
+                        gr_CFis, gr_SFis, indv_K, delta_size)
+    #work buffer for rate updates
+    coopPart = np.empty(NType)
+
+    #buffer for change in cell numbers during leap
+    deltaMat = np.zeros(groupMat.shape)
+    #number of exact steps to do before trying to leap again
+    ssaStepsLeft = 0
+
+    #random numbers of current time step, drawn from streaming generator
+    #with common random numbers event is selected with numbers from stream of event class
+    rand = np.empty(5)
+    timeStream = util.get_stream(rngState, 0)
+    isCommon = rngState.size > util.RNG_STATE_SIZE
+    #cell numbers of leaps and fission splits are drawn from stream of event class
+    indvStream = util.get_stream(rngState, 1)
+    groupStream = util.get_stream(rngState, 3)
+
+    isDone = False
+    # loop time steps
+    while currT <= maxT:
+        # calc density dependent part of extinction rate, shared by all groups
+        extinctFactor = calc_extinction_factor(NTot, NGrp, K_grp, K_tot,
+                                               delta_grp, delta_tot)
+
+        # calculate total propensities, stored in root of sum trees
+        indvProp = indvTree[1]
+        fisProp = fisTree[1]
+        extProp = extinctFactor * extTree[1]
+        groupProp = grp_tau * (fisProp + extProp)
+        migrProp = inv_migrR * NTot
+        totProp = indvProp + groupProp + migrProp
+
+        # get random numbers of time step and event class
+        util.fill_rand(timeStream, rand[0:2])
+
+        # try to leap over individual events in large groups
+        useLeap = False
+        if tau_eps > 0 and ssaStepsLeft == 0:
+            critProp, tauLeap, nLeapGrp = calc_tau_leap(indvTree, groupMat, grSizeVec, NGrp,
+                                                        indv_mutR, tau_eps, tau_minSize)
+            # leap ends at next exact event, expected leap length is at most 1 / exactProp
+            # leap costs O(NGrp) time, only leap if it covers on average
+            # at least TAU_MIN_EVENT events per leaped group, otherwise do exact steps
+            exactProp = critProp + migrProp + groupProp
+            expectLeap = min(tauLeap, 1 / exactProp) if exactProp > 0 else tauLeap
+            useLeap = nLeapGrp > 0 and \
+                expectLeap * (indvProp - critProp) >= TAU_MIN_EVENT * nLeapGrp
+            if not useLeap:
+                ssaStepsLeft = 100
+        ssaStepsLeft = max(ssaStepsLeft - 1, 0)
+
+        if useLeap:
+            # do not leap past next sample time
+            timeToSample = sampleInt * sampleIdx - currT
+            if timeToSample > 0:
+                tauLeap = min(tauLeap, timeToSample)
+
+            # calc time of next exact event
+            exactProp = critProp + migrProp + groupProp
+            dt = -1 * math.log(rand[1]) / exactProp if exactProp > 0 else np.inf
+
+            # exact event happens at end of leap if it happens before end of leap
+            isExact = dt <= tauLeap
+            if not isExact:
+                dt = tauLeap
+
+            # leap, halve leap size if cell numbers become negative
+            while not leap_indv_events(groupMat, deltaMat, indvTree, grSizeVec, NGrp,
+                                       indv_mutR, dt, tau_minSize, indvStream):
+                dt /= 2
+                isExact = False
+
+            # update rates of leaped groups
+            for gg in range(NGrp):
+                if grSizeVec[gg] >= tau_minSize:
+                    NTot += update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                               grSizeVec, gg, birthRVec, indv_deathR,
+                                               delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+
+            # select exact event at end of leap with propensities after leap,
+            # leaped groups that became small are now critical
+            eventClass = -1
+            if isExact:
+                extinctFactor = calc_extinction_factor(NTot, NGrp, K_grp, K_tot,
+                                                       delta_grp, delta_tot)
+                fisProp = fisTree[1]
+                extProp = extinctFactor * extTree[1]
+                groupProp = grp_tau * (fisProp + extProp)
+                migrProp = inv_migrR * NTot
+                critProp = calc_crit_prop(indvTree, grSizeVec, NGrp, NType, tau_minSize)
+                exactProp = critProp + migrProp + groupProp
+
+                rescaledRand = rand[0] * exactProp
+                if exactProp <= 0:
+                    eventClass = -1
+                elif rescaledRand < critProp:
+                    eventClass = 0
+                elif rescaledRand < (critProp + migrProp):
+                    eventClass = 1
+                else:
+                    eventClass = 2
+        else:
+            # calc time step
+            dt = -1 * math.log(rand[1]) / totProp
+
+            # select group or individual event
+            rescaledRand = rand[0] * totProp
+            if rescaledRand < indvProp:
+                eventClass = 0
+            elif rescaledRand < (indvProp + migrProp):
+                eventClass = 1
+            else:
+                eventClass = 2
+
+        # get random numbers to select event, with single stream this is same stream
+        if eventClass >= 0:
+            util.fill_rand(util.get_stream(rngState, eventClass + 1), rand[2:5])
+        elif not isCommon:
+            util.fill_rand(timeStream, rand[2:5])
+
+        if eventClass == 0 and useLeap:
+            eventID = select_critical_event(indvTree, grSizeVec, NGrp, NType,
+                                            tau_minSize, critProp, rand[2])
+        elif eventClass == 0:
+            eventID = util.select_random_event_sumtree(indvTree, rand[2])
+
+        if eventClass == 0:
+            # individual level event - process individual level event
+            # rates are stored per group slot, pass capacity to decode event
+            eventGroup, groupDeathID = perform_indv_event(groupMat, eventID, indv_mutR,
+                                                          rand[3], NType, groupMat.shape[1])
+            if groupDeathID > -1:  # remove empty group
+                NGrp, dNTot = delete_group(groupMat, NGrp, groupDeathID, grSizeVec,
+                                           indvTree, fisTree, extTree, sizeTree,
+                                           birthRVec, indv_deathR, delta_indv,
+                                           gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                NDGrp += 1
+            else:  # only rates of event group change
+                dNTot = update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                           grSizeVec, eventGroup, birthRVec, indv_deathR,
+                                           delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            NTot += dNTot
+        elif eventClass == 1:
+            # migration event - select and process migration event
+            grpIDSource, grpIDTarget, groupDeathID = \
+                process_migration_event(groupMat, sizeTree, NGrp, NType, rand[2:5])
+            # update target first, it can be moved when source is removed
+            update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                               grSizeVec, grpIDTarget, birthRVec, indv_deathR,
+                               delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            if groupDeathID > -1:  # remove empty group
+                NGrp, _ = delete_group(groupMat, NGrp, groupDeathID, grSizeVec,
+                                       indvTree, fisTree, extTree, sizeTree,
+                                       birthRVec, indv_deathR, delta_indv,
+                                       gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                NDGrp += 1
+            else:  # only rates of source and target group change
+                update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                   grSizeVec, grpIDSource, birthRVec, indv_deathR,
+                                   delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+        elif eventClass == 2:
+            # group level event - select fission or extinction, then select group
+            if rand[2] * (fisProp + extProp) < fisProp:
+                eveNType = 0
+                eventGroup = util.select_random_event_sumtree(fisTree, rand[3])
+            else:
+                eveNType = 1
+                eventGroup = util.select_random_event_sumtree(extTree, rand[3])
+
+            if eveNType < 1 and offspr_size > 0:
+                # fission event - add new groups and split cells
+                parrentNew, offspring, nOffspring = fission_group(
+                    groupMat[:, eventGroup].copy(), offspr_size, offspr_frac, groupStream)
+
+                # only add daughters if not empty
+                if nOffspring > 0:
+                    # grow group store if needed, rates are recalculated for new capacity
+                    if NGrp + nOffspring > groupMat.shape[1]:
+                        groupMat = grow_groupMat(groupMat, NGrp, 2 * (NGrp + nOffspring))
+                        grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree = \
+                            init_rate_trees(groupMat, NGrp, birthRVec, indv_deathR, delta_indv,
+                                            gr_CFis, gr_SFis, indv_K, delta_size)
+                        deltaMat = np.zeros(groupMat.shape)
+                    # add new daughter groups
+                    for oo in range(nOffspring):
+                        NGrp, dNTot = insert_group(groupMat, NGrp, offspring[:, oo], grSizeVec,
+                                                   indvTree, fisTree, extTree, sizeTree,
+                                                   birthRVec, indv_deathR, delta_indv,
+                                                   gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                        NTot += dNTot
+                    NBGrp += nOffspring
+
+                    if parrentNew.sum() > 0: # update parrent
+                        groupMat[:, eventGroup] = parrentNew
+                        dNTot = update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                                   grSizeVec, eventGroup, birthRVec, indv_deathR,
+                                                   delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                    else: #remove parrent
+                        NGrp, dNTot = delete_group(groupMat, NGrp, eventGroup, grSizeVec,
+                                                   indvTree, fisTree, extTree, sizeTree,
+                                                   birthRVec, indv_deathR, delta_indv,
+                                                   gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                        NDGrp += 1
+                    NTot += dNTot
+
+            elif eveNType == 1:
+                # extinction event - remove group
+                NGrp, dNTot = delete_group(groupMat, NGrp, eventGroup, grSizeVec,
+                                           indvTree, fisTree, extTree, sizeTree,
+                                           birthRVec, indv_deathR, delta_indv,
+                                           gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                NTot += dNTot
+                NDGrp += 1
+
+        if NGrp == 0:  # if all groups have died, end simulation
+            sampleIdx = sample_extinction_jit(output, distFCoop, distGrSize,
+                                              sampleIdx, currT, NType)
+            isDone = True
+            break
+
+        # update time
+        currT += dt
+
+        # sample model and check if run has ended
+        sampleIdx, isDone, isBatchDone = sample_and_check(
+            groupMat[:, 0:NGrp], output, distFCoop, binFCoop, distGrSize, binGrSize,
+            runStat, stopStat,
+            sampleIdx, sampleStop, numTSample, currT, minTRun, sampleInt, mavInt, rmsInt,
+            rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+            stop_relPrec, stop_nBatch, stop_tQuant)
+        if isBatchDone:
+            break
+
+    # run has ended if max time is reached
+    if currT > maxT:
+        isDone = True
+
+    # return live groups only
+    groupMat = groupMat[:, 0:NGrp].copy()
+
+    return (groupMat, currT, sampleIdx, NBGrp, NDGrp, isDone)
+
+
+"""============================================================================
+Next reaction method (Gibson & Bruck 2000)
+each group has its own fission channel, individual events, migration, and
+extinction are each combined in a single channel
+putative firing times of fission channels are stored in indexed heap,
+times of combined channels are stored in vector of size 3
+times of channels that did not fire are rescaled when their rate changes,
+so only fired channel needs a new random number
+this is an exact reference engine to validate the direct method, it is not faster:
+extinction rates of all groups share a factor that depends on NTot and NGrp, 
+so with separate channels per group each event would change O(NGrp) channel times,
+and individual events change the rates of all channels of their group
+============================================================================"""
+
+# rescale putative firing time of channel after its rate has changed
+# resid stores unused waiting time in units of rate, it is reused when rate becomes positive again
+@jit(UniTuple(f8, 2)(f8, f8, f8, f8, f8), nopython=True, cache=True)
+def rescale_firing_time(oldTime, oldRate, newRate, resid, currT):
+    if oldRate > 0:
+        resid = (oldTime - currT) * oldRate
+    if newRate > 0:
+        newTime = currT + resid / newRate
+    else:
+        newTime = np.inf
+    return (newTime, resid)
+
+
+# init fission channels with new random waiting times
+@jit(Tuple((f8[::1], i8[::1], i8[::1], f8[::1], f8[::1]))(f8[::1], f8, f8, u8[::1]),
+     nopython=True, cache=True)
+def init_fission_channels(fisTree, grp_tau, currT, rngState):
+    grpCap = fisTree.size // 2
+    chanRate = grp_tau * util.sumtree_leafs(fisTree, grpCap)
+
+    # draw waiting times
+    chanResid = np.empty(grpCap)
+    util.fill_rand(rngState, chanResid)
+    chanResid = -np.log(chanResid)
+    timeVec = np.full(grpCap, np.inf)
+    for grpIdx in range(grpCap):
+        if chanRate[grpIdx] > 0:
+            timeVec[grpIdx] = currT + chanResid[grpIdx] / chanRate[grpIdx]
+
+    heapTime, heapID, heapPos = util.create_heap(timeVec)
+    return (heapTime, heapID, heapPos, chanRate, chanResid)
+
+
+# set fission channel of group to current fission rate stored in sum tree
+@jit(void(f8[::1], i8[::1], i8[::1], f8[::1], f8[::1], f8[::1], i8, f8, f8), nopython=True, cache=True)
+def sync_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                         fisTree, grpIdx, grp_tau, currT):
+    newRate = grp_tau * fisTree[fisTree.size // 2 + grpIdx]
+    if newRate != chanRate[grpIdx]:
+        newTime, chanResid[grpIdx] = rescale_firing_time(
+            heapTime[heapPos[grpIdx]], chanRate[grpIdx], newRate, chanResid[grpIdx], currT)
+        chanRate[grpIdx] = newRate
+        util.update_heap(heapTime, heapID, heapPos, grpIdx, newTime)
+    return None
 
+
+# move fission channel along with group moved by delete_group, and clear emptied slot
+@jit(void(f8[::1], i8[::1], i8[::1], f8[::1], f8[::1], f8[::1], i8, i8, f8, f8),
+     nopython=True, cache=True)
+def move_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                         fisTree, grpIdx, lastIdx, grp_tau, currT):
+    if grpIdx < lastIdx:
+        timeA = heapTime[heapPos[grpIdx]]
+        timeB = heapTime[heapPos[lastIdx]]
+        util.update_heap(heapTime, heapID, heapPos, grpIdx, timeB)
+        util.update_heap(heapTime, heapID, heapPos, lastIdx, timeA)
+        chanRate[grpIdx], chanRate[lastIdx] = chanRate[lastIdx], chanRate[grpIdx]
+        chanResid[grpIdx], chanResid[lastIdx] = chanResid[lastIdx], chanResid[grpIdx]
+
+    sync_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                         fisTree, grpIdx, grp_tau, currT)
+    sync_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                         fisTree, lastIdx, grp_tau, currT)
+    return None
+
+
+# calc rates of combined channels: individual events, migration, and extinction
+@jit(void(f8[::1], f8[::1], f8[::1], f8, i8, f8, f8, f8, f8, f8, f8), nopython=True, cache=True)
+def calc_combined_rates(combRate, indvTree, extTree, NTot, NGrp, inv_migrR, grp_tau,
+                        K_grp, K_tot, delta_grp, delta_tot):
+    extinctFactor = calc_extinction_factor(NTot, NGrp, K_grp, K_tot,
+                                           delta_grp, delta_tot)
+    combRate[0] = indvTree[1]
+    combRate[1] = inv_migrR * NTot
+    combRate[2] = grp_tau * extinctFactor * extTree[1]
+    return None
+
+
+# run event loop with next reaction method, same in- and output as run_event_loop
+@jit(Tuple((f8[:, ::1], f8, i8, i8, i8, b1))(
+        f8[:, ::1], u8[::1],
+        f8[:, ::1], f8[:, ::1], f8[::1], f8[:, ::1], f8[::1], f8[::1], f8[:, ::1],
+        f8, i8, i8, i8, i8,
+        f8[::1], f8, f8, f8, f8, f8,
+        f8, f8, f8, f8, f8, f8, f8, f8,
+        f8, f8,
+        f8, f8, f8, i8, i8, f8, f8, f8,
+        f8, i8, f8), nopython=True, nogil=True, cache=True)
+def run_event_loop_nrm(groupMat, rngState,
+                       output, distFCoop, binFCoop, distGrSize, binGrSize, runStat, stopStat,
+                       currT, sampleIdx, sampleStop, NBGrp, NDGrp,
+                       birthRVec, indv_deathR, delta_indv, indv_mutR, inv_migrR, grp_tau,
+                       gr_CFis, gr_SFis, K_grp, K_tot, indv_K, delta_grp, delta_tot, delta_size,
+                       offspr_size, offspr_frac,
+                       maxT, minTRun, sampleInt, mavInt, rmsInt,
+                       rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+                       stop_relPrec, stop_nBatch, stop_tQuant):
+    # get sizes
+    NType = int(groupMat.shape[0] / 2)
+    NGrp = groupMat.shape[1]
+    numTSample = calc_num_sample(maxT, sampleInt)
+
+    #copy groups to group store with spare capacity
+    groupMat = grow_groupMat(groupMat, NGrp, 2 * NGrp)
+
+    #init rates, they are updated incrementally after each event
+    grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree = \
+        init_rate_trees(groupMat, NGrp, birthRVec, indv_deathR, delta_indv,
+                        gr_CFis, gr_SFis, indv_K, delta_size)
+    #work buffer for rate updates
+    coopPart = np.empty(NType)
+
+    #init combined channels
+    combRate = np.zeros(3)
+    newCombRate = np.zeros(3)
+    calc_combined_rates(combRate, indvTree, extTree, NTot, NGrp, inv_migrR, grp_tau,
+                        K_grp, K_tot, delta_grp, delta_tot)
+    combResid = np.empty(3)
+    util.fill_rand(rngState, combResid)
+    combResid = -np.log(combResid)
+    combTime = currT + combResid / combRate
+
+    #init fission channels
+    heapTime, heapID, heapPos, chanRate, chanResid = \
+        init_fission_channels(fisTree, grp_tau, currT, rngState)
+
+    #random numbers of current event, drawn from streaming generator
+    #waiting times use stream 0, with common random numbers events are selected
+    #with numbers from stream of event class
+    randIndv = np.empty(2)
+    randMigr = np.empty(3)
+    indvStream = util.get_stream(rngState, 1)
+    migrStream = util.get_stream(rngState, 2)
+    groupStream = util.get_stream(rngState, 3)
+
+    isDone = False
+    # loop time steps
+    while currT <= maxT:
+
+        # get next channel to fire and move time forward
+        # fired channel gets new waiting time
+        chanID = np.argmin(combTime)
+        if heapTime[0] < combTime[chanID]:
+            # fission channel fires
+            eventGroup = heapID[0]
+            currT = heapTime[0]
+            chanResid[eventGroup] = -math.log(util.rand_uniform(rngState))
+            util.update_heap(heapTime, heapID, heapPos, eventGroup,
+                             currT + chanResid[eventGroup] / chanRate[eventGroup])
+            chanID = 3
+        else:
+            # combined channel fires
+            currT = combTime[chanID]
+            combResid[chanID] = -math.log(util.rand_uniform(rngState))
+            combTime[chanID] = currT + combResid[chanID] / combRate[chanID]
+
+        if chanID == 0:
+            # individual level event - select and process individual level event
+            util.fill_rand(indvStream, randIndv)
+            eventGroup, groupDeathID = process_indv_event(groupMat, indvTree, indv_mutR,
+                                                          randIndv, NType, groupMat.shape[1])
+            if groupDeathID > -1:  # remove empty group
+                NGrp, dNTot = delete_group(groupMat, NGrp, groupDeathID, grSizeVec,
+                                           indvTree, fisTree, extTree, sizeTree,
+                                           birthRVec, indv_deathR, delta_indv,
+                                           gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                move_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                     fisTree, groupDeathID, NGrp, grp_tau, currT)
+                NDGrp += 1
+            else:  # only rates of event group change
+                dNTot = update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                           grSizeVec, eventGroup, birthRVec, indv_deathR,
+                                           delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                sync_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                     fisTree, eventGroup, grp_tau, currT)
+            NTot += dNTot
+
+        elif chanID == 1:
+            # migration event - select and process migration event
+            util.fill_rand(migrStream, randMigr)
+            grpIDSource, grpIDTarget, groupDeathID = \
+                process_migration_event(groupMat, sizeTree, NGrp, NType, randMigr)
+            # update target first, it can be moved when source is removed
+            update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                               grSizeVec, grpIDTarget, birthRVec, indv_deathR,
+                               delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            sync_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                 fisTree, grpIDTarget, grp_tau, currT)
+            if groupDeathID > -1:  # remove empty group
+                NGrp, _ = delete_group(groupMat, NGrp, groupDeathID, grSizeVec,
+                                       indvTree, fisTree, extTree, sizeTree,
+                                       birthRVec, indv_deathR, delta_indv,
+                                       gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                move_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                     fisTree, groupDeathID, NGrp, grp_tau, currT)
+                NDGrp += 1
+            else:  # only rates of source and target group change
+                update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                   grSizeVec, grpIDSource, birthRVec, indv_deathR,
+                                   delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                sync_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                     fisTree, grpIDSource, grp_tau, currT)
+
+        elif chanID == 2:
+            # extinction event - select group and remove it
+            eventGroup = util.select_random_event_sumtree(extTree,
+                                                         util.rand_uniform(groupStream))
+            NGrp, dNTot = delete_group(groupMat, NGrp, eventGroup, grSizeVec,
+                                       indvTree, fisTree, extTree, sizeTree,
+                                       birthRVec, indv_deathR, delta_indv,
+                                       gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+            move_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                 fisTree, eventGroup, NGrp, grp_tau, currT)
+            NTot += dNTot
+            NDGrp += 1
+
+        elif offspr_size > 0:
+            # fission event - add new groups and split cells
+            parrentNew, offspring, nOffspring = fission_group(
+                groupMat[:, eventGroup].copy(), offspr_size, offspr_frac, groupStream)
+
+            # only add daughters if not empty
+            if nOffspring > 0:
+                # grow group store if needed, rates and channels are recalculated
+                if NGrp + nOffspring > groupMat.shape[1]:
+                    groupMat = grow_groupMat(groupMat, NGrp, 2 * (NGrp + nOffspring))
+                    grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree = \
+                        init_rate_trees(groupMat, NGrp, birthRVec, indv_deathR, delta_indv,
+                                        gr_CFis, gr_SFis, indv_K, delta_size)
+                    heapTime, heapID, heapPos, chanRate, chanResid = \
+                        init_fission_channels(fisTree, grp_tau, currT, rngState)
+                # add new daughter groups
+                for oo in range(nOffspring):
+                    NGrp, dNTot = insert_group(groupMat, NGrp, offspring[:, oo], grSizeVec,
+                                               indvTree, fisTree, extTree, sizeTree,
+                                               birthRVec, indv_deathR, delta_indv,
+                                               gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                    sync_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                         fisTree, NGrp - 1, grp_tau, currT)
+                    NTot += dNTot
+                NBGrp += nOffspring
+
+                if parrentNew.sum() > 0: # update parrent
+                    groupMat[:, eventGroup] = parrentNew
+                    dNTot = update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                               grSizeVec, eventGroup, birthRVec, indv_deathR,
+                                               delta_indv, gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                    sync_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                         fisTree, eventGroup, grp_tau, currT)
+                else: #remove parrent
+                    NGrp, dNTot = delete_group(groupMat, NGrp, eventGroup, grSizeVec,
+                                               indvTree, fisTree, extTree, sizeTree,
+                                               birthRVec, indv_deathR, delta_indv,
+                                               gr_CFis, gr_SFis, indv_K, delta_size, coopPart)
+                    move_fission_channel(heapTime, heapID, heapPos, chanRate, chanResid,
+                                         fisTree, eventGroup, NGrp, grp_tau, currT)
+                    NDGrp += 1
+                NTot += dNTot
+
+        if NGrp == 0:  # if all groups have died, end simulation
+            sampleIdx = sample_extinction_jit(output, distFCoop, distGrSize,
+                                              sampleIdx, currT, NType)
+            isDone = True
+            break
+
+        # update rates of combined channels and rescale their firing times
+        calc_combined_rates(newCombRate, indvTree, extTree, NTot, NGrp, inv_migrR, grp_tau,
+                            K_grp, K_tot, delta_grp, delta_tot)
+        for cc in range(3):
+            if newCombRate[cc] != combRate[cc]:
+                combTime[cc], combResid[cc] = rescale_firing_time(
+                    combTime[cc], combRate[cc], newCombRate[cc], combResid[cc], currT)
+                combRate[cc] = newCombRate[cc]
+
+        # sample model and check if run has ended
+        sampleIdx, isDone, isBatchDone = sample_and_check(
+            groupMat[:, 0:NGrp], output, distFCoop, binFCoop, distGrSize, binGrSize,
+            runStat, stopStat,
+            sampleIdx, sampleStop, numTSample, currT, minTRun, sampleInt, mavInt, rmsInt,
+            rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+            stop_relPrec, stop_nBatch, stop_tQuant)
+        if isBatchDone:
+            break
+
+    # run has ended if max time is reached
+    if currT > maxT:
+        isDone = True
+
+    # return live groups only
+    groupMat = groupMat[:, 0:NGrp].copy()
+
+    return (groupMat, currT, sampleIdx, NBGrp, NDGrp, isDone)
+
+
+"""============================================================================
+Ensemble of replicates
+replicates of one parameter set are run after each other inside a single call of
+compiled code, outputs and random number generators are stacked with replicate
+as first dimension
+============================================================================"""
+
+# run all replicates one after the other, returns groups at end of replicates concatenated
+# along columns, with start column of each replicate, and number of samples of each replicate
+# end groups are stored in single buffer that grows by doubling, so storing them is O(total groups)
+@jit(Tuple((f8[:, ::1], i8[::1], i8[::1]))(
+        f8[:, ::1], u8[:, ::1],
+        f8[:, :, ::1], f8[:, :, ::1], f8[::1], f8[:, :, ::1], f8[::1],
+        f8[::1], f8, f8, f8, f8, f8,
+        f8, f8, f8, f8, f8, f8, f8, f8,
+        f8, f8,
+        f8, f8, f8, i8, i8, f8, f8, f8,
+        f8, i8, f8,
+        f8, f8, b1), nopython=True, nogil=True, cache=True)
+def run_ensemble_loop(groupMatInit, rngStateMat,
+                      outputMat, distFCoopMat, binFCoop, distGrSizeMat, binGrSize,
+                      birthRVec, indv_deathR, delta_indv, indv_mutR, inv_migrR, grp_tau,
+                      gr_CFis, gr_SFis, K_grp, K_tot, indv_K, delta_grp, delta_tot, delta_size,
+                      offspr_size, offspr_frac,
+                      maxT, minTRun, sampleInt, mavInt, rmsInt,
+                      rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+                      stop_relPrec, stop_nBatch, stop_tQuant,
+                      tau_eps, tau_minSize, useNRM):
+    nReplicate = rngStateMat.shape[0]
+    numTSample = outputMat.shape[1]
+    nSampleVec = np.zeros(nReplicate, dtype=np.int64)
+    endGroupStart = np.zeros(nReplicate + 1, dtype=np.int64)
+    endGroups = np.zeros((groupMatInit.shape[0], max(nReplicate * groupMatInit.shape[1], 1)))
+
+    for rr in range(nReplicate):
+        # get state of replicate
+        rngState = rngStateMat[rr]
+        output = outputMat[rr]
+        distFCoop = distFCoopMat[rr]
+        distGrSize = distGrSizeMat[rr]
+        runStat = np.zeros(nStateVar + groupMatInit.shape[0] + 6)
+        stopStat = np.zeros((numTSample // 5 + 1 if stop_relPrec > 0 else 1, 3))
+
+        # get first sample of init state
+        groupMat = groupMatInit.copy()
+        sampleIdx = sample_model_jit(groupMat, output, distFCoop, binFCoop,
+                                     distGrSize, binGrSize, runStat, 0, 0.,
+                                     mavInt, rmsInt)
+        if useNRM:
+            groupMat, _, sampleIdx, _, _, _ = run_event_loop_nrm(
+                groupMat, rngState,
+                output, distFCoop, binFCoop, distGrSize, binGrSize, runStat, stopStat,
+                0., sampleIdx, numTSample, 0, 0,
+                birthRVec, indv_deathR, delta_indv, indv_mutR, inv_migrR, grp_tau,
+                gr_CFis, gr_SFis, K_grp, K_tot, indv_K, delta_grp, delta_tot, delta_size,
+                offspr_size, offspr_frac,
+                maxT, minTRun, sampleInt, mavInt, rmsInt,
+                rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+                stop_relPrec, stop_nBatch, stop_tQuant)
+        else:
+            groupMat, _, sampleIdx, _, _, _ = run_event_loop(
+                groupMat, rngState,
+                output, distFCoop, binFCoop, distGrSize, binGrSize, runStat, stopStat,
+                0., sampleIdx, numTSample, 0, 0,
+                birthRVec, indv_deathR, delta_indv, indv_mutR, inv_migrR, grp_tau,
+                gr_CFis, gr_SFis, K_grp, K_tot, indv_K, delta_grp, delta_tot, delta_size,
+                offspr_size, offspr_frac,
+                maxT, minTRun, sampleInt, mavInt, rmsInt,
+                rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+                stop_relPrec, stop_nBatch, stop_tQuant,
+                tau_eps, tau_minSize)
+
+        # store end state of replicate
+        NGrp = groupMat.shape[1]
+        startCol = endGroupStart[rr]
+        if startCol + NGrp > endGroups.shape[1]:
+            endGroups = grow_groupMat(endGroups, startCol, 2 * (startCol + NGrp))
+        endGroups[:, startCol:startCol + NGrp] = groupMat[:, 0:NGrp]
+        nSampleVec[rr] = sampleIdx
+        endGroupStart[rr + 1] = startCol + NGrp
+
+    return (endGroups[:, 0:endGroupStart[nReplicate]].copy(), endGroupStart, nSampleVec)
+
+
+# read and check model parameters, returns parameters passed to compiled event loop
+def get_loop_par(model_par):
     # get individual rates
-    NType      = int(model_par['indv_NType'])
     indv_mutR  = float(model_par['indv_mutR'])
     delta_indv = float(model_par['delta_indv'])
     inv_migrR  = float(model_par['indv_migrR'])
@@ -648,11 +1844,42 @@ def run_model(model_par):
     offspr_size = float(model_par['offspr_size'])
     offspr_frac = float(model_par['offspr_frac'])
 
-    #get max runTime
-    if 'maxRunTime' in model_par:
-        maxRunTime = model_par['maxRunTime']
+    #get stopping criteria
+    rms_err_trNCoop = float(model_par['rms_err_trNCoop'])
+    rms_err_trNGr   = float(model_par['rms_err_trNGr'])
+    maxPopSize      = float(model_par['maxPopSize'])
+
+    #get simulation engine: direct Gillespie method, next reaction method, or tau leaping
+    if 'engine' in model_par:
+        engine = model_par['engine']
     else:
-        maxRunTime = np.inf
+        engine = 'direct'
+
+    #get stopping rule: rms error thresholds, or batch means confidence interval
+    #with relative precision stop_relPrec at confidence level stop_conf
+    if 'stop_rule' in model_par:
+        stop_rule = model_par['stop_rule']
+    else:
+        stop_rule = 'rms'
+
+    if stop_rule == 'batchmeans':
+        stop_relPrec = float(model_par['stop_relPrec']) if 'stop_relPrec' in model_par else 0.01
+        stop_nBatch = int(model_par['stop_nBatch']) if 'stop_nBatch' in model_par else 20
+        stop_conf = float(model_par['stop_conf']) if 'stop_conf' in model_par else 0.95
+        stop_tQuant = float(stats.t.ppf((1 + stop_conf) / 2, stop_nBatch - 1))
+    else:
+        stop_relPrec = 0.
+        stop_nBatch = 0
+        stop_tQuant = 0.
+
+    #get tau leaping settings: max relative change in cell numbers during leap,
+    #and min group size to leap, individual events in smaller groups are exact
+    if engine == 'tauleap':
+        tau_eps = float(model_par['tau_eps']) if 'tau_eps' in model_par else 0.03
+        tau_minSize = float(model_par['tau_minSize']) if 'tau_minSize' in model_par else 20.
+    else:
+        tau_eps = 0.
+        tau_minSize = 0.
 
     #check rates
     if offspr_size > 0.5:
@@ -661,159 +1888,198 @@ def run_model(model_par):
     elif offspr_frac < offspr_size or offspr_frac > (1-offspr_size):
         print('cannot do that: offspr_frac should be offspr_size < offspr_frac < 1-offspr_size')
         raise ValueError
+    if engine not in ('direct', 'nrm', 'tauleap'):
+        print('cannot do that: engine should be "direct", "nrm", or "tauleap"')
+        raise ValueError
+    if stop_rule not in ('rms', 'batchmeans'):
+        print('cannot do that: stop_rule should be "rms" or "batchmeans"')
+        raise ValueError
+    elif stop_rule == 'batchmeans' and (stop_relPrec <= 0 or stop_nBatch < 2):
+        print('cannot do that: stop_relPrec should be > 0 and stop_nBatch >= 2')
+        raise ValueError
 
     # Initialize model, get rates and init matrices
     maxT, minTRun, sampleInt, mavInt, rmsInt = calc_time_steps(model_par)
 
+    #init static helper vectors
+    _, birthRVec, indv_deathR = adjust_indv_rates(model_par)
+
+    # model parameters passed to compiled event loop
+    loopPar = (birthRVec, indv_deathR, delta_indv,
+               indv_mutR, inv_migrR, grp_tau,
+               gr_CFis, gr_SFis, K_grp, K_tot, indv_K,
+               delta_grp, delta_tot, delta_size,
+               offspr_size, offspr_frac,
+               maxT, minTRun, sampleInt, mavInt, rmsInt,
+               rms_err_trNCoop, rms_err_trNGr, maxPopSize,
+               stop_relPrec, stop_nBatch, stop_tQuant)
+
+    return (loopPar, engine, tau_eps, tau_minSize)
+
+
+# main model
+def run_model(model_par):
+    # initialize group matrix
+    groupMat = init_groupMat(model_par)
+
+    # run model
+    output, distFCoop, distGrSize, groupMat = run_model_groups(model_par, groupMat)
+
+    grSizeVec, fCoop_group =  sample_group_prop_end(groupMat)
+
+    return (output, distFCoop, distGrSize, grSizeVec, fCoop_group)
+
+
+# main model, starting from given groups, returns groups at end of run
+def run_model_groups(model_par, groupMat):
+    NType = int(model_par['indv_NType'])
+
+    #get parameters of compiled event loop
+    loopPar, engine, tau_eps, tau_minSize = get_loop_par(model_par)
+    maxT, _, sampleInt, mavInt, rmsInt = calc_time_steps(model_par)
+    numTSample = calc_num_sample(maxT, sampleInt)
+
+    #get max runTime
+    if 'maxRunTime' in model_par:
+        maxRunTime = model_par['maxRunTime']
+    else:
+        maxRunTime = np.inf
+
+    #get seed of random number generator: explicit seed, derived from master seed,
+    #or fresh entropy from OS if neither is set
+    seed = util.get_run_seed(model_par)
+
     # init counters
-    currT = 0
-    ttR = 0
+    currT = 0.
     sampleIdx = 0
     #counters to count group birth and death events
     NBGrp = 0
     NDGrp = 0
 
-    #init static helper vectors
-    oneVecType, birthRVec, indv_deathR = adjust_indv_rates(model_par)
-
-    # initialize output matrix
+    # initialize output matrix, ring buffer if only final state is stored
     output, distFCoop, binFCoop, distGrSize, binGrSize = init_output_matrix(model_par)
+    runStat = init_window_stat(model_par)
+    stopStat = init_stop_stat(model_par)
+    # compiled code writes to 2D float view of structured output matrix
+    outputArr = output.view(np.float64).reshape(output.size, -1)
 
-    # initialize group matrix
-    groupMat = init_groupMat(model_par)
-    NGrp     = groupMat.shape[1]
-
-    # creates matrix with rndSize0 entries, it is recreated if needed
-    rndSize0 = int(1E6)
-    rndSize1 = 5
-    randMat = util.create_randMat(rndSize0, rndSize1)
-
-    #init dynamic helper vectors
-    onesGrp, onesIndR, onesGrpR, indvRate, grpRate = \
-        create_helper_vector(NGrp, NType)
+    # init streaming random number generator of run
+    rngState = util.create_rng(seed, util.get_num_stream(model_par))
 
     # get first sample of init state
-    sampleIdx = sample_model(groupMat, output, distFCoop, binFCoop,
-                             distGrSize, binGrSize, sampleIdx, currT,
-                             mavInt, rmsInt, stateVarPlus,
-                             NBGrp, NDGrp)
+    sampleIdx = sample_model_jit(groupMat, outputArr, distFCoop, binFCoop,
+                                 distGrSize, binGrSize, runStat, sampleIdx, currT,
+                                 mavInt, rmsInt)
+
+    # return to python after every sample only if run time has to be checked
+    sampleBatch = 1 if maxRunTime < np.inf else numTSample
 
     startT = time.time()
 
-    # loop time steps
-    while currT <= maxT:
-        # reset rand matrix when used up
-        if ttR >= rndSize0:
-            randMat = util.create_randMat(rndSize0, rndSize1)
-            ttR = 0
-
-        #calc group state
-        grSizeVec, NTot = calc_group_state(groupMat, oneVecType, onesGrp)
-
-        # calc rates of individual level events
-        calc_indv_rates(indvRate, groupMat, grSizeVec, birthRVec,
-                        indv_deathR, delta_indv,
-                        NType, NGrp)
-
-        # calc rates of group events
-        calc_group_rates(grpRate, groupMat, grSizeVec, NTot, NGrp,
-                        gr_CFis, gr_SFis, K_grp, K_tot, indv_K,
-                        delta_grp, delta_tot, delta_size)
-
-        # calculate total propensities
-        indvProp = (onesIndR @ indvRate)
-        groupProp = grp_tau * (onesGrpR @ grpRate)
-        migrProp = inv_migrR * NTot
-        totProp = indvProp + groupProp + migrProp
+    # run compiled event loop in batches of samples
+    isDone = False
+    while not isDone:
+        sampleStop = sampleIdx + sampleBatch
+        loopState = (groupMat, rngState,
+                     outputArr, distFCoop, binFCoop, distGrSize, binGrSize, runStat, stopStat,
+                     currT, sampleIdx, sampleStop, NBGrp, NDGrp)
+        if engine == 'nrm':
+            loopOut = run_event_loop_nrm(*loopState, *loopPar)
+        else:
+            loopOut = run_event_loop(*loopState, *loopPar, tau_eps, tau_minSize)
+        groupMat, currT, sampleIdx, NBGrp, NDGrp, isDone = loopOut
+
+        #check if we are in allowed run time
+        if not isDone and (time.time() - startT) > maxRunTime:
+            sampleIdx = sample_nan_jit(outputArr, sampleIdx - 1, currT, NType)
+            isDone = True
+
+    if 'final_state_only' in model_par and model_par['final_state_only']:
+        # keep only last sample of ring buffer
+        lastRow = (sampleIdx - 1) % output.size
+        output = output[lastRow:lastRow + 1]
+    else:
+        # cut off non existing time points at end
+        output = output[0:sampleIdx]
+        distFCoop = distFCoop[0:sampleIdx, :]
+        distGrSize = distGrSize[0:sampleIdx, :]
 
-        # calc time step
-        dt = -1 * math.log(randMat[ttR, 1]) / totProp
+    return (output, distFCoop, distGrSize, groupMat)
 
-        # select group or individual event
-        rescaledRand = randMat[ttR, 0] * totProp
-        groupsHaveChanged = False
-        if rescaledRand < indvProp:
-            # individual level event - select and process individual level event
-            groupDeathID = process_indv_event(groupMat, indvRate,
-                                              indv_mutR, randMat[ttR, 2:4], NType, NGrp)
-            if groupDeathID > -1:  # remove empty group
-                groupMat, NGrp = remove_group(groupMat, groupDeathID)
-                NDGrp += 1
-                groupsHaveChanged = True
-        elif rescaledRand < (indvProp + migrProp):
-            # migration event - select and process migration event
-            groupDeathID = process_migration_event(groupMat, grSizeVec,
-                                                   NGrp, NType, randMat[ttR, 2:5])
-            if groupDeathID > -1:  # remove empty group
-                groupMat, NGrp = remove_group(groupMat, groupDeathID)
-                NDGrp += 1
-                groupsHaveChanged = True
-        else:
-            # group level event - select and process group level event
-            groupMat, NGrp, NBGrp, NDGrp = process_group_event(groupMat, grpRate, randMat[ttR, 2:4],
-                                                 offspr_size, offspr_frac, NBGrp, NDGrp)
-            groupsHaveChanged = True
-
-        if groupsHaveChanged:
-            if NGrp == 0:  # if all groups have died, end simulation
-                sampleIdx = sample_extinction(output, distFCoop, binFCoop,
-                                              distGrSize, sampleIdx, currT, stateVarPlus)
-                break
-            else: #otherwise, recreate helper vectors
-                onesGrp, onesIndR, onesGrpR, indvRate, grpRate = create_helper_vector(NGrp,
-                                                                                      NType)
 
-        # update time
-        currT += dt
-        ttR += 1
-        # sample model at intervals
-        nextSampleT = sampleInt * sampleIdx
-        if currT >= nextSampleT:
-            sampleIdx = sample_model(groupMat, output, distFCoop, binFCoop,
-                                     distGrSize, binGrSize, sampleIdx, currT,
-                                     mavInt, rmsInt, stateVarPlus,
-                                     NBGrp, NDGrp)
-            # check if steady state has been reached
-            if currT > minTRun:
-                NCoopStable = output['rms_err_NTot'][sampleIdx - 1] \
-                    < model_par['rms_err_trNCoop']
-                NGrpStable = output['rms_err_NGrp'][sampleIdx - 1] \
-                    < model_par['rms_err_trNGr']
-
-                if NCoopStable and NGrpStable:
-                    break
-
-            # check if population size remains in bounds
-            if output['NTot'][sampleIdx - 1] > model_par['maxPopSize']:
-                sampleIdx = sample_nan(groupMat, output, distFCoop, binFCoop,
-                                     distGrSize, binGrSize, sampleIdx - 1,
-                                     currT, mavInt, rmsInt, stateVarPlus)
-                break
+# run replicates of single parameter set
+def run_model_ensemble(model_par, nReplicate):
+    """[Runs nReplicate replicates of MLS model in single call of compiled code,
+        replicates are run sequentially (one after the other) in a single thread, 
+        use run_model_parallel to run in parallel. With explicit seed replicates use
+        independent children of seed, otherwise replicate r uses same random numbers 
+        as run_model with replicate_idx r+1 (see util.get_replicate_seeds)]
 
-            #check if we are in allowed run time
-            if (time.time() - startT) > maxRunTime:
-                sampleIdx = sample_nan(groupMat, output, distFCoop, binFCoop,
-                                     distGrSize, binGrSize, sampleIdx - 1,
-                                     currT, mavInt, rmsInt, stateVarPlus)
-                break
+    Parameters
+    ----------
+    model_par : [Dictionary]
+        [Stores model parameters, maxRunTime is not supported]
+    nReplicate : [int]
+        [number of replicates]
 
-        # check if simulation ends before reaching steady state
-        if output['NTot'][sampleIdx - 1] > model_par['maxPopSize']:
-            sampleIdx = sample_nan(groupMat, output, distFCoop, binFCoop,
-                                    distGrSize, binGrSize, sampleIdx - 1,
-                                    currT, mavInt, rmsInt, stateVarPlus)
-            break
+    Returns
+    -------
+    output : [Numpy recarray]
+        [nReplicate x nSample, time points after end of replicate are NaN]
+    distFCoop : [Numpy ndarray]
+        [nReplicate x nSample x nBin, distribution of frequency of cooperators]
+    distGrSize : [Numpy ndarray]
+        [nReplicate x nSample x nBin, distribution of group sizes]
+    grSizeList : [list]
+        [group sizes at end of each replicate]
+    fCoopList : [list]
+        [fraction of cooperators in each group at end of each replicate]
+    nSampleVec : [Numpy ndarray]
+        [number of time points of each replicate]
 
+    """
+    if 'maxRunTime' in model_par:
+        print('cannot do that: maxRunTime is not supported by run_model_ensemble, use run_model')
+        raise ValueError
+    if 'final_state_only' in model_par and model_par['final_state_only']:
+        print('cannot do that: final_state_only is not supported by run_model_ensemble, use run_model')
+        raise ValueError
 
+    #get parameters of compiled event loop
+    loopPar, engine, tau_eps, tau_minSize = get_loop_par(model_par)
 
-    # cut off non existing time points at end
-    output = output[0:sampleIdx]
-    distFCoop = distFCoop[0:sampleIdx, :]
-    distGrSize = distGrSize[0:sampleIdx, :]
+    # initialize stacked output matrices of all replicates
+    output, distFCoop, binFCoop, distGrSize, binGrSize = init_output_matrix(model_par)
+    output = np.tile(output, (nReplicate, 1))
+    distFCoop = np.tile(distFCoop, (nReplicate, 1, 1))
+    distGrSize = np.tile(distGrSize, (nReplicate, 1, 1))
+    # compiled code writes to 3D float view of structured output matrix
+    outputArr = output.view(np.float64).reshape(nReplicate, output.shape[1], -1)
 
-    grSizeVec, fCoop_group =  sample_group_prop_end(groupMat)
+    # initialize group matrix, shared by all replicates
+    groupMat = init_groupMat(model_par)
 
-    return (output, distFCoop, distGrSize, grSizeVec, fCoop_group)
+    # init random number generators, each replicate has its own seed
+    rngStateMat = np.zeros((nReplicate, util.RNG_STATE_SIZE * util.get_num_stream(model_par)),
+                           dtype=np.uint64)
+    for rr, seed in enumerate(util.get_replicate_seeds(model_par, nReplicate)):
+        rngStateMat[rr, :] = util.create_rng(seed, util.get_num_stream(model_par))
+
+    # run all replicates in compiled code
+    endGroups, endGroupStart, nSampleVec = run_ensemble_loop(
+        groupMat, rngStateMat, outputArr, distFCoop, binFCoop, distGrSize, binGrSize,
+        *loopPar, tau_eps, tau_minSize, engine == 'nrm')
+
+    # get group properties at end of each replicate
+    grSizeList = []
+    fCoopList = []
+    for rr in range(nReplicate):
+        grSizeVec, fCoop_group = sample_group_prop_end(
+            endGroups[:, endGroupStart[rr]:endGroupStart[rr + 1]])
+        grSizeList.append(grSizeVec)
+        fCoopList.append(fCoop_group)
+
+    return (output, distFCoop, distGrSize, grSizeList, fCoopList, nSampleVec)
 
 
 """============================================================================
@@ -822,6 +2088,7 @@ Code that calls model and plots results
 
 
 #run model store only final state
+@util.result_cache
 def run_model_dynamics_fig(model_par):
     """[Runs MLS model and stores dynamics]
 
@@ -836,7 +2103,8 @@ def run_model_dynamics_fig(model_par):
         [Contains steady state values of system variables and parameters]
 
     """
-    # run model
+    # run model, random numbers are derived from master seed if no seed is set
+    model_par = util.set_run_seed(model_par)
     output, distFCoop, distGrSize, _, _ = run_model(model_par)
     numt = output.size
 
@@ -881,6 +2149,7 @@ def run_model_dynamics_fig(model_par):
 
 
 #run model store only final state
+@util.result_cache
 def run_model_steadyState_fig(model_par):
     """[Runs MLS model and stores steady state]
 
@@ -895,9 +2164,11 @@ def run_model_steadyState_fig(model_par):
         [Contains steady state values of system variables and parameters]
 
     """
-    # run model
+    # run model, random numbers are derived from master seed if no seed is set
+    # only final state is stored, memory use does not grow with maxT
+    model_par = util.set_run_seed(model_par)
+    model_par = util.set_model_par(model_par, {'final_state_only': True})
     output, distFCoop, distGrSize, _, _ = run_model(model_par)
-    numt = output.size
 
     #input parameters to store
     parList = ['indv_NType', 'indv_asymmetry', 'indv_cost',
@@ -974,6 +2245,7 @@ def columnNames_steadyState_fig(model_par):
     return columnNames
 
 #run model store only final state
+@util.result_cache
 def single_run_finalstate(model_par):
     """[Runs MLS model and stores final state]
 
@@ -992,10 +2264,20 @@ def single_run_finalstate(model_par):
         [Contains steady state distribution of group sizes]
 
     """
-    # run model
+    output_matrix, endDistFCoop, endDistGrSize, _ = run_finalstate_groups(
+        model_par, init_groupMat(model_par))
+
+    return (output_matrix, endDistFCoop, endDistGrSize)
+
 
+#run model starting from given groups, store only final state and final groups
+def run_finalstate_groups(model_par, groupMat):
+    # run model, random numbers are derived from master seed if no seed is set
+    # only final state is stored, memory use does not grow with maxT
+    model_par = util.set_run_seed(model_par)
+    model_par = util.set_model_par(model_par, {'final_state_only': True})
     start = time.time()
-    output, distFCoop, distGrSize, _, _ = run_model(model_par)
+    output, distFCoop, distGrSize, groupMat = run_model_groups(model_par, groupMat)
     end = time.time()
 
     #input parameters to store
@@ -1032,7 +2314,222 @@ def single_run_finalstate(model_par):
     endDistFCoop = distFCoop[-1,:]
     endDistGrSize = distGrSize[-1, :]
 
-    return (output_matrix, endDistFCoop, endDistGrSize)
+    return (output_matrix, endDistFCoop, endDistGrSize, groupMat)
+
+
+#run list of parameter sets in parallel threads, store only final state
+def run_model_parallel(modelParList, nThread):
+    """[Runs MLS model for list of parameter sets in parallel threads of single process,
+        compiled event loop releases the GIL, results are written to preallocated array]
+
+    Parameters
+    ----------
+    modelParList : [list]
+        [list of model parameter dictionaries, all with same indv_NType]
+    nThread : [int]
+        [number of threads to use]
+
+    Returns
+    -------
+    output_matrix : [Numpy recarray]
+        [one row per parameter set, same fields as output of run_model_steadyState_fig]
+
+    """
+    NTypeSet = set(int(par['indv_NType']) for par in modelParList)
+    if len(NTypeSet) > 1:
+        print('cannot do that: all parameter sets should have same indv_NType')
+        raise ValueError
+
+    # preallocate output shared by all threads, each run writes its own row
+    columnNames = columnNames_steadyState_fig(modelParList[0])
+    dType = np.dtype([(x, 'f8') for x in columnNames])
+    output_matrix = np.full(len(modelParList), np.nan, dType)
+
+    def run_single(idx):
+        output_matrix[idx] = run_model_steadyState_fig(modelParList[idx])[0]
+        return None
+
+    with ThreadPoolExecutor(max_workers=nThread) as executor:
+        # list forces exceptions of runs to be raised
+        list(executor.map(run_single, range(len(modelParList))))
+
+    return output_matrix
+
+
+#parameters that change along continuation path
+continuationParList = ['offspr_size', 'offspr_frac', 'perimeter_loc', 'run_idx', 'replicate_idx']
+
+
+#order points of scan along continuation paths
+def continuation_paths(modelParList):
+    """[Orders points of offspr_size x offspr_frac scan along paths, neighbouring points
+        on path are neighbours in parameter grid, each set of other parameters has own path]
+
+    Parameters
+    ----------
+    modelParList : [list]
+        [list of model parameter dictionaries]
+
+    Returns
+    -------
+    pathList : [list]
+        [list of paths, each path is list of indices in modelParList]
+
+    """
+    # group points that only differ in offspring size and fraction
+    pathDict = {}
+    for idx, model_par in enumerate(modelParList):
+        otherPar = {key: val for key, val in model_par.items()
+                    if key not in continuationParList}
+        pathDict.setdefault(util.hash_model_par(otherPar), []).append(idx)
+
+    # order each group in serpentine: offspr_frac is alternately increased and decreased
+    pathList = []
+    for pointList in pathDict.values():
+        sizeVec = np.unique([modelParList[idx]['offspr_size'] for idx in pointList])
+        path = []
+        for ss, offspr_size in enumerate(sizeVec):
+            row = [idx for idx in pointList if modelParList[idx]['offspr_size'] == offspr_size]
+            row.sort(key=lambda idx: modelParList[idx]['offspr_frac'], reverse=(ss % 2 == 1))
+            path += row
+        pathList.append(path)
+
+    return pathList
+
+
+#run points along continuation path, each run starts from final groups of previous run
+def run_model_continuation(modelParList, minTWarm, verifyInt=0):
+    """[Runs parameter sets in order, each run starts from final groups of previous run
+        and uses shortened min run time, first run and runs following extinction
+        start from init_groupMat]
+
+    Parameters
+    ----------
+    modelParList : [list]
+        [list of model parameter dictionaries, ordered along path (see continuation_paths)]
+    minTWarm : [float]
+        [minT of warm started runs]
+    verifyInt : [int]
+        [every verifyInt-th warm started run is repeated from cold start, 0 to not verify]
+
+    Returns
+    -------
+    results : [list]
+        [output of single_run_finalstate for each parameter set]
+    verifyResults : [list]
+        [(index, output of single_run_finalstate from cold start) for verified runs]
+
+    """
+    results = []
+    verifyResults = []
+    groupMat = None
+    nWarm = 0
+    for idx, model_par in enumerate(modelParList):
+        if groupMat is None:
+            # cold start
+            output_matrix, endDistFCoop, endDistGrSize, groupMatEnd = run_finalstate_groups(
+                model_par, init_groupMat(model_par))
+        else:
+            # warm start from final groups of previous run
+            model_par_warm = util.set_model_par(model_par, {'minT': minTWarm})
+            output_matrix, endDistFCoop, endDistGrSize, groupMatEnd = run_finalstate_groups(
+                model_par_warm, groupMat)
+            nWarm += 1
+            if verifyInt > 0 and nWarm % verifyInt == 0:
+                verifyResults.append((idx, single_run_finalstate(model_par)))
+        results.append((output_matrix, endDistFCoop, endDistGrSize))
+
+        # continue from final groups only if population survived and stayed in bounds
+        if output_matrix['NTot'][0] > 0 and groupMatEnd.shape[1] > 0:
+            groupMat = groupMatEnd
+        else:
+            groupMat = None
+
+    return (results, verifyResults)
+
+
+#find max mutation rate at which population survives
+def run_meltdown_threshold(model_par, mutRMin, mutRMax, mutRTol, nTry=3):
+    """[Finds maximal mutation rate at which population maintains non-zero density,
+        with bisection over log10(indv_mutR)]
+
+    Extinction is stochastic close to threshold: mutation rate is considered to cause
+    meltdown only if all of nTry runs go extinct, at mutRMax a single run is done
+
+    Parameters
+    ----------
+    model_par : [Dictionary]
+        [Stores model parameters, indv_mutR is ignored]
+    mutRMin : [float]
+        [lowest mutation rate to consider]
+    mutRMax : [float]
+        [highest mutation rate to consider]
+    mutRTol : [float]
+        [tolerance of max mutation rate, in log10 units]
+    nTry : [int]
+        [number of runs before mutation rate is considered to cause meltdown]
+
+    Returns
+    -------
+    maxMu : [float]
+        [max mutation rate at which population survives, NaN if it does not survive at mutRMin]
+    output_matrix : [Numpy recarray]
+        [output of run_model_steadyState_fig at maxMu, None if maxMu is NaN]
+
+    """
+    # returns output of first run that survives, None if all runs go extinct
+    def run_survives(mutR, nTryLocal):
+        for tt in range(nTryLocal):
+            settings = {'indv_mutR': mutR}
+            # repeated runs get independent random numbers
+            if tt > 0:
+                settings['meltdown_try'] = tt
+            output = run_model_steadyState_fig(util.set_model_par(model_par, settings))
+            if output['NTot'][-1] > 0:
+                return output
+        return None
+
+    # check if threshold is within range
+    output = run_survives(mutRMax, 1)
+    if output is not None:
+        return (mutRMax, output)
+    outputLow = run_survives(mutRMin, nTry)
+    if outputLow is None:
+        return (np.nan, None)
+
+    # bisect: population survives at low end and goes extinct at high end of interval
+    mutRLow = mutRMin
+    logLow = math.log10(mutRMin)
+    logHigh = math.log10(mutRMax)
+    while (logHigh - logLow) > mutRTol:
+        logMid = (logLow + logHigh) / 2
+        output = run_survives(10 ** logMid, nTry)
+        if output is not None:
+            mutRLow = 10 ** logMid
+            logLow = logMid
+            outputLow = output
+        else:
+            logHigh = logMid
+
+    return (mutRLow, outputLow)
+
+
+#rerun single point of parameter scan
+def rerun(point):
+    """[Reruns single point of parameter scan and returns full dynamics,
+        uses same random numbers as the entry points used by the scans]
+
+    Parameters
+    ----------
+    point : [Dictionary]
+        [Stores model parameters of scan point, e.g. entry of modelParList]
+
+    Returns
+    -------
+    Same as run_model
+
+    """
+    return run_model(util.set_run_seed(point))
 
 
 # this piece of code is run only when this script is executed as the main
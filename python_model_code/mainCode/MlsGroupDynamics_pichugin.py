@@ -37,49 +37,92 @@ stateVar = ['NTot', 'fCoop', 'NGrp', 'groupSizeAv', 'groupSizeMed']
 Pichugin et al like rate functions  
 ============================================================================"""
 
-# calculate birth and death rate for all groups and types
+# recalculate all rates of single group after its composition has changed
+# rates are stored per column of capacity padded groupMat, with same layout as mls.update_indv_rates,
+# sum trees are updated in O(NType * log(NGrp)) time
+# returns change in group size
 # @jit provides speedup by compling this function at start of execution
 # To use @jit provide the data type of output and input, nopython=true makes compilation faster
-@jit(void(f8[::1], f8[:, ::1], f8[::1], f8, f8, i8, i8), nopython=True)
-def calc_indv_rates(rates, groupMat, grSizeVec, indv_K, alpha_b, NType, NGrp):
-    
-    #loop cell types
+@jit(f8(f8[::1], f8[::1], f8[::1], f8[:, ::1], f8[::1], i8, f8, f8, f8), nopython=True, cache=True)
+def update_group_rates(indvTree, fisTree, sizeTree, groupMat, grSizeVec, grpIdx,
+                       indv_K, alpha_b, gr_CFis):
+    NType = int(groupMat.shape[0] / 2)
+    grpCap = groupMat.shape[1]
+
+    grSize = groupMat[:, grpIdx].sum()
+    dSize = grSize - grSizeVec[grpIdx]
+    grSizeVec[grpIdx] = grSize
+
+    # calc rates
+    # to simulate results from Pichugin et al
+    # implements group size dependent birth rate grpBEf = 1 +  M*(Ni-1/Kind-2)^alpha_b
+    # we keep M=1, only cooperators reproduce and death rates are zero
+    grpBEf = ((grSize - 1) / (indv_K - 2)) ** alpha_b
     for tt in range(NType):
-        #setup indices
         cIdx = 2 * tt
-        dIdx = 2 * tt + 1
-        bIdxC1 = cIdx * NGrp 
-        bIdxD1 = dIdx * NGrp
-        dIdxC1 = bIdxC1 + 2 * NType * NGrp
-        dIdxD1 = bIdxD1 + 2 * NType * NGrp
-                        
-        # calc rates
-        # to simulate results from Pichugin et al
-        # implements group size dependent birth rate grpBEf = 1 +  M*(Ni-1/Kind-2)^alpha_b
-        # we keep M=1
-        grpBEf = ((grSizeVec - 1) / (indv_K - 2)) ** alpha_b
-        rates[bIdxC1: bIdxC1 + NGrp] = (1 + grpBEf) * groupMat[cIdx, :]
-        rates[bIdxD1: bIdxD1 + NGrp] = 0 
-        
-        rates[dIdxC1: dIdxC1 + NGrp] = 0
-        rates[dIdxD1: dIdxD1 + NGrp] = 0
-        
-    return None
+        util.update_sumtree(indvTree, cIdx * grpCap + grpIdx, (1 + grpBEf) * groupMat[cIdx, grpIdx])
+
+    # calc fission rate, extinction rate is always zero
+    fissionR = gr_CFis if grSize >= indv_K else 0.
+    util.update_sumtree(fisTree, grpIdx, fissionR)
+    util.update_sumtree(sizeTree, grpIdx, grSize)
 
-# calculate fission and extinction rate of all groups
-@jit(void(f8[::1], f8[::1], f8, f8, i8), nopython=True)
-def calc_group_rates(grpRate, grSizeVec, gr_CFis, K_ind, NGrp):
-    # calc fission rate
-    fissionR = (grSizeVec >= K_ind) * gr_CFis 
-    extinctR = np.zeros_like(fissionR)
+    return dSize
 
-    # combine all rates in single vector
-    grpRate[0:NGrp] = fissionR
-    grpRate[NGrp::] = extinctR
 
+# set all rates of empty group slot to zero
+@jit(void(f8[::1], f8[::1], f8[::1], f8[::1], i8, i8), nopython=True, cache=True)
+def clear_group_rates(indvTree, fisTree, sizeTree, grSizeVec, grpIdx, NType):
+    grpCap = grSizeVec.size
+    for tt in range(NType):
+        util.update_sumtree(indvTree, 2 * tt * grpCap + grpIdx, 0.)
+    util.update_sumtree(fisTree, grpIdx, 0.)
+    util.update_sumtree(sizeTree, grpIdx, 0.)
+    grSizeVec[grpIdx] = 0
     return None
 
- 
+
+# calculate all rates from scratch and store them in sum trees
+# only first NGrp columns of groupMat contain live groups
+@jit(Tuple((f8[::1], f8, f8[::1], f8[::1], f8[::1]))(f8[:, ::1], i8, f8, f8, f8), 
+     nopython=True, cache=True)
+def init_rate_trees(groupMat, NGrp, indv_K, alpha_b, gr_CFis):
+    NType = int(groupMat.shape[0] / 2)
+    grpCap = groupMat.shape[1]
+
+    indvTree = util.create_sumtree(4 * NType * grpCap)
+    fisTree = util.create_sumtree(grpCap)
+    sizeTree = util.create_sumtree(grpCap)
+    grSizeVec = np.zeros(grpCap)
+
+    NTot = 0.
+    for gg in range(NGrp):
+        NTot += update_group_rates(indvTree, fisTree, sizeTree, groupMat, grSizeVec, gg,
+                                   indv_K, alpha_b, gr_CFis)
+
+    return (grSizeVec, NTot, indvTree, fisTree, sizeTree)
+
+
+# remove group by moving last group into its slot, and update rates of both slots
+# returns new number of groups and change in total population size
+@jit(Tuple((i8, f8))(f8[:, ::1], i8, i8, f8[::1], f8[::1], f8[::1], f8[::1], f8, f8, f8), 
+     nopython=True, cache=True)
+def delete_group(groupMat, NGrp, grpIdx, grSizeVec, indvTree, fisTree, sizeTree,
+                 indv_K, alpha_b, gr_CFis):
+    NType = int(groupMat.shape[0] / 2)
+    lastIdx = NGrp - 1
+    dNTot = 0.
+    if grpIdx < lastIdx:
+        # move last group in place of removed one
+        groupMat[:, grpIdx] = groupMat[:, lastIdx]
+        dNTot += update_group_rates(indvTree, fisTree, sizeTree, groupMat, grSizeVec, grpIdx,
+                                    indv_K, alpha_b, gr_CFis)
+    # clear last slot
+    groupMat[:, lastIdx] = 0
+    dNTot -= grSizeVec[lastIdx]
+    clear_group_rates(indvTree, fisTree, sizeTree, grSizeVec, lastIdx, NType)
+    return (NGrp - 1, dNTot)
+
 
 """============================================================================
 Main model code
@@ -125,15 +168,11 @@ def run_model(model_par):
                         
     # init counters
     currT = 0
-    ttR = 0
     sampleIdx = 0
     #counters to count group birth and death events
     NBGrp = 0
     NDGrp = 0
 
-    #init static helper vectors
-    oneVecType = np.ones(2)
-    
     # initialize output matrix
     output, distFCoop, binFCoop, distGrSize, binGrSize = mls.init_output_matrix(model_par)
     
@@ -141,14 +180,13 @@ def run_model(model_par):
     groupMat = mls.init_groupMat(model_par)
     NGrp     = groupMat.shape[1]
 
-    # creates matrix with rndSize0 entries, it is recreated if needed
-    rndSize0 = int(1E6)
-    rndSize1 = 5 
-    randMat = util.create_randMat(rndSize0, rndSize1)
+    #get seed of random number generator: explicit seed, derived from master seed,
+    #or fresh entropy from OS if neither is set
+    seed = util.get_run_seed(model_par)
 
-    #init dynamic helper vectors
-    onesGrp, onesIndR, onesGrpR, indvRate, grpRate = \
-        mls.create_helper_vector(NGrp, NType)
+    # init streaming random number generator, rand stores numbers of current time step
+    rngState = util.create_rng(seed)
+    rand = np.empty(5)
 
     # get first sample of init state
     sampleIdx = mls.sample_model(groupMat, output, distFCoop, binFCoop,
@@ -156,74 +194,96 @@ def run_model(model_par):
                              mavInt, rmsInt, stateVarPlus,
                              NBGrp, NDGrp)
 
+    #copy groups to group store with spare capacity, and init rates
+    #rates are stored per column and updated incrementally after each event
+    groupMat = mls.grow_groupMat(groupMat, NGrp, 2 * NGrp)
+    grSizeVec, NTot, indvTree, fisTree, sizeTree = \
+        init_rate_trees(groupMat, NGrp, indv_K, alpha_b, gr_CFis)
+
     # loop time steps
     while currT <= maxT:
-        # reset rand matrix when used up
-        if ttR >= rndSize0:
-            randMat = util.create_randMat(rndSize0, rndSize1)
-            ttR = 0
-
-        #calc group state
-        grSizeVec, NTot = mls.calc_group_state(groupMat, oneVecType, onesGrp)
-
-        # calc rates of individual level events
-        calc_indv_rates(indvRate, groupMat, grSizeVec,
-                        indv_K, alpha_b,
-                        NType, NGrp)
-        
-        # calc rates of group events
-        calc_group_rates(grpRate, grSizeVec, gr_CFis, indv_K, NGrp)
+        # get random numbers of current time step
+        util.fill_rand(rngState, rand)
 
-        # calculate total propensities
-        indvProp = indv_tau * (onesIndR @ indvRate)
-        groupProp = onesGrpR @ grpRate
+        # calculate total propensities, stored in root of sum trees
+        indvProp = indv_tau * indvTree[1]
+        groupProp = fisTree[1]
         migrProp = inv_migrR * NTot
         totProp = indvProp + groupProp + migrProp
 
         # calc time step
-        dt = -1 * math.log(randMat[ttR, 1]) / totProp
+        dt = -1 * math.log(rand[1]) / totProp
 
         # select group or individual event
-        rescaledRand = randMat[ttR, 0] * totProp
-        groupsHaveChanged = False
+        rescaledRand = rand[0] * totProp
         if rescaledRand < indvProp:
             # individual level event - select and process individual level event
-            groupDeathID = mls.process_indv_event(groupMat, indvRate, 
-                                              indv_mutR, randMat[ttR, 2:4], NType, NGrp)
+            # rates are stored per column, pass capacity to decode event
+            eventGroup, groupDeathID = mls.process_indv_event(groupMat, indvTree, indv_mutR, 
+                                                              rand[2:4], NType, groupMat.shape[1])
             if groupDeathID > -1:  # remove empty group
-                groupMat, NGrp = mls.remove_group(groupMat, groupDeathID)
+                NGrp, dNTot = delete_group(groupMat, NGrp, groupDeathID, grSizeVec,
+                                           indvTree, fisTree, sizeTree, indv_K, alpha_b, gr_CFis)
                 NDGrp += 1
-                groupsHaveChanged = True
+            else:  # only rates of event group change
+                dNTot = update_group_rates(indvTree, fisTree, sizeTree, groupMat, grSizeVec, 
+                                           eventGroup, indv_K, alpha_b, gr_CFis)
+            NTot += dNTot
         elif rescaledRand < (indvProp + migrProp):
             # migration event - select and process migration event
-            groupDeathID = mls.process_migration_event(groupMat, grSizeVec, 
-                                                   NGrp, NType, randMat[ttR, 2:5])
+            grpIDSource, grpIDTarget, groupDeathID = mls.process_migration_event(
+                groupMat, sizeTree, NGrp, NType, rand[2:5])
+            # update target first, it can be moved when source is removed
+            update_group_rates(indvTree, fisTree, sizeTree, groupMat, grSizeVec, grpIDTarget,
+                               indv_K, alpha_b, gr_CFis)
             if groupDeathID > -1:  # remove empty group
-                groupMat, NGrp = mls.remove_group(groupMat, groupDeathID)
+                NGrp, _ = delete_group(groupMat, NGrp, groupDeathID, grSizeVec,
+                                       indvTree, fisTree, sizeTree, indv_K, alpha_b, gr_CFis)
                 NDGrp += 1
-                groupsHaveChanged = True
+            else:  # only rates of source and target group change
+                update_group_rates(indvTree, fisTree, sizeTree, groupMat, grSizeVec, grpIDSource,
+                                   indv_K, alpha_b, gr_CFis)
         else:
-            # group level event - select and process group level event
-            groupMat, NGrp, NBGrp, NDGrp = mls.process_group_event(groupMat, grpRate, randMat[ttR, 2:4], 
-                                                 offspr_size, offspr_frac, NBGrp, NDGrp)
-            groupsHaveChanged = True
-
-        if groupsHaveChanged:
-            if NGrp == 0:  # if all groups have died, end simulation
-                sampleIdx = mls.sample_extinction(output, distFCoop, binFCoop,
-                                              distGrSize, sampleIdx, currT, stateVarPlus)
-                break
-            else: #otherwise, recreate helper vectors
-                onesGrp, onesIndR, onesGrpR, indvRate, grpRate = mls.create_helper_vector(NGrp, 
-                                                                                      NType)
+            # group level event - only fission happens, add new groups and split cells
+            eventGroup = util.select_random_event_sumtree(fisTree, rand[2])
+            parrentNew, offspring, nOffspring = mls.fission_group(
+                groupMat[:, eventGroup].copy(), offspr_size, offspr_frac, rngState)
+
+            # only add daughters if not empty
+            if nOffspring > 0:
+                # grow group store if needed, rates are recalculated for new capacity
+                if NGrp + nOffspring > groupMat.shape[1]:
+                    groupMat = mls.grow_groupMat(groupMat, NGrp, 2 * (NGrp + nOffspring))
+                    grSizeVec, NTot, indvTree, fisTree, sizeTree = \
+                        init_rate_trees(groupMat, NGrp, indv_K, alpha_b, gr_CFis)
+                # add new daughter groups at end
+                for oo in range(nOffspring):
+                    groupMat[:, NGrp] = offspring[:, oo]
+                    update_group_rates(indvTree, fisTree, sizeTree, groupMat, grSizeVec, NGrp,
+                                       indv_K, alpha_b, gr_CFis)
+                    NGrp += 1
+                NBGrp += nOffspring
+
+                if parrentNew.sum() > 0: # update parrent
+                    groupMat[:, eventGroup] = parrentNew
+                    update_group_rates(indvTree, fisTree, sizeTree, groupMat, grSizeVec, eventGroup,
+                                       indv_K, alpha_b, gr_CFis)
+                else: #remove parrent
+                    NGrp, _ = delete_group(groupMat, NGrp, eventGroup, grSizeVec,
+                                           indvTree, fisTree, sizeTree, indv_K, alpha_b, gr_CFis)
+                    NDGrp += 1
+
+        if NGrp == 0:  # if all groups have died, end simulation
+            sampleIdx = mls.sample_extinction(output, distFCoop, binFCoop,
+                                          distGrSize, sampleIdx, currT, stateVarPlus)
+            break
 
         # update time
         currT += dt
-        ttR += 1
         # sample model at intervals
         nextSampleT = sampleInt * sampleIdx
         if currT >= nextSampleT:
-            sampleIdx = mls.sample_model(groupMat, output, distFCoop, binFCoop,
+            sampleIdx = mls.sample_model(groupMat[:, 0:NGrp], output, distFCoop, binFCoop,
                                      distGrSize, binGrSize, sampleIdx, currT, 
                                      mavInt, rmsInt, stateVarPlus,
                                      NBGrp, NDGrp)
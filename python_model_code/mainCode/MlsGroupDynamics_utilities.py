@@ -13,14 +13,110 @@ Contains varies functions used in MLS model code and in figure code
 
 """
 import math
+import hashlib
+import json
+import os
+import sys
+import pickle
+import functools
+import zipfile
+import glob
 import numpy as np
-from numba import jit, f8, i8
-from numba.types import UniTuple
+import numba
+from numba.core import caching
+from numba import jit, void, f8, i8, u8
+from numba.types import UniTuple, Tuple
 
 # import os
 # os.environ["NUMBA_DISABLE_JIT"] = '0'
 
 
+"""
+ Numba cache
+"""
+
+#numba only checks the time stamp of the source file of a cached function, it does not notice
+#changes in functions of other modules that are inlined into it (e.g. utilities in main),
+#or in global constants. Cache of model code is therefore stored with hash of the source of
+#all modules below, and is cleared when any of them changes. Check runs when utilities is
+#imported, which all model modules do before they compile
+numbaModuleList = ['MlsGroupDynamics_utilities',
+                   'MlsGroupDynamics_main',
+                   'MlsGroupDynamics_evolve',
+                   'MlsGroupDynamics_evolve_groups',
+                   'MlsGroupDynamics_pichugin']
+NUMBA_STAMP_FILE = 'MlsGroupDynamics_source.hash'
+
+
+def get_numba_cache_dir():
+    """[Gets folder where numba stores cached model code: __pycache__ next to source files,
+        or subfolder of NUMBA_CACHE_DIR if it is set]
+    
+    Returns:
+        [str] -- [path of cache folder]
+    """
+    if numba.config.CACHE_DIR:
+        cacheDir = os.path.join(numba.config.CACHE_DIR,
+                                caching._CacheLocator.get_suitable_cache_subpath(__file__))
+    else:
+        cacheDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__')
+    return cacheDir
+
+
+def get_numba_source_hash():
+    """[Gets hash of source of all modules with compiled model code and of numba version]
+    
+    Returns:
+        [str] -- [hex digest of hash]
+    """
+    sourceHash = hashlib.sha256(numba.__version__.encode())
+    sourceFolder = os.path.dirname(os.path.abspath(__file__))
+    for moduleName in numbaModuleList:
+        with open(os.path.join(sourceFolder, moduleName + '.py'), 'rb') as sourceFile:
+            sourceHash.update(sourceFile.read())
+    return sourceHash.hexdigest()
+
+
+def check_numba_cache():
+    """[Clears numba cache of model code if source of any model module changed since
+        cache was created]
+    
+    Returns:
+        [bool] -- [True if cache was cleared]
+    """
+    cacheDir = get_numba_cache_dir()
+    stampFile = os.path.join(cacheDir, NUMBA_STAMP_FILE)
+    sourceHash = get_numba_source_hash()
+    try:
+        with open(stampFile, 'r') as file:
+            isValid = file.read().strip() == sourceHash
+    except OSError:
+        isValid = False
+    if isValid:
+        return False
+
+    for moduleName in numbaModuleList:
+        for fileName in glob.glob(os.path.join(cacheDir, moduleName + '.*.nb[ic]')):
+            try:
+                os.remove(fileName)
+            except OSError:
+                # file is already removed by other process
+                pass
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        tmpFile = '%s.%i' % (stampFile, os.getpid())
+        with open(tmpFile, 'w') as file:
+            file.write(sourceHash)
+        os.replace(tmpFile, stampFile)
+    except OSError:
+        # folder is read only, numba then uses its own cache folder and cannot use this one
+        pass
+    return True
+
+
+numbaCacheCleared = check_numba_cache()
+
+
 """
  General functions
 """
@@ -42,7 +138,500 @@ def set_model_par(model_par, settings):
     return model_par_local
 
 
-@jit(UniTuple(i8,2)(i8, UniTuple(i8,2)), nopython=True)
+#default master seed of entry points, runs are reproducible unless other master seed is set
+MASTER_SEED = 20191021
+
+#parameters that set random numbers, they are not part of model state
+seedParList = ['seed', 'master_seed', 'common_random']
+
+#parameters that only set which samples are stored and when run stops,
+#they do not change model dynamics
+outputParList = ['final_state_only',
+                 'stop_rule', 'stop_relPrec', 'stop_nBatch', 'stop_conf',
+                 'traitDistr_file', 'traitDistr_decimate']
+
+
+def hash_model_par(model_par):
+    """[Creates stable hash of model parameters, independent of key order and numeric type]
+    
+    Arguments:
+        model_par {[dictionary]} -- [model parameters]
+    
+    Returns:
+        [string] -- [hexadecimal sha256 hash]
+    """
+    normPar = {}
+    for key, val in model_par.items():
+        if key in seedParList or key in outputParList:
+            continue
+        if isinstance(val, (bool, np.bool_)):
+            normPar[key] = str(val)
+        elif not np.isscalar(val):
+            # hash array content, str() of large arrays is truncated
+            arr = np.ascontiguousarray(val)
+            if arr.dtype.hasobject:
+                normPar[key] = str(val)
+            else:
+                normPar[key] = [str(arr.dtype), list(arr.shape),
+                                hashlib.sha256(arr.tobytes()).hexdigest()]
+        elif isinstance(val, (int, float, np.integer, np.floating)):
+            normPar[key] = float(val)
+        else:
+            normPar[key] = str(val)
+    parString = json.dumps(normPar, sort_keys=True)
+    return hashlib.sha256(parString.encode()).hexdigest()
+
+
+def set_run_seed(model_par):
+    """[Sets default master seed if no seed is set, used by entry points of parameter scans]
+    
+    Arguments:
+        model_par {[dictionary]} -- [model parameters]
+    
+    Returns:
+        [dictionary] -- [copy of model parameters with master_seed set]
+    """
+    model_par_local = model_par.copy()
+    if 'seed' not in model_par_local and 'master_seed' not in model_par_local:
+        model_par_local['master_seed'] = MASTER_SEED
+    return model_par_local
+
+
+def use_common_random(model_par):
+    """[Checks if run uses common random numbers]
+    
+    Arguments:
+        model_par {[dictionary]} -- [model parameters, uses optional 'common_random']
+    
+    Returns:
+        [bool] -- [True if common random numbers are used]
+    """
+    return 'common_random' in model_par and bool(model_par['common_random'])
+
+
+def get_run_seed(model_par):
+    """[Gets seed of run: explicit seed, or independent stream derived from
+        master seed, run and replicate index, and parameter values.
+        With common random numbers all parameter points of a replicate share the
+        same seed, derived from master seed and replicate index only]
+    
+    Arguments:
+        model_par {[dictionary]} -- [model parameters, uses 'seed' or 'master_seed']
+    
+    Returns:
+        [int, SeedSequence, or None] -- [seed to pass to create_rng, None uses fresh entropy]
+    """
+    if 'seed' in model_par:
+        seed = int(model_par['seed'])
+    elif 'master_seed' in model_par and use_common_random(model_par):
+        repIdx = int(model_par['replicate_idx']) % 2**32 if 'replicate_idx' in model_par else 1
+        # repeated runs of mutational meltdown search need independent numbers
+        tryIdx = int(model_par['meltdown_try']) if 'meltdown_try' in model_par else 0
+        seed = np.random.SeedSequence(int(model_par['master_seed']),
+                                      spawn_key=(repIdx, tryIdx))
+    elif 'master_seed' in model_par:
+        # spawn key entries should be non-negative, some scans use run_idx -1
+        runIdx = int(model_par['run_idx']) % 2**32 if 'run_idx' in model_par else 0
+        repIdx = int(model_par['replicate_idx']) % 2**32 if 'replicate_idx' in model_par else 1
+        # run_idx is not unique in all scans, parameter hash separates points
+        parHash = int(hash_model_par(model_par)[0:16], 16)
+        seed = np.random.SeedSequence(int(model_par['master_seed']),
+                                      spawn_key=(runIdx, repIdx, parHash))
+    else:
+        seed = None
+    return seed
+
+
+def get_replicate_seeds(model_par, nReplicate):
+    """[Gets seeds of replicates of single parameter set. With explicit seed each
+        replicate gets independent child of seed, so replicates differ but ensemble
+        is reproducible. Otherwise replicate r uses seed of run with replicate_idx r+1]
+    
+    Arguments:
+        model_par {[dictionary]} -- [model parameters, uses 'seed' or 'master_seed']
+        nReplicate {[int]} -- [number of replicates]
+    
+    Returns:
+        [list] -- [seed of each replicate to pass to create_rng]
+    """
+    if 'seed' in model_par:
+        seedList = np.random.SeedSequence(int(model_par['seed'])).spawn(nReplicate)
+    else:
+        seedList = [get_run_seed(set_model_par(model_par, {'replicate_idx': rr + 1}))
+                    for rr in range(nReplicate)]
+    return seedList
+
+
+"""
+ Result cache
+"""
+
+#results of entry points are cached on disk if environment variable MLS_CACHE_DIR is set,
+#cache is shared by all scripts and processes using same folder
+#oldest results are removed when cache exceeds MLS_CACHE_MAXGB (default 10) GB
+CACHE_DIR_VAR = 'MLS_CACHE_DIR'
+CACHE_SIZE_VAR = 'MLS_CACHE_MAXGB'
+CACHE_SIZE_DEF = 10
+
+#source files that define model, a change in any of them invalidates cache
+_engineVersion = {}
+
+
+def set_result_cache(cacheFolder, maxSizeGB=CACHE_SIZE_DEF):
+    """[Turns on result cache, set before starting parallel workers so that they inherit it]
+    
+    Arguments:
+        cacheFolder {[string or Path]} -- [folder to store results in, None turns cache off]
+    
+    Keyword Arguments:
+        maxSizeGB {[float]} -- [max size of cache in GB (default: {10})]
+    """
+    if cacheFolder is None:
+        os.environ.pop(CACHE_DIR_VAR, None)
+    else:
+        os.environ[CACHE_DIR_VAR] = str(cacheFolder)
+        os.environ[CACHE_SIZE_VAR] = str(maxSizeGB)
+    return None
+
+
+def get_engine_version(moduleName):
+    """[Gets hash of source code of module and of utilities, used as engine version of cache]
+    
+    Arguments:
+        moduleName {[string]} -- [name of module that defines cached function]
+    
+    Returns:
+        [string] -- [hexadecimal sha256 hash]
+    """
+    if moduleName not in _engineVersion:
+        sourceHash = hashlib.sha256()
+        for fileName in sorted(set([sys.modules[moduleName].__file__, __file__])):
+            with open(fileName, 'rb') as sourceFile:
+                sourceHash.update(sourceFile.read())
+        _engineVersion[moduleName] = sourceHash.hexdigest()
+    return _engineVersion[moduleName]
+
+
+def get_cache_key(funcName, moduleName, model_par):
+    """[Gets key of cached result: hash of function, engine version, model parameters, and seed]
+    
+    Arguments:
+        funcName {[string]} -- [name of cached function]
+        moduleName {[string]} -- [name of module that defines cached function]
+        model_par {[dictionary]} -- [model parameters, with seed set]
+    
+    Returns:
+        [string or None] -- [hexadecimal key, None if result is not reproducible]
+    """
+    # runs without seed, or that are stopped by wall time, are not reproducible
+    seed = get_run_seed(model_par)
+    if seed is None or 'maxRunTime' in model_par:
+        return None
+    if isinstance(seed, np.random.SeedSequence):
+        seedString = '%i_%s' % (seed.entropy, seed.spawn_key)
+    else:
+        seedString = '%i' % seed
+
+    # output parameters are not part of parameter hash, but change output
+    outputPar = {key: str(model_par[key]) for key in outputParList if key in model_par}
+    keyData = [funcName, get_engine_version(moduleName), hash_model_par(model_par),
+               outputPar, seedString]
+    keyString = json.dumps(keyData, sort_keys=True)
+    return hashlib.sha256(keyString.encode()).hexdigest()
+
+
+def prune_cache(cacheFolder, maxSize):
+    """[Removes least recently used results until cache is smaller than maxSize bytes]
+    
+    Arguments:
+        cacheFolder {[string]} -- [folder of cache]
+        maxSize {[float]} -- [max size of cache in bytes]
+    """
+    fileList = []
+    for entry in os.scandir(cacheFolder):
+        if entry.name.endswith('.pkl'):
+            try:
+                fileStat = entry.stat()
+                fileList.append((fileStat.st_mtime, fileStat.st_size, entry.path))
+            except FileNotFoundError:
+                continue
+
+    cacheSize = sum(fileSize for _, fileSize, _ in fileList)
+    for _, fileSize, filePath in sorted(fileList):
+        if cacheSize <= maxSize:
+            break
+        try:
+            os.remove(filePath)
+        except FileNotFoundError:
+            pass
+        cacheSize -= fileSize
+    return None
+
+
+def result_cache(func):
+    """[Decorator that caches result of entry point func(model_par) on disk,
+        cache is used only if environment variable MLS_CACHE_DIR is set]
+    
+    Arguments:
+        func {[function]} -- [entry point, takes model_par and returns result that can be pickled]
+    
+    Returns:
+        [function] -- [cached entry point]
+    """
+    @functools.wraps(func)
+    def cached_func(model_par):
+        cacheFolder = os.environ.get(CACHE_DIR_VAR)
+        if cacheFolder is None:
+            return func(model_par)
+        # entry points derive seed from master seed if no seed is set
+        key = get_cache_key(func.__name__, func.__module__, set_run_seed(model_par))
+        if key is None:
+            return func(model_par)
+        filePath = os.path.join(cacheFolder, key + '.pkl')
+
+        # load stored result, mark it as recently used
+        try:
+            with open(filePath, 'rb') as cacheFile:
+                result = pickle.load(cacheFile)
+            os.utime(filePath)
+            return result
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+        # run model and store result, rename is atomic so other processes never see partial files
+        result = func(model_par)
+        os.makedirs(cacheFolder, exist_ok=True)
+        tempPath = '%s.%i.tmp' % (filePath, os.getpid())
+        with open(tempPath, 'wb') as cacheFile:
+            pickle.dump(result, cacheFile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tempPath, filePath)
+
+        maxSize = float(os.environ.get(CACHE_SIZE_VAR, CACHE_SIZE_DEF)) * 1E9
+        prune_cache(cacheFolder, maxSize)
+        return result
+
+    return cached_func
+
+
+"""
+ Streamed storage of trait distributions
+"""
+
+#trait distributions of evolution models are stored in .npz file as sparse float32 frames,
+#frames are written in chunks of TRAITDISTR_CHUNK frames while model runs,
+#file can be read with np.load after every chunk, frames are read lazily per chunk
+TRAITDISTR_CHUNK = 256
+
+
+def append_npz(fileName, newFile=False, **arrays):
+    """[Adds arrays to compressed .npz file, file stays readable with np.load]
+    
+    Arguments:
+        fileName {[string or Path]} -- [name of .npz file]
+        **arrays -- [arrays to store, keyword is name of array in file]
+    
+    Keyword Arguments:
+        newFile {[bool]} -- [if True existing file is overwritten (default: {False})]
+    """
+    mode = 'w' if newFile else 'a'
+    with zipfile.ZipFile(fileName, mode=mode, compression=zipfile.ZIP_DEFLATED,
+                         allowZip64=True) as zipFile:
+        for key, val in arrays.items():
+            with zipFile.open(key + '.npy', 'w', force_zip64=True) as memberFile:
+                np.lib.format.write_array(memberFile, np.asanyarray(val), 
+                                          allow_pickle=True)
+    return None
+
+
+def open_traitDistr_file(fileName, shape, decimate=1):
+    """[Creates .npz file that trait distributions are streamed to]
+    
+    Arguments:
+        fileName {[string or Path]} -- [name of .npz file, existing file is overwritten]
+        shape {[tuple]} -- [shape of single trait distribution]
+    
+    Keyword Arguments:
+        decimate {[int]} -- [store only every decimate-th sample, 
+                             last sample is always stored (default: {1})]
+    
+    Returns:
+        [dictionary] -- [trait distribution store, pass to store_traitDistr_frame]
+    """
+    traitDistr = {'fileName'  : fileName,
+                  'shape'     : tuple(shape),
+                  'decimate'  : max(int(decimate), 1),
+                  'binType'   : np.uint16 if np.prod(shape) <= 2**16 else np.uint32,
+                  'chunkIdx'  : 0,
+                  'sample'    : [],
+                  'bin'       : [],
+                  'value'     : [],
+                  'lastSample': -1,
+                  'lastStored': -1,
+                  'lastFrame' : np.full(shape, np.nan)}
+    append_npz(fileName, newFile=True, traitDistr_shape=np.array(shape))
+    return traitDistr
+
+
+def add_traitDistr_frame(traitDistr, sampleIdx, frame):
+    #add frame to chunk buffer, only non-zero bins are stored
+    flatFrame = frame.ravel()
+    binIdx = np.flatnonzero(flatFrame)
+    traitDistr['sample'].append(sampleIdx)
+    traitDistr['bin'].append(binIdx.astype(traitDistr['binType']))
+    traitDistr['value'].append(flatFrame[binIdx].astype(np.float32))
+    traitDistr['lastStored'] = sampleIdx
+    if len(traitDistr['sample']) >= TRAITDISTR_CHUNK:
+        flush_traitDistr_file(traitDistr)
+    return None
+
+
+def flush_traitDistr_file(traitDistr):
+    #write buffered frames to file as one chunk
+    if len(traitDistr['sample']) == 0:
+        return None
+    frameStart = np.zeros(len(traitDistr['bin']) + 1, dtype=np.int64)
+    frameStart[1:] = np.cumsum([x.size for x in traitDistr['bin']])
+    chunkName = 'traitDistr_c%05i_' % traitDistr['chunkIdx']
+    append_npz(traitDistr['fileName'], **{
+        chunkName + 'sample': np.array(traitDistr['sample'], dtype=np.int64),
+        chunkName + 'start' : frameStart,
+        chunkName + 'bin'   : np.concatenate(traitDistr['bin']),
+        chunkName + 'value' : np.concatenate(traitDistr['value'])})
+    traitDistr['chunkIdx'] += 1
+    traitDistr['sample'] = []
+    traitDistr['bin'] = []
+    traitDistr['value'] = []
+    return None
+
+
+def store_traitDistr_frame(traitDistr, sampleIdx, frame):
+    """[Stores trait distribution of sample, in array or in trait distribution store]
+    
+    Arguments:
+        traitDistr {[numpy 3D array or dictionary]} -- [array of trait distributions, 
+                                                         or store from open_traitDistr_file]
+        sampleIdx {[int]} -- [index of sample]
+        frame {[numpy 2D array]} -- [trait distribution of sample]
+    """
+    if isinstance(traitDistr, dict):
+        traitDistr['lastSample'] = sampleIdx
+        traitDistr['lastFrame'] = frame.copy()
+        if sampleIdx % traitDistr['decimate'] == 0:
+            add_traitDistr_frame(traitDistr, sampleIdx, frame)
+    else:
+        traitDistr[sampleIdx, :, :] = frame
+    return None
+
+
+def close_traitDistr(traitDistr, numSample):
+    """[Finishes storing trait distributions at end of run]
+    
+    Arguments:
+        traitDistr {[numpy 3D array or dictionary]} -- [array of trait distributions, 
+                                                         or store from open_traitDistr_file]
+        numSample {[int]} -- [number of samples taken]
+    
+    Returns:
+        [numpy 3D array] -- [trait distributions of all samples, 
+                             or only of last sample if they are stored in file]
+    """
+    if isinstance(traitDistr, dict):
+        if traitDistr['lastSample'] > traitDistr['lastStored']:
+            add_traitDistr_frame(traitDistr, traitDistr['lastSample'], 
+                                 traitDistr['lastFrame'])
+        flush_traitDistr_file(traitDistr)
+        return traitDistr['lastFrame'][None, :, :]
+    else:
+        return traitDistr[0:numSample, :, :]
+
+
+def load_traitDistr(fileName):
+    """[Opens trait distributions stored in .npz file, frames are read lazily,
+        files with dense traitDistr array are supported as well]
+    
+    Arguments:
+        fileName {[string or Path]} -- [name of .npz file]
+    
+    Returns:
+        [dictionary or numpy 3D array] -- [trait distribution reader, pass to get_traitDistr_frame; 
+                                           reader['sampleIdx'] gives sample index of each frame]
+    """
+    dataFile = np.load(fileName, allow_pickle=True)
+    if 'traitDistr' in dataFile.files:
+        traitDistr = dataFile['traitDistr']
+        dataFile.close()
+        return traitDistr
+    
+    chunkNames = sorted(x[0:-6] for x in dataFile.files 
+                        if x.startswith('traitDistr_c') and x.endswith('sample'))
+    sampleList = [dataFile[x + 'sample'] for x in chunkNames]
+    chunkStart = np.zeros(len(chunkNames) + 1, dtype=np.int64)
+    chunkStart[1:] = np.cumsum([x.size for x in sampleList])
+    
+    reader = {'file'      : dataFile,
+              'shape'     : tuple(dataFile['traitDistr_shape']),
+              'chunkNames': chunkNames,
+              'chunkStart': chunkStart,
+              'sampleIdx' : np.concatenate(sampleList) if sampleList else np.zeros(0, dtype=np.int64),
+              'chunkIdx'  : -1,
+              'chunk'     : None}
+    return reader
+
+
+def get_traitDistr_numFrame(traitDistr):
+    """[Gets number of frames of trait distributions]
+    
+    Arguments:
+        traitDistr {[dictionary or numpy 3D array]} -- [reader from load_traitDistr or array]
+    
+    Returns:
+        [int] -- [number of frames]
+    """
+    if isinstance(traitDistr, dict):
+        return int(traitDistr['sampleIdx'].size)
+    else:
+        return traitDistr.shape[0]
+
+
+def get_traitDistr_frame(traitDistr, frameIdx):
+    """[Gets single frame of trait distributions, only chunk containing frame is read]
+    
+    Arguments:
+        traitDistr {[dictionary or numpy 3D array]} -- [reader from load_traitDistr or array]
+        frameIdx {[int]} -- [index of frame, negative values count from end]
+    
+    Returns:
+        [numpy 2D array] -- [trait distribution]
+    """
+    if not isinstance(traitDistr, dict):
+        return traitDistr[frameIdx, :, :]
+    
+    numFrame = get_traitDistr_numFrame(traitDistr)
+    if frameIdx < -numFrame or frameIdx >= numFrame:
+        message = 'cannot do that: frame index %i out of range, file has %i frames' % (frameIdx, numFrame)
+        print(message)
+        raise ValueError(message)
+    elif frameIdx < 0:
+        frameIdx += numFrame
+    
+    # read chunk of frame, last read chunk is kept in memory
+    chunkIdx = np.searchsorted(traitDistr['chunkStart'], frameIdx, side='right') - 1
+    if chunkIdx != traitDistr['chunkIdx']:
+        chunkName = traitDistr['chunkNames'][chunkIdx]
+        traitDistr['chunk'] = (traitDistr['file'][chunkName + 'start'],
+                               traitDistr['file'][chunkName + 'bin'],
+                               traitDistr['file'][chunkName + 'value'])
+        traitDistr['chunkIdx'] = chunkIdx
+    frameStart, binIdx, value = traitDistr['chunk']
+    
+    localIdx = frameIdx - traitDistr['chunkStart'][chunkIdx]
+    start, end = frameStart[localIdx], frameStart[localIdx + 1]
+    frame = np.zeros(np.prod(traitDistr['shape']))
+    frame[binIdx[start:end]] = value[start:end]
+    return frame.reshape(traitDistr['shape'])
+
+
+@jit(UniTuple(i8,2)(i8, UniTuple(i8,2)), nopython=True, cache=True)
 def flat_to_2d_index(flatIndex, shape):
     """
     converts flattend index to 2D indices for 'C' order arrays
@@ -52,7 +641,7 @@ def flat_to_2d_index(flatIndex, shape):
     idx1 = int(flatIndex % shape[1])
     return (idx0, idx1)
 
-@jit(UniTuple(i8,3)(i8, UniTuple(i8,3)), nopython=True)
+@jit(UniTuple(i8,3)(i8, UniTuple(i8,3)), nopython=True, cache=True)
 def flat_to_3d_index(flatIndex, shape):
     """
     converts flattend index to 3D indices for 'C' order arrays
@@ -66,7 +655,7 @@ def flat_to_3d_index(flatIndex, shape):
     return (idx0,idx1,idx2)
 
 # %%random sample based on propensity
-@jit(i8(f8[:], f8), nopython=True)
+@jit(i8(f8[:], f8), nopython=True, cache=True)
 def select_random_event(propensity_vec, randNum):
    # calculate cumulative propensities
     cumPropensity = propensity_vec.cumsum()
@@ -79,7 +668,7 @@ def select_random_event(propensity_vec, randNum):
     return id_group
 
 # %%random sample based on propensity, for 2D propensity input
-@jit(UniTuple(i8,2)(f8[:, :], f8), nopython=True)
+@jit(UniTuple(i8,2)(f8[:, :], f8), nopython=True, cache=True)
 def select_random_event_2D(propensity_vec, randNum):
     # calculate cumulative propensities
     cumPropensity = propensity_vec.cumsum()
@@ -94,7 +683,7 @@ def select_random_event_2D(propensity_vec, randNum):
     return idx
 
 # %%random sample based on propensity, for 3D propensity input
-@jit(i8(f8[:, :, :], f8), nopython=True)
+@jit(i8(f8[:, :, :], f8), nopython=True, cache=True)
 def select_random_event_3D(propensity_vec, randNum):
     # calculate cumulative propensities
     cumPropensity = propensity_vec.cumsum()
@@ -106,33 +695,393 @@ def select_random_event_3D(propensity_vec, randNum):
     id_group = index[(cumPropensity > randNumScaled)][0]
     return id_group
 
-@jit(i8(f8, i8))
-def truncated_poisson(expect_value, cutoff):
-    searching = True
-    while searching:
-        randNum = int(np.random.poisson(expect_value))
-        if randNum <= cutoff:
-            searching = False
-    return randNum
+# %% sum tree to sample events based on propensity in O(log n) time
+# tree is stored as flat vector of size 2*nLeaf, with nLeaf a power of 2
+# tree[nLeaf + i] stores propensity of event i, unused leafs are zero
+# tree[k] stores sum of its children tree[2k] and tree[2k+1]
+# tree[1] stores total propensity, tree[0] is not used
+@jit(f8[::1](i8), nopython=True, cache=True)
+def create_sumtree(nEvent):
+    nLeaf = 1
+    while nLeaf < nEvent:
+        nLeaf *= 2
+    tree = np.zeros(2 * nLeaf)
+    return tree
+
+# get view of leafs of sum tree, values can be changed in place
+# call build_sumtree after changing leafs through view
+@jit(f8[::1](f8[::1], i8), nopython=True, cache=True)
+def sumtree_leafs(tree, nEvent):
+    nLeaf = tree.size // 2
+    return tree[nLeaf:nLeaf + nEvent]
+
+# recalculate all internal nodes of sum tree from its leafs
+@jit(void(f8[::1]), nopython=True, cache=True)
+def build_sumtree(tree):
+    nLeaf = tree.size // 2
+    for idx in range(nLeaf - 1, 0, -1):
+        tree[idx] = tree[2 * idx] + tree[2 * idx + 1]
+    return None
+
+# set propensity of single event and update its parent nodes
+@jit(void(f8[::1], i8, f8), nopython=True, cache=True)
+def update_sumtree(tree, eventID, propensity):
+    idx = tree.size // 2 + eventID
+    tree[idx] = propensity
+    idx //= 2
+    while idx >= 1:
+        tree[idx] = tree[2 * idx] + tree[2 * idx + 1]
+        idx //= 2
+    return None
+
+# random sample based on propensity stored in sum tree
+@jit(i8(f8[::1], f8), nopython=True, cache=True)
+def select_random_event_sumtree(tree, randNum):
+    nLeaf = tree.size // 2
+    # rescale uniform random number [0,1] to total propensity
+    randNumScaled = randNum * tree[1]
+    # walk down tree, go left if random number falls in left branch
+    idx = 1
+    while idx < nLeaf:
+        left = 2 * idx
+        # never enter empty right branch, can happen due to rounding errors
+        if randNumScaled < tree[left] or tree[left + 1] <= 0:
+            idx = left
+        else:
+            randNumScaled -= tree[left]
+            idx = left + 1
+    return idx - nLeaf
+
+# %% indexed binary min heap to find next event in O(1) time and update it in O(log n) time
+# heapTime[k] stores time of event at heap position k, heapID[k] stores its event index
+# heapPos[i] stores heap position of event i, heapTime[0] is earliest event
+@jit(void(f8[::1], i8[::1], i8[::1], i8), nopython=True, cache=True)
+def sift_up_heap(heapTime, heapID, heapPos, pos):
+    while pos > 0:
+        parent = (pos - 1) // 2
+        if heapTime[parent] <= heapTime[pos]:
+            break
+        # swap with parent
+        heapTime[parent], heapTime[pos] = heapTime[pos], heapTime[parent]
+        heapID[parent], heapID[pos] = heapID[pos], heapID[parent]
+        heapPos[heapID[parent]] = parent
+        heapPos[heapID[pos]] = pos
+        pos = parent
+    return None
+
+# move event down heap till its children have later times
+@jit(void(f8[::1], i8[::1], i8[::1], i8), nopython=True, cache=True)
+def sift_down_heap(heapTime, heapID, heapPos, pos):
+    nEvent = heapTime.size
+    while True:
+        first = pos
+        left = 2 * pos + 1
+        right = left + 1
+        if left < nEvent and heapTime[left] < heapTime[first]:
+            first = left
+        if right < nEvent and heapTime[right] < heapTime[first]:
+            first = right
+        if first == pos:
+            break
+        # swap with earliest child
+        heapTime[first], heapTime[pos] = heapTime[pos], heapTime[first]
+        heapID[first], heapID[pos] = heapID[pos], heapID[first]
+        heapPos[heapID[first]] = first
+        heapPos[heapID[pos]] = pos
+        pos = first
+    return None
+
+# create heap from vector with event times
+@jit(Tuple((f8[::1], i8[::1], i8[::1]))(f8[::1]), nopython=True, cache=True)
+def create_heap(timeVec):
+    heapTime = timeVec.copy()
+    heapID = np.arange(timeVec.size)
+    heapPos = np.arange(timeVec.size)
+    for pos in range(timeVec.size // 2 - 1, -1, -1):
+        sift_down_heap(heapTime, heapID, heapPos, pos)
+    return (heapTime, heapID, heapPos)
+
+# set time of single event and restore heap order
+@jit(void(f8[::1], i8[::1], i8[::1], i8, f8), nopython=True, cache=True)
+def update_heap(heapTime, heapID, heapPos, eventID, newTime):
+    pos = heapPos[eventID]
+    oldTime = heapTime[pos]
+    heapTime[pos] = newTime
+    if newTime < oldTime:
+        sift_up_heap(heapTime, heapID, heapPos, pos)
+    elif newTime > oldTime:
+        sift_down_heap(heapTime, heapID, heapPos, pos)
+    return None
+
+
+# %% streaming random number generator, counter based Philox4x32-10
+# state is stored in vector of 11 uint64: key (2), counter (4), output buffer (4), buffer index (1)
+# all random numbers of compiled code are drawn from it, numpy's generator is not used
+# every counter value produces 4 random 32 bit integers, counter is increased when buffer is used up
+PHILOX_M0 = np.uint64(0xD2511F53)
+PHILOX_M1 = np.uint64(0xCD9E8D57)
+PHILOX_W0 = np.uint64(0x9E3779B9)
+PHILOX_W1 = np.uint64(0xBB67AE85)
+MASK32 = np.uint64(0xFFFFFFFF)
+SHIFT32 = np.uint64(32)
+RNG_STATE_SIZE = 11
+
+# with common random numbers each event class draws from its own stream, so that runs at
+# different parameter values stay aligned when the number of events of other classes differs
+# stream 0: time step and event class, 1: individual events, 2: migration, 3: group events
+NUM_STREAM_COMMON = 4
+
+
+def create_rng(seed, numStream=1):
+    """[Creates state of streaming random number generator]
+
+    Arguments:
+        seed {[int, sequence of int, or SeedSequence]} -- [seed of run, see get_run_seed]
+        numStream {[int]} -- [number of independent streams, stored after each other (default: {1})]
+
+    Returns:
+        [numpy uint64 array] -- [state of random number generator, pass to rand_uniform / fill_rand]
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        seedSeq = seed
+    else:
+        seedSeq = np.random.SeedSequence(seed)
+    key0, key1 = seedSeq.generate_state(2, dtype=np.uint32)
+
+    rngState = np.zeros(RNG_STATE_SIZE * numStream, dtype=np.uint64)
+    rngState[0] = key0
+    rngState[1] = key1
+    # buffer is empty at start
+    rngState[10] = 4
+
+    # other streams get keys from child sequences of seed
+    for ss in range(1, numStream):
+        childSeq = np.random.SeedSequence(seedSeq.entropy, spawn_key=seedSeq.spawn_key + (ss,))
+        offset = ss * RNG_STATE_SIZE
+        rngState[offset:offset + 2] = childSeq.generate_state(2, dtype=np.uint32)
+        rngState[offset + 10] = 4
+    return rngState
+
+
+def get_num_stream(model_par):
+    """[Gets number of random number streams of run]
+    
+    Arguments:
+        model_par {[dictionary]} -- [model parameters, uses optional 'common_random']
+    
+    Returns:
+        [int] -- [number of streams to pass to create_rng]
+    """
+    return NUM_STREAM_COMMON if use_common_random(model_par) else 1
+
+
+# get state of single stream, runs with single stream use it for all event classes
+@jit(u8[::1](u8[::1], i8), nopython=True, cache=True)
+def get_stream(rngState, streamIdx):
+    if rngState.size < RNG_STATE_SIZE * (streamIdx + 1):
+        streamIdx = 0
+    return rngState[RNG_STATE_SIZE * streamIdx:RNG_STATE_SIZE * (streamIdx + 1)]
+
+
+# calc next 4 random integers from counter and key, and increase counter
+@jit(void(u8[::1]), nopython=True, cache=True)
+def philox_next(rngState):
+    k0 = rngState[0]
+    k1 = rngState[1]
+    c0 = rngState[2]
+    c1 = rngState[3]
+    c2 = rngState[4]
+    c3 = rngState[5]
+    # 10 rounds of Philox4x32
+    for _ in range(10):
+        prod0 = PHILOX_M0 * c0
+        prod1 = PHILOX_M1 * c2
+        c0 = ((prod1 >> SHIFT32) ^ c1 ^ k0) & MASK32
+        c1 = prod1 & MASK32
+        c2 = ((prod0 >> SHIFT32) ^ c3 ^ k1) & MASK32
+        c3 = prod0 & MASK32
+        k0 = (k0 + PHILOX_W0) & MASK32
+        k1 = (k1 + PHILOX_W1) & MASK32
+    rngState[6] = c0
+    rngState[7] = c1
+    rngState[8] = c2
+    rngState[9] = c3
+    rngState[10] = 0
+
+    # increase 128 bit counter
+    for idx in range(2, 6):
+        rngState[idx] = (rngState[idx] + np.uint64(1)) & MASK32
+        if rngState[idx] != 0:
+            break
+    return None
+
+
+# draw uniform random number in open interval (0,1) with 52 bit resolution
+@jit(f8(u8[::1]), nopython=True, cache=True)
+def rand_uniform(rngState):
+    if rngState[10] > 2:
+        philox_next(rngState)
+    idx = rngState[10]
+    highBits = rngState[6 + idx] >> np.uint64(6)
+    lowBits = rngState[7 + idx] >> np.uint64(6)
+    rngState[10] = idx + np.uint64(2)
+    # k < 2^52, so (k + 0.5) / 2^52 is exact and never 0 or 1
+    return (float(highBits) * 67108864. + float(lowBits) + 0.5) / 4503599627370496.
+
+
+# fill vector with uniform random numbers in open interval (0,1)
+@jit(void(u8[::1], f8[::1]), nopython=True, cache=True)
+def fill_rand(rngState, randVec):
+    for idx in range(randVec.size):
+        randVec[idx] = rand_uniform(rngState)
+    return None
+
+
+# %% discrete random variates, drawn from streaming generator
+# draw from Poisson distribution truncated at cutoff, using inverse CDF of table
+# table covers window of 10 standard deviations around peak, mass outside is negligible
+# random number is drawn from stream rngState (see rand_uniform)
+@jit(i8(f8, i8, u8[::1]), nopython=True, cache=True)
+def truncated_poisson(expect_value, cutoff, rngState):
+    if expect_value <= 0 or cutoff <= 0:
+        return 0
+    # window of values with non negligible probability, peak is at kPeak
+    width = int(10 * math.sqrt(expect_value)) + 10
+    kMax = min(cutoff, int(expect_value) + width)
+    kPeak = min(int(expect_value), kMax)
+    kMin = max(0, kPeak - width)
+
+    # cumulative probabilities, relative to probability at peak
+    logExpect = math.log(expect_value)
+    logPeak = kPeak * logExpect - math.lgamma(kPeak + 1)
+    cumProb = np.empty(kMax - kMin + 1)
+    totProb = 0.
+    for kk in range(kMin, kMax + 1):
+        totProb += math.exp(kk * logExpect - math.lgamma(kk + 1) - logPeak)
+        cumProb[kk - kMin] = totProb
+
+    randNum = kMin + np.searchsorted(cumProb, rand_uniform(rngState) * totProb)
+    return min(randNum, kMax)
+
+
+# draw from hypergeometric distribution: number of good items when drawing nSample
+# items without replacement, inverse CDF search outward from mode
+# random number is drawn from stream rngState (see rand_uniform)
+@jit(i8(i8, i8, i8, u8[::1]), nopython=True, cache=True)
+def hypergeometric(nGood, nBad, nSample, rngState):
+    kMin = max(0, nSample - nBad)
+    kMax = min(nSample, nGood)
+    if kMin == kMax:
+        return kMin
+
+    # probability at mode
+    kMode = int((nSample + 1) * (nGood + 1) / (nGood + nBad + 2))
+    kMode = min(max(kMode, kMin), kMax)
+    logProb = math.lgamma(nGood + 1) - math.lgamma(kMode + 1) - math.lgamma(nGood - kMode + 1) \
+        + math.lgamma(nBad + 1) - math.lgamma(nSample - kMode + 1) \
+        - math.lgamma(nBad - nSample + kMode + 1) \
+        - math.lgamma(nGood + nBad + 1) + math.lgamma(nSample + 1) \
+        + math.lgamma(nGood + nBad - nSample + 1)
+    probMode = math.exp(logProb)
+
+    # subtract probabilities from random number, alternating above and below mode
+    randNum = rand_uniform(rngState) - probMode
+    if randNum <= 0:
+        return kMode
+    kUp, probUp = kMode, probMode
+    kDown, probDown = kMode, probMode
+    while kUp < kMax or kDown > kMin:
+        if kUp < kMax:
+            probUp *= (nGood - kUp) * (nSample - kUp) / \
+                ((kUp + 1) * (nBad - nSample + kUp + 1))
+            kUp += 1
+            randNum -= probUp
+            if randNum <= 0:
+                return kUp
+        if kDown > kMin:
+            probDown *= kDown * (nBad - nSample + kDown) / \
+                ((nGood - kDown + 1) * (nSample - kDown + 1))
+            kDown -= 1
+            randNum -= probDown
+            if randNum <= 0:
+                return kDown
+    # only reached due to rounding errors
+    return kMode
+
+
+# draw from Poisson distribution, inverse CDF search outward from mode
+# cost scales with standard deviation, random number is drawn from stream rngState
+@jit(i8(f8, u8[::1]), nopython=True, cache=True)
+def rand_poisson(expect_value, rngState):
+    if expect_value <= 0:
+        return 0
+    # probability at mode
+    kMode = int(expect_value)
+    probMode = math.exp(kMode * math.log(expect_value) - expect_value - math.lgamma(kMode + 1))
+
+    # subtract probabilities from random number, alternating above and below mode
+    randNum = rand_uniform(rngState) - probMode
+    if randNum <= 0:
+        return kMode
+    kUp, probUp = kMode, probMode
+    kDown, probDown = kMode, probMode
+    while probUp > 0 or kDown > 0:
+        kUp += 1
+        probUp *= expect_value / kUp
+        randNum -= probUp
+        if randNum <= 0:
+            return kUp
+        if kDown > 0:
+            probDown *= kDown / expect_value
+            kDown -= 1
+            randNum -= probDown
+            if randNum <= 0:
+                return kDown
+    # only reached due to rounding errors
+    return kMode
 
 
-# %%create matrix with random numbers, excluding 0 and 1
-@jit(f8[:, :](i8, i8), nopython=True)
-def create_randMat(num_t, num_rand):
-    notDone = True
-    while notDone:
-        randMat = np.random.random((num_t, num_rand))
-        containsNo0 = (~np.any(randMat == 0))
-        containsNo1 = (~np.any(randMat == 1))
-        if containsNo0 & containsNo1:
-            notDone = False
+# draw from binomial distribution, inverse CDF search outward from mode
+# cost scales with standard deviation, random number is drawn from stream rngState
+@jit(i8(i8, f8, u8[::1]), nopython=True, cache=True)
+def rand_binomial(nTrial, prob, rngState):
+    if nTrial <= 0 or prob <= 0:
+        return 0
+    if prob >= 1:
+        return nTrial
+    # probability at mode
+    kMode = min(int((nTrial + 1) * prob), nTrial)
+    logProb = math.lgamma(nTrial + 1) - math.lgamma(kMode + 1) - math.lgamma(nTrial - kMode + 1) \
+        + kMode * math.log(prob) + (nTrial - kMode) * math.log(1 - prob)
+    probMode = math.exp(logProb)
+    odds = prob / (1 - prob)
 
-    return randMat
+    # subtract probabilities from random number, alternating above and below mode
+    randNum = rand_uniform(rngState) - probMode
+    if randNum <= 0:
+        return kMode
+    kUp, probUp = kMode, probMode
+    kDown, probDown = kMode, probMode
+    while kUp < nTrial or kDown > 0:
+        if kUp < nTrial:
+            probUp *= odds * (nTrial - kUp) / (kUp + 1)
+            kUp += 1
+            randNum -= probUp
+            if randNum <= 0:
+                return kUp
+        if kDown > 0:
+            probDown *= kDown / (odds * (nTrial - kDown + 1))
+            kDown -= 1
+            randNum -= probDown
+            if randNum <= 0:
+                return kDown
+    # only reached due to rounding errors
+    return kMode
 
 
 # %% Model sampling functions
 #calculate moving average of time vector
-@jit(UniTuple(f8, 2)(f8[:], i8, i8), nopython=True)
+@jit(UniTuple(f8, 2)(f8[:], i8, i8), nopython=True, cache=True)
 def calc_moving_av(f_t, curr_idx, windowLength):
     # get first time point
     if windowLength < 1:
@@ -148,7 +1097,7 @@ def calc_moving_av(f_t, curr_idx, windowLength):
 
 
 # calculate rms error of time vector
-@jit(f8(f8[:], i8, i8), nopython=True)
+@jit(f8(f8[:], i8, i8), nopython=True, cache=True)
 def calc_rms_error(mav_t, curr_idx, windowLength):
     # get first time point
     if windowLength < 1:
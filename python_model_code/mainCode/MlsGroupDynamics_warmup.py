@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Oct 18 2026
+Last Update Oct 18 2026
+
+Precompiles all compiled model code and stores it in numba's on-disk cache
+
+Run from folder python_model_code with: python -m mainCode.MlsGroupDynamics_warmup
+
+@author: Simon van Vliet & Gil Henriques
+Department of Zoology
+University of Britisch Columbia
+vanvliet@zoology.ubc.ca
+henriques@zoology.ubc.ca
+
+"""
+
+"""============================================================================
+Import dependencies & define global constants
+============================================================================"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import importlib
+import time
+from mainCode import MlsGroupDynamics_utilities as util
+
+
+"""============================================================================
+Warmup
+Run once per node (or once per shared cache folder) before starting batch jobs,
+afterwards every process loads the compiled code from disk instead of compiling it
+Cache is stored in __pycache__ next to source files,
+set environment variable NUMBA_CACHE_DIR to use other (e.g. node local) folder
+Cache is cleared when source of any module in util.numbaModuleList changes
+(see util.check_numba_cache), numba itself only checks source file of each function
+============================================================================"""
+
+#import modules, this compiles all functions or loads them from cache
+#utilities and main are imported by all others, so they come first
+def warmup():
+    if util.numbaCacheCleared:
+        print('model code changed, cleared cache in %s' % util.get_numba_cache_dir())
+    for moduleName in util.numbaModuleList:
+        start = time.time()
+        importlib.import_module('mainCode.' + moduleName)
+        print('%s ready in %.1f s' % (moduleName, time.time() - start))
+    return None
+
+
+if __name__ == "__main__":
+    warmup()
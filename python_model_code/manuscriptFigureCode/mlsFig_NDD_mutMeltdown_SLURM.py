@@ -41,8 +41,10 @@ mainName = 'mutMelt_NoDensDep-2021-07-09'
 #SET nr of replicates
 nReplicate = 7
 
-#set  mutation rates to try
-mu_Vec = np.logspace(0,-7,20)
+#set range of mutation rates to search, and tolerance of max mutation rate (in log10 units)
+mu_min = 1E-7
+mu_max = 1
+mu_tol = 0.1
 
 #setup 2D parameter grid
 offspr_size_Vec = np.arange(0.01, 0.5, 0.034)
@@ -186,27 +188,15 @@ def run_meltdown_scan(model_par):
     for par in parList:
         outputMat[par] = model_par[par]
 
-    hasMeltdown = True
-    idx = 0
-    #reduce mutation rate till community can survive
-    while hasMeltdown:
-        model_par['indv_mutR'] = mu_Vec[idx]
-        output = mls.run_model_steadyState_fig(model_par)
-
-        #if community survives, found max mutation burden
-        if output['NTot'][-1] > 0:
-            hasMeltdown = False
-            outputMat['maxMu'] = model_par['indv_mutR']
-            outputMat['NTot'] = output['NTot_mav']
-            outputMat['fCoop'] = output['fCoop_mav']
-            outputMat['NGrp'] = output['NGrp_mav']
-
-        else:
-            idx += 1
-
-        #end when lowest possible mutation rate has been reached
-        if idx >= mu_Vec.size:
-            hasMeltdown = False
+    #find max mutation rate at which community can survive, with bisection
+    maxMu, output = mls.run_meltdown_threshold(model_par, mu_min, mu_max, mu_tol)
+
+    #store max mutation burden, remains NaN if community can not survive
+    if output is not None:
+        outputMat['maxMu'] = maxMu
+        outputMat['NTot'] = output['NTot_mav']
+        outputMat['fCoop'] = output['fCoop_mav']
+        outputMat['NGrp'] = output['NGrp_mav']
 
     return outputMat
 
@@ -114,10 +114,11 @@ def run_single(model_par, mainName):
     fileName = mainName + parName + '.npz'
     fileNamePkl = mainName + parName + '.pkl'
     
-    #run model and save data to disk
+    #run model and save data to disk, trait distributions are streamed to file while model runs
+    model_par = util.set_model_par(model_par, {'traitDistr_file': fileName})
     try:
         outputMat, traitDistr = mls.run_model(model_par)  
-        np.savez(fileName, output=outputMat, traitDistr=traitDistr, model_par=[model_par])
+        util.append_npz(fileName, output=outputMat, model_par=[model_par])
         try:
             df = pd.DataFrame.from_records(outputMat)
             df.to_pickle(fileNamePkl)
@@ -52,6 +52,10 @@ gr_CFis_vec = np.array([0.05])# changed from 0.01 in 2020-08-07
 #SET nr of replicates
 nReplicate = 5
 
+#SET to True to use common random numbers: all parameter points of a replicate use
+#the same random number streams, so differences between points are less noisy
+use_common_random = False
+
 #SET rest of model parameters
 model_par = {
           #time and run settings
@@ -95,6 +99,7 @@ model_par = {
         # extra settings
         'run_idx':          1,
         'replicate_idx':    1,
+        'common_random':    use_common_random,
         'perimeter_loc':    0
     }
 
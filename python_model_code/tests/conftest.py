@@ -0,0 +1,5 @@
+# tests import model code as package mainCode, as scripts in python_model_code do
+# run from any folder with: python -m pytest python_model_code/tests
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,56 @@
+"""
+Tests of simulation engines of main model
+
+Without group events each group is a logistic birth death process,
+all engines should give same mean group size
+"""
+
+import numpy as np
+import pytest
+from mainCode import MlsGroupDynamics_main as mls
+
+
+def model_par_indv(**settings):
+    model_par = {
+        "maxT": 30, "maxPopSize": 1E9, "minT": 1, "sampleInt": 0.1,
+        "mav_window": 1, "rms_window": 1, "rms_err_trNCoop": 0, "rms_err_trNGr": 0,
+        "init_groupNum": 40, "init_fCoop": 1, "init_groupDens": 50,
+        "indv_NType": 1, "indv_asymmetry": 1, "indv_cost": 0.01, "indv_mutR": 0,
+        "indv_migrR": 0, "indv_K": 50, "delta_indv": 1,
+        'gr_CFis': 0, 'gr_SFis': 0, 'grp_tau': 0,
+        'delta_grp': 0, 'K_grp': 0, 'delta_tot': 0, 'K_tot': 1, 'delta_size': 0,
+        'offspr_size': 0.1, 'offspr_frac': 0.5, 'seed': 1}
+    model_par.update(settings)
+    return model_par
+
+
+def mean_group_size(model_par):
+    output = mls.run_model(model_par)[0]
+    #skip first time unit
+    return output['groupSizeAv'][10:].mean()
+
+
+def test_direct_logistic_group_size():
+    model_par = model_par_indv()
+    # deterministic group size at equilibrium, birth rate (1-cost) equals death rate n / K
+    # stochastic mean is slightly lower due to fluctuations
+    eqSize = (1 - model_par['indv_cost']) * model_par['indv_K']
+    assert abs(mean_group_size(model_par) - eqSize) < 0.05 * eqSize
+
+
+@pytest.mark.parametrize('engine', ['nrm', 'tauleap'])
+def test_engine_matches_direct(engine):
+    # engines use different random numbers, compare means over different seeds
+    sizeDirect = np.mean([mean_group_size(model_par_indv(seed=seed)) for seed in range(3)])
+    sizeEngine = np.mean([mean_group_size(model_par_indv(engine=engine, seed=seed + 10)) 
+                          for seed in range(3)])
+    assert abs(sizeEngine - sizeDirect) < 0.01 * sizeDirect
+
+
+@pytest.mark.parametrize('engine', ['direct', 'nrm', 'tauleap'])
+def test_engine_reproducible(engine):
+    model_par = model_par_indv(engine=engine, maxT=5, grp_tau=1, gr_CFis=0.05, delta_tot=1, 
+                               K_tot=2000, indv_migrR=0.01)
+    output1 = mls.run_model(model_par)[0]
+    output2 = mls.run_model(model_par)[0]
+    assert np.array_equal(output1['NTot'], output2['NTot'], equal_nan=True)
@@ -0,0 +1,127 @@
+"""
+Tests of sparse group store of evolution model
+
+Bins of each group should stay sorted and add up to the group matrix,
+lookup tables between slots and group matrix columns should stay consistent
+"""
+
+import numpy as np
+import pytest
+from mainCode import MlsGroupDynamics_evolve as evo
+
+
+# check store, lookup tables, and group matrix against each other
+def check_grpStore(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT):
+    nSlot = binNum.size
+    nFree = freeSlot[0]
+    free = freeSlot[1:nFree + 1]
+    # every slot is either free or holds a live group
+    assert nFree + NGroup == nSlot
+    assert np.unique(free).size == nFree
+    assert (grpLUT[free] == -1).all()
+    assert (binNum[free] == 0).all()
+    assert np.array_equal(np.sort(grpLUT[grpLUT > -1]), np.arange(NGroup))
+    # each group keeps an unused bin for next event
+    assert binNum.max() < binKey.shape[1]
+
+    NTypeTot = grpMat2D.shape[0]
+    for grpIdx in range(NGroup):
+        slotIdx = slotLUT[grpIdx]
+        assert grpLUT[slotIdx] == grpIdx
+        keys = binKey[slotIdx, :binNum[slotIdx]]
+        counts = binCount[slotIdx, :binNum[slotIdx]]
+        assert (np.diff(keys) > 0).all()
+        assert (counts > 0).all()
+        typeCount = np.bincount(keys // evo.nBinTrait, weights=counts, minlength=NTypeTot)
+        assert np.array_equal(typeCount, grpMat2D[:, grpIdx])
+
+
+def test_add_remove_cells_keep_bins_sorted():
+    rng = np.random.default_rng(7)
+    binKey, binCount, binNum, freeSlot = evo.init_grpStore(3, 64)
+    slotIdx = evo.alloc_slot(freeSlot)
+    counts = np.zeros(4 * evo.nBinTrait)
+    for _ in range(200):
+        key = rng.integers(0, 40)
+        evo.add_cells(binKey, binCount, binNum, slotIdx, key, 1.)
+        counts[key] += 1
+        if rng.random() < 0.4:
+            binIdx = rng.integers(0, binNum[slotIdx])
+            counts[binKey[slotIdx, binIdx]] -= 1
+            evo.remove_cell(binKey, binCount, binNum, slotIdx, binIdx)
+
+        # equal keys are merged and empty bins are removed
+        keys = binKey[slotIdx, :binNum[slotIdx]]
+        assert (np.diff(keys) > 0).all()
+        assert np.array_equal(keys, np.flatnonzero(counts))
+        assert np.array_equal(binCount[slotIdx, :binNum[slotIdx]], counts[keys])
+
+
+def test_add_cells_reports_full_group():
+    binKey, binCount, binNum, freeSlot = evo.init_grpStore(2, 3)
+    slotIdx = evo.alloc_slot(freeSlot)
+    assert not evo.add_cells(binKey, binCount, binNum, slotIdx, 5, 1.)
+    assert not evo.add_cells(binKey, binCount, binNum, slotIdx, 2, 1.)
+    # existing bin does not use unused bin
+    assert not evo.add_cells(binKey, binCount, binNum, slotIdx, 5, 1.)
+    assert evo.add_cells(binKey, binCount, binNum, slotIdx, 7, 1.)
+
+
+def test_alloc_release_slot_stack():
+    binKey, binCount, binNum, freeSlot = evo.init_grpStore(4, 8)
+    # lowest slot is on top of stack
+    assert [evo.alloc_slot(freeSlot) for _ in range(3)] == [0, 1, 2]
+    assert freeSlot[0] == 1
+    binNum[1] = 2
+    evo.release_slot(binNum, freeSlot, 1)
+    assert binNum[1] == 0
+    assert evo.alloc_slot(freeSlot) == 1
+    assert evo.alloc_slot(freeSlot) == 3
+    assert freeSlot[0] == 0
+
+
+def test_expand_grpStore_keeps_groups_and_free_slots():
+    model_par = {"init_groupNum": 5, "indv_NType": 2, "init_groupDens": 20, "init_fCoop": 0.5,
+                 'offspr_sizeInit': 0.1, 'offspr_fracInit': 0.5}
+    binKey, binCount, binNum, freeSlot, grpMat2D, grpLUT, slotLUT = evo.init_grpMat(model_par)
+    NGroup = grpMat2D.shape[1]
+    check_grpStore(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT)
+
+    nSlot = binNum.size
+    oldFree = freeSlot[1:freeSlot[0] + 1].copy()
+    binKey, binCount, binNum, freeSlot, grpLUT, slotLUT = \
+        evo.expand_grpStore(binKey, binCount, binNum, freeSlot, grpLUT, slotLUT)
+    assert binNum.size == nSlot + evo.sizeGroupMatIncrement
+    # old free slots are used first
+    assert np.array_equal(freeSlot[freeSlot[0] - oldFree.size + 1:freeSlot[0] + 1], oldFree)
+    check_grpStore(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT)
+
+
+# second case starts with few bins per group and mutates often, so bins are expanded
+@pytest.mark.parametrize('binCapInit, mutR', [(16, 5E-2), (1, 0.5)])
+def test_evolve_store_consistent_during_run(monkeypatch, binCapInit, mutR):
+    model_par = {"maxT": 10, "maxPopSize": 0, "minT": 10, "sampleInt": 0.5, "mav_window": 5,
+                 "rms_window": 5, "init_groupNum": 20, "init_fCoop": 1, "init_groupDens": 20,
+                 "indv_NType": 2, "indv_asymmetry": 1, "indv_cost": 0.01, "indv_migrR": 0.5,
+                 'mutR_type': 1E-3, 'mutR_size': mutR, 'mutR_frac': mutR, "indv_K": 100,
+                 "delta_indv": 1, 'gr_CFis': 1/100, 'gr_SFis': 4, 'alpha_Fis': 1, 'indv_tau': 0.1,
+                 'delta_grp': 0, 'K_grp': 0, 'delta_tot': 1, 'K_tot': 500, 'delta_size': 1,
+                 'offspr_sizeInit': 0.3, 'offspr_fracInit': 0.5, 'seed': 5}
+    monkeypatch.setattr(evo, 'binCapInit', binCapInit)
+
+    # check store before and after each fission event
+    fission_group = evo.fission_group
+    numFission = [0]
+    def checked_fission_group(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup,
+                              grpLUT, slotLUT, eventGroup, rngState):
+        check_grpStore(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT)
+        binKey, binCount, binNum, freeSlot, grpMat2D, grpLUT, slotLUT, NGroup = fission_group(
+            binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT, eventGroup,
+            rngState)
+        check_grpStore(binKey, binCount, binNum, freeSlot, grpMat2D, NGroup, grpLUT, slotLUT)
+        numFission[0] += 1
+        return (binKey, binCount, binNum, freeSlot, grpMat2D, grpLUT, slotLUT, NGroup)
+    monkeypatch.setattr(evo, 'fission_group', checked_fission_group)
+
+    evo.run_model(model_par)
+    assert numFission[0] > 0
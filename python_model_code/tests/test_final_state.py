@@ -0,0 +1,33 @@
+"""
+Tests of final-state-only run mode of main model
+
+Last sample should equal last sample of run that stores all samples,
+moving averages and rms errors are updated with running sums and equal up to rounding
+"""
+
+import numpy as np
+from mainCode import MlsGroupDynamics_main as mls
+
+
+def test_final_state_only_matches_full_output():
+    model_par = {
+        "maxT": 20, "maxPopSize": 1E9, "minT": 10, "sampleInt": 0.1,
+        "mav_window": 2, "rms_window": 2, "rms_err_trNCoop": 0, "rms_err_trNGr": 0,
+        "init_groupNum": 40, "init_fCoop": 1, "init_groupDens": 50,
+        "indv_NType": 2, "indv_asymmetry": 1, "indv_cost": 0.01, "indv_mutR": 1E-3,
+        "indv_migrR": 0.01, "indv_K": 50, "delta_indv": 1,
+        'gr_CFis': 0.05, 'gr_SFis': 0, 'grp_tau': 1,
+        'delta_grp': 0, 'K_grp': 0, 'delta_tot': 1, 'K_tot': 2000, 'delta_size': 0,
+        'offspr_size': 0.1, 'offspr_frac': 0.5, 'seed': 1}
+    output, distFCoop, distGrSize, _, _ = mls.run_model(model_par)
+    model_par['final_state_only'] = True
+    outputLast, distFCoopLast, distGrSizeLast, _, _ = mls.run_model(model_par)
+
+    assert outputLast.size == 1
+    for name in output.dtype.names:
+        if name.endswith('_mav') or name.startswith('rms_err'):
+            assert np.isclose(outputLast[name][0], output[name][-1], rtol=1E-9)
+        else:
+            assert outputLast[name][0] == output[name][-1]
+    assert np.array_equal(distFCoopLast[0], distFCoop[-1])
+    assert np.array_equal(distGrSizeLast[0], distGrSize[-1])
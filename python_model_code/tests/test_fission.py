@@ -0,0 +1,104 @@
+"""
+Tests of random draws used to split groups during fission
+
+Draws should follow their target distributions, and splitting a group
+should conserve cells of each category
+"""
+
+import numpy as np
+import pytest
+from scipy import stats
+from mainCode import MlsGroupDynamics_utilities as util
+from mainCode import MlsGroupDynamics_main as mls
+
+NUM_DRAW = 20000
+
+
+@pytest.mark.parametrize('nGood, nBad, nSample', [(5, 7, 6), (40, 3, 20), (2, 100, 50), (6, 0, 4)])
+def test_hypergeometric_distribution(nGood, nBad, nSample):
+    rngState = util.create_rng(1)
+    draws = np.array([util.hypergeometric(nGood, nBad, nSample, rngState) for _ in range(NUM_DRAW)])
+    values = np.arange(max(0, nSample - nBad), min(nSample, nGood) + 1)
+    assert draws.min() >= values[0] and draws.max() <= values[-1]
+    freq = np.array([(draws == kk).mean() for kk in values])
+    prob = stats.hypergeom(nGood + nBad, nGood, nSample).pmf(values)
+    assert np.allclose(freq, prob, atol=4 * np.sqrt(0.25 / NUM_DRAW))
+
+
+@pytest.mark.parametrize('expect_value, cutoff', [(3.5, 100), (20., 22), (400., 380), (0.2, 1)])
+def test_truncated_poisson_distribution(expect_value, cutoff):
+    rngState = util.create_rng(2)
+    draws = np.array([util.truncated_poisson(expect_value, cutoff, rngState)
+                      for _ in range(NUM_DRAW)])
+    assert draws.min() >= 0 and draws.max() <= cutoff
+    values = np.arange(cutoff + 1)
+    prob = stats.poisson(expect_value).pmf(values)
+    prob /= prob.sum()
+    sdMean = np.sqrt((prob * (values - prob @ values) ** 2).sum() / NUM_DRAW)
+    assert abs(draws.mean() - prob @ values) < 4 * sdMean + 1e-12
+
+
+def test_truncated_poisson_edge_cases():
+    rngState = util.create_rng(2)
+    assert util.truncated_poisson(0., 10, rngState) == 0
+    assert util.truncated_poisson(5., 0, rngState) == 0
+
+
+@pytest.mark.parametrize('expect_value', [0.01, 0.7, 12., 900.])
+def test_poisson_distribution(expect_value):
+    rngState = util.create_rng(5)
+    draws = np.array([util.rand_poisson(expect_value, rngState) for _ in range(NUM_DRAW)])
+    values = np.arange(draws.max() + 1)
+    freq = np.bincount(draws) / NUM_DRAW
+    prob = stats.poisson(expect_value).pmf(values)
+    assert np.allclose(freq, prob, atol=4 * np.sqrt(0.25 / NUM_DRAW))
+    assert abs(draws.mean() - expect_value) < 4 * np.sqrt(expect_value / NUM_DRAW)
+    assert util.rand_poisson(0., rngState) == 0
+
+
+@pytest.mark.parametrize('nTrial, prob', [(10, 0.01), (40, 0.5), (300, 0.9), (5, 1.), (5, 0.)])
+def test_binomial_distribution(nTrial, prob):
+    rngState = util.create_rng(6)
+    draws = np.array([util.rand_binomial(nTrial, prob, rngState) for _ in range(NUM_DRAW)])
+    values = np.arange(nTrial + 1)
+    freq = np.bincount(draws, minlength=nTrial + 1) / NUM_DRAW
+    assert np.allclose(freq, stats.binom(nTrial, prob).pmf(values), 
+                       atol=4 * np.sqrt(0.25 / NUM_DRAW))
+
+
+def test_split_group_conserves_cells():
+    rngState = util.create_rng(3)
+    composition = np.array([30., 0., 12., 5.])
+    destSize = np.array([10, 7, 20, 10], dtype=np.int64)
+    total = np.zeros((composition.size, destSize.size))
+    for _ in range(2000):
+        destMat = mls.split_group(composition, destSize, rngState)
+        assert np.array_equal(destMat.sum(axis=1), composition)
+        assert np.array_equal(destMat.sum(axis=0), destSize)
+        assert (destMat >= 0).all()
+        total += destMat
+    # cells are assigned at random, expected share is proportional to destination size
+    expect = np.outer(composition, destSize) / composition.sum()
+    assert np.allclose(total / 2000, expect, atol=0.3)
+
+
+def test_offspring_number_conserves_cells():
+    rngState = util.create_rng(4)
+    for offspr_size, offspr_frac, NCellPar in [(0.1, 0.5, 100), (0.05, 0.9, 37), (0.4, 0.5, 3)]:
+        for _ in range(200):
+            nOffspring, nPerOff, nLastOff, nParRemain = \
+                mls.draw_offspring_number(offspr_size, offspr_frac, NCellPar, rngState)
+            assert nParRemain >= 0
+            if nOffspring > 0:
+                assert 1 <= nLastOff <= nPerOff
+                assert (nOffspring - 1) * nPerOff + nLastOff + nParRemain == NCellPar
+            else:
+                assert nParRemain == NCellPar
+
+
+def test_split_group_reproducible_from_stream():
+    composition = np.array([30., 4., 12., 5.])
+    destSize = np.array([10, 7, 24, 10], dtype=np.int64)
+    draws = [mls.split_group(composition, destSize, util.create_rng(seed)) for seed in (7, 7, 8)]
+    assert np.array_equal(draws[0], draws[1])
+    assert not np.array_equal(draws[0], draws[2])
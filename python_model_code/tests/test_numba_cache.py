@@ -0,0 +1,37 @@
+"""
+Tests of invalidation of numba's on-disk cache of model code
+
+Cache should be cleared when source of any model module changes,
+and kept otherwise
+"""
+
+from mainCode import MlsGroupDynamics_utilities as util
+
+
+def test_numba_cache_cleared_when_source_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(util, 'get_numba_cache_dir', lambda: str(tmp_path))
+    cachedFiles = ['MlsGroupDynamics_main.run_model-10.py311.nbi',
+                   'MlsGroupDynamics_main.run_model-10.py311.1.nbc',
+                   'MlsGroupDynamics_evolve_groups.run_model-5.py311.nbi']
+    otherFile = tmp_path / 'otherModule.run-1.py311.nbi'
+
+    def make_files():
+        for fileName in cachedFiles:
+            (tmp_path / fileName).write_bytes(b'')
+        otherFile.write_bytes(b'')
+
+    # no stamp: cache is cleared, files of other modules are kept
+    make_files()
+    assert util.check_numba_cache()
+    assert not any((tmp_path / fileName).exists() for fileName in cachedFiles)
+    assert otherFile.exists()
+
+    # same source: cache is kept
+    make_files()
+    assert not util.check_numba_cache()
+    assert all((tmp_path / fileName).exists() for fileName in cachedFiles)
+
+    # changed source of any module: cache is cleared
+    monkeypatch.setattr(util, 'get_numba_source_hash', lambda: 'changed')
+    assert util.check_numba_cache()
+    assert not any((tmp_path / fileName).exists() for fileName in cachedFiles)
@@ -0,0 +1,205 @@
+"""
+Tests of sum trees and of incrementally updated rates
+
+Rates that are updated after each event should always equal rates
+calculated from scratch from the current groups
+"""
+
+import numpy as np
+from mainCode import MlsGroupDynamics_utilities as util
+from mainCode import MlsGroupDynamics_main as mls
+from mainCode import MlsGroupDynamics_pichugin as pich
+from mainCode import MlsGroupDynamics_evolve as evo
+from mainCode import MlsGroupDynamics_evolve_groups as evog
+
+
+def test_sumtree_point_update_equals_rebuild():
+    rng = np.random.default_rng(1)
+    tree = util.create_sumtree(37)
+    leafs = util.sumtree_leafs(tree, 37)
+    for _ in range(200):
+        eventID = rng.integers(37)
+        util.update_sumtree(tree, eventID, rng.random() * (rng.random() > 0.3))
+    rebuilt = tree.copy()
+    util.build_sumtree(rebuilt)
+    assert np.array_equal(tree, rebuilt)
+    assert np.isclose(tree[1], leafs.sum())
+
+
+def test_sumtree_selects_by_propensity():
+    tree = util.create_sumtree(5)
+    util.sumtree_leafs(tree, 5)[:] = [1., 0., 2., 0., 1.]
+    util.build_sumtree(tree)
+    # leaf i is selected when random number falls in its part of cumulative propensity
+    assert util.select_random_event_sumtree(tree, 0.1) == 0
+    assert util.select_random_event_sumtree(tree, 0.3) == 2
+    assert util.select_random_event_sumtree(tree, 0.7) == 2
+    assert util.select_random_event_sumtree(tree, 0.9) == 4
+    # empty leafs are never selected, also not at edge of random number range
+    assert util.select_random_event_sumtree(tree, 1.0) == 4
+    assert util.select_random_event_sumtree(tree, 0.0) == 0
+
+
+def random_groups(rng, NType, NGrp, grpCap):
+    groupMat = np.zeros((2 * NType, grpCap))
+    groupMat[:, 0:NGrp] = rng.integers(0, 6, (2 * NType, NGrp))
+    groupMat[0, 0:NGrp] += 1
+    return groupMat
+
+
+def test_main_rate_trees_match_recount():
+    rng = np.random.default_rng(2)
+    NType, NGrp = 2, 20
+    birthRVec = np.array([1., 1.1, 0.9, 1.2])
+    par = (birthRVec, 0.01, 1., 0.01, 0.02, 50., 1.)
+    groupMat = random_groups(rng, NType, NGrp, 32)
+    grSizeVec, NTot, indvTree, fisTree, extTree, sizeTree = \
+        mls.init_rate_trees(groupMat, NGrp, *par)
+    coopPart = np.empty(NType)
+
+    # change, add, and remove groups and update rates incrementally
+    for _ in range(300):
+        grpIdx = rng.integers(NGrp)
+        action = rng.integers(3)
+        if action == 0 and NGrp < groupMat.shape[1]:
+            NGrp, dNTot = mls.insert_group(groupMat, NGrp, random_groups(rng, NType, 1, 1)[:, 0],
+                                           grSizeVec, indvTree, fisTree, extTree, sizeTree, *par,
+                                           coopPart)
+        elif action == 1 and NGrp > 1:
+            NGrp, dNTot = mls.delete_group(groupMat, NGrp, grpIdx, grSizeVec,
+                                           indvTree, fisTree, extTree, sizeTree, *par, coopPart)
+        else:
+            groupMat[rng.integers(2 * NType), grpIdx] += 1
+            dNTot = mls.update_group_rates(indvTree, fisTree, extTree, sizeTree, groupMat,
+                                           grSizeVec, grpIdx, *par, coopPart)
+        NTot += dNTot
+
+    recount = mls.init_rate_trees(groupMat, NGrp, *par)
+    assert NTot == recount[1] == groupMat.sum()
+    assert (groupMat[:, NGrp:] == 0).all()
+    for current, fresh in zip((grSizeVec, indvTree, fisTree, extTree, sizeTree),
+                              recount[0:1] + recount[2:]):
+        assert np.allclose(current, fresh, rtol=1e-12, atol=1e-12)
+
+
+def test_main_indv_rates_match_definition():
+    rng = np.random.default_rng(3)
+    NType, NGrp, grpCap = 3, 12, 16
+    birthRVec = np.linspace(0.9, 1.2, 2 * NType)
+    deathR, delta_indv = 0.01, 0.5
+    groupMat = random_groups(rng, NType, NGrp, grpCap)
+    grSizeVec, _, indvTree, _, _, _ = \
+        mls.init_rate_trees(groupMat, NGrp, birthRVec, deathR, delta_indv, 0.01, 0.02, 50., 1.)
+
+    # birth rate scales with product of cooperator densities of all other types
+    density = groupMat[0::2, :] / np.maximum(groupMat.sum(0), 1)
+    rates = np.zeros((4 * NType, grpCap))
+    for tt in range(NType):
+        coopPart = np.prod(np.delete(density, tt, axis=0), axis=0)
+        for cellType in (2 * tt, 2 * tt + 1):
+            rates[cellType] = birthRVec[cellType] * coopPart * groupMat[cellType]
+            rates[cellType + 2 * NType] = deathR * groupMat[cellType] * grSizeVec ** delta_indv
+    assert np.allclose(util.sumtree_leafs(indvTree, rates.size), rates.ravel(), rtol=1e-12, atol=0)
+
+    # work buffer is reused between groups, so fill it with garbage first
+    coopPart = np.full(NType, 7.)
+    for grpIdx in range(NGrp):
+        mls.calc_coop_part(coopPart, groupMat, grpIdx, grSizeVec[grpIdx], NType)
+        expected = [np.prod(np.delete(density[:, grpIdx], tt)) for tt in range(NType)]
+        assert np.allclose(coopPart, expected, rtol=1e-12, atol=0)
+
+
+def test_pichugin_rate_trees_match_recount():
+    rng = np.random.default_rng(3)
+    NGrp = 20
+    par = (20., 0.5, 1.)
+    groupMat = random_groups(rng, 1, NGrp, 32)
+    grSizeVec, NTot, indvTree, fisTree, sizeTree = pich.init_rate_trees(groupMat, NGrp, *par)
+
+    for _ in range(300):
+        grpIdx = rng.integers(NGrp)
+        if rng.random() < 0.3 and NGrp > 1:
+            NGrp, dNTot = pich.delete_group(groupMat, NGrp, grpIdx, grSizeVec,
+                                            indvTree, fisTree, sizeTree, *par)
+        else:
+            groupMat[rng.integers(2), grpIdx] += 1
+            dNTot = pich.update_group_rates(indvTree, fisTree, sizeTree, groupMat,
+                                            grSizeVec, grpIdx, *par)
+        NTot += dNTot
+
+    recount = pich.init_rate_trees(groupMat, NGrp, *par)
+    assert NTot == recount[1] == groupMat.sum()
+    for current, fresh in zip((grSizeVec, indvTree, fisTree, sizeTree),
+                              recount[0:1] + recount[2:]):
+        assert np.allclose(current, fresh, rtol=1e-12, atol=1e-12)
+
+
+def test_pichugin_run_model_reproducible():
+    model_par = {"maxT": 50, "maxPopSize": 2000, "sampleInt": 0.05, "mav_window": 1, "rms_window": 1,
+                 "init_groupNum": 10, "init_fCoop": 1, "init_groupDens": 5, "indv_NType": 1, 
+                 "indv_mutR": 0.01, "indv_migrR": 0.1, "indv_K": 20, 'gr_CFis': 1, 'alpha_b': 0.5,
+                 'offspr_size': 0.1, 'offspr_frac': 0.5, 'seed': 5}
+    output1 = pich.run_model(model_par)
+    output2 = pich.run_model(model_par)
+    assert np.array_equal(output1['NTot'], output2['NTot'])
+    assert output1['NTot'][-1] > model_par['maxPopSize']
+
+
+def test_evolve_groups_match_trait_histogram(monkeypatch):
+    model_par = {"maxT": 10, "maxPopSize": 0, "minT": 10, "sampleInt": 0.1, "mav_window": 5, 
+                 "rms_window": 5, "init_groupNum": 20, "init_fCoop": 1, "init_groupDens": 20,
+                 "indv_NType": 2, "indv_asymmetry": 1, "indv_cost": 0.01, "indv_migrR": 0.5,
+                 'mutR_type': 1E-3, 'mutR_size': 5E-2, 'mutR_frac': 5E-2, "indv_K": 100, 
+                 "delta_indv": 1, 'gr_CFis': 1/100, 'gr_SFis': 4, 'alpha_Fis': 1, 'indv_tau': 0.1, 
+                 'delta_grp': 0, 'K_grp': 0, 'delta_tot': 1, 'K_tot': 500, 'delta_size': 1, 
+                 'offspr_sizeInit': 0.3, 'offspr_fracInit': 0.5, 'seed': 3}
+
+    # check live groups passed to sampling against trait histogram
+    sample_model = evo.sample_model
+    numSample = [0]
+    def checked_sample_model(traitHist, margFrac, margSize, grpMat2D, *args):
+        assert (grpMat2D.sum(0) > 0).all()
+        assert traitHist.sum() == grpMat2D.sum() == margFrac.sum() == margSize.sum()
+        numSample[0] += 1
+        return sample_model(traitHist, margFrac, margSize, grpMat2D, *args)
+    monkeypatch.setattr(evo, 'sample_model', checked_sample_model)
+
+    outputMat, _ = evo.run_model(model_par)
+    assert numSample[0] == outputMat.size
+    NTot = outputMat['N0'] + outputMat['N0mut'] + outputMat['N1'] + outputMat['N1mut']
+    assert np.array_equal(NTot, outputMat['NTot'])
+
+
+def test_evolve_groups_rate_trees_kept_between_samples():
+    model_par = {"maxT": 10, "indv_NType": 2, "indv_asymmetry": 1, "indv_cost": 0.01, 
+                 "init_groupNum": 20, "init_fCoop": 1, "init_groupDens": 20, 'indv_K': 100,
+                 'offspr_sizeInit': 0.3, 'offspr_fracInit': 0.5}
+    par = (util.create_rng(3),)
+    _, birthRVec, deathR = mls.adjust_indv_rates(model_par)
+    traitMat, grpMat = evog.init_traitMat(model_par)
+    traitHist, margFrac, margSize = evog.init_trait_hist(traitMat)
+    NGrp = grpMat.shape[1]
+    grpMat = mls.grow_groupMat(grpMat, NGrp, 2 * NGrp)
+    traitMat = evog.grow_traitMat(traitMat, NGrp, grpMat.shape[1])
+    ratePar = (birthRVec, deathR, 1., 0.01, 0.02, 100., 1.)
+    rateTrees = mls.init_rate_trees(grpMat, NGrp, *ratePar)
+
+    # run loop in short steps, trees are passed from one step to the next
+    currT = 0.
+    for sampleIdx in range(1, 40):
+        grpMat, traitMat, NGrp, currT, *rateTrees = evog.run_event_loop(
+            grpMat, traitMat, NGrp, *par, traitHist, margFrac, margSize,
+            *rateTrees, currT, 0.25 * sampleIdx, 10.,
+            birthRVec, deathR, 1., 0.1, 0.5, 1E-3, 5E-2, 5E-2,
+            0.01, 0.02, 0., 500., 100., 0., 1., 1.)
+        if NGrp == 0:
+            break
+
+        recount = mls.init_rate_trees(grpMat, NGrp, *ratePar)
+        assert rateTrees[1] == recount[1] == grpMat.sum()
+        for current, fresh in zip(rateTrees[0:1] + rateTrees[2:], recount[0:1] + recount[2:]):
+            assert np.allclose(current, fresh, rtol=1e-12, atol=1e-12)
+        histRecount = evog.init_trait_hist(traitMat[:, 0:NGrp].copy())
+        for current, fresh in zip((traitHist, margFrac, margSize), histRecount):
+            assert np.array_equal(current, fresh)
+    assert sampleIdx > 10
@@ -0,0 +1,98 @@
+"""
+Tests of on-disk result cache
+
+Cache keys should change with everything that changes the result, and only then
+"""
+
+import os
+import numpy as np
+import pytest
+from mainCode import MlsGroupDynamics_utilities as util
+
+
+model_par = {"maxT": 10, "indv_K": 100, "indv_NType": 2, "gr_SFis": 4.,
+             "run_idx": 1, "replicate_idx": 1, "master_seed": 11}
+moduleName = util.__name__
+
+
+def get_key(model_par_local, funcName='run_model_steadyState_fig'):
+    return util.get_cache_key(funcName, moduleName, model_par_local)
+
+
+def test_cache_key_is_stable():
+    key = get_key(model_par)
+    assert key == get_key(model_par.copy())
+    # key order and numeric type of parameters do not matter
+    reordered = dict(reversed(list(model_par.items())))
+    reordered['indv_K'] = 100.
+    reordered['gr_SFis'] = 4
+    assert key == get_key(reordered)
+
+
+@pytest.mark.parametrize('changedPar', [{'indv_K': 101}, {'replicate_idx': 2}, {'run_idx': 2},
+                                        {'master_seed': 12}, {'seed': 11},
+                                        {'final_state_only': True}, {'stop_rule': 'batchmeans'}])
+def test_cache_key_changes_with_result(changedPar):
+    model_par_local = model_par.copy()
+    model_par_local.update(changedPar)
+    assert get_key(model_par_local) != get_key(model_par)
+
+
+def test_cache_key_hashes_array_content():
+    # str() of large array only shows its ends
+    arr = np.arange(2000.)
+    changed = arr.copy()
+    changed[1000] = -1
+    key = get_key(dict(model_par, traitDistr=arr))
+    assert key == get_key(dict(model_par, traitDistr=arr.copy()))
+    assert key != get_key(dict(model_par, traitDistr=changed))
+    assert key != get_key(dict(model_par, traitDistr=arr.reshape(40, 50)))
+    assert key != get_key(dict(model_par, traitDistr=arr.astype(np.float32)))
+
+
+def test_cache_key_changes_with_function_and_engine(monkeypatch):
+    key = get_key(model_par)
+    assert get_key(model_par, 'single_run_finalstate') != key
+    monkeypatch.setitem(util._engineVersion, moduleName, 'changed source')
+    assert get_key(model_par) != key
+
+
+def test_no_cache_key_for_irreproducible_runs():
+    model_par_local = model_par.copy()
+    del model_par_local['master_seed']
+    assert get_key(model_par_local) is None
+    model_par_local = model_par.copy()
+    model_par_local['maxRunTime'] = 60
+    assert get_key(model_par_local) is None
+
+
+def test_result_cache_reuses_result(tmp_path, monkeypatch):
+    numCall = [0]
+    def run(model_par):
+        numCall[0] += 1
+        return {'NTot': model_par['indv_K'], 'call': numCall[0]}
+    run.__module__ = moduleName
+    cachedRun = util.result_cache(run)
+
+    # cache is off without MLS_CACHE_DIR
+    monkeypatch.delenv(util.CACHE_DIR_VAR, raising=False)
+    cachedRun(model_par)
+    assert numCall[0] == 1
+
+    monkeypatch.setenv(util.CACHE_DIR_VAR, str(tmp_path))
+    monkeypatch.setenv(util.CACHE_SIZE_VAR, '1')
+    result = cachedRun(model_par)
+    assert cachedRun(model_par) == result
+    assert numCall[0] == 2
+    cachedRun(dict(model_par, indv_K=200))
+    assert numCall[0] == 3
+    assert len(list(tmp_path.glob('*.pkl'))) == 2
+
+
+def test_prune_cache_removes_least_recently_used(tmp_path):
+    for idx in range(4):
+        filePath = tmp_path / ('%i.pkl' % idx)
+        filePath.write_bytes(bytes(100))
+        os.utime(filePath, (idx, idx))
+    util.prune_cache(tmp_path, 250)
+    assert sorted(x.name for x in tmp_path.glob('*.pkl')) == ['2.pkl', '3.pkl']
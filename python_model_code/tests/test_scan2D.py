@@ -0,0 +1,69 @@
+"""
+Tests of adaptive refinement of 2D parameter scan
+
+Points are only interpolated from cells whose corners are all simulated,
+and never across corners with different extinction status
+"""
+
+import numpy as np
+from exploreModelCode import MlsGroupDynamics_scan2D as scan
+
+
+def fake_result(NTot, offspr_size=0., offspr_frac=0.):
+    dType = np.dtype([('NTot', 'f8'), ('NTot_mav', 'f8'), ('fCoop_mav', 'f8'),
+                      ('offspr_size', 'f8'), ('offspr_frac', 'f8'), ('indv_K', 'f8'),
+                      ('run_time', 'f8')])
+    output = np.zeros(1, dType)
+    output['NTot'] = output['NTot_mav'] = NTot
+    output['offspr_size'] = offspr_size
+    output['offspr_frac'] = offspr_frac
+    output['indv_K'] = 100
+    output['run_time'] = 1
+    return (output, np.full(3, float(NTot)), np.full(2, float(NTot)))
+
+
+def test_interpolate_cell_averages_simulated_corners():
+    isValid = np.ones((3, 3), dtype=bool)
+    results = {corner: fake_result(100 * (corner[0] + corner[1]) + 100)
+               for corner in [(0, 0), (0, 2), (2, 0), (2, 2)]}
+    model_par = {'indv_K': 100}
+    interp = scan.interpolate_cell((0, 2, 0, 2), isValid, results, model_par,
+                                   np.arange(3.), np.arange(3.))
+    output, distFCoop, _ = interp[(1, 1)]
+    assert output['NTot'] == 300
+    assert np.all(distFCoop == 300)
+    assert output['offspr_size'] == 1 and output['offspr_frac'] == 1
+    assert output['indv_K'] == 100
+    assert np.isnan(output['run_time'])
+    assert len(interp) == 5
+
+
+def test_interpolate_cell_does_not_mix_extinction_or_missing_corners():
+    isValid = np.ones((3, 3), dtype=bool)
+    model_par = {'indv_K': 100}
+    # one corner extinct
+    results = {corner: fake_result(0 if corner == (2, 2) else 100)
+               for corner in [(0, 0), (0, 2), (2, 0), (2, 2)]}
+    interp = scan.interpolate_cell((0, 2, 0, 2), isValid, results, model_par,
+                                   np.arange(3.), np.arange(3.))
+    assert np.isnan(interp[(1, 1)][0]['NTot'])
+    assert np.isnan(interp[(1, 1)][1]).all()
+    assert interp[(1, 1)][0]['indv_K'] == 100
+    # edge point away from extinct corner only uses its own edge
+    assert interp[(0, 1)][0]['NTot'] == 100
+    # missing corner is not replaced by other corners
+    del results[(2, 2)]
+    interp = scan.interpolate_cell((0, 2, 0, 2), isValid, results, model_par,
+                                   np.arange(3.), np.arange(3.))
+    assert np.isnan(interp[(1, 1)][0]['NTot'])
+    assert interp[(1, 0)][0]['NTot'] == 100
+
+
+def test_cell_with_invalid_corner_is_refined():
+    isValid = np.ones((3, 3), dtype=bool)
+    isValid[2, 2] = False
+    results = {corner: fake_result(100) for corner in [(0, 0), (0, 2), (2, 0)]}
+    assert scan.needs_refinement((0, 2, 0, 2), isValid, results, {'NTot_mav': 500})
+    isValid[2, 2] = True
+    results[(2, 2)] = fake_result(100)
+    assert not scan.needs_refinement((0, 2, 0, 2), isValid, results, {'NTot_mav': 500})
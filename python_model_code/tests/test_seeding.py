@@ -0,0 +1,116 @@
+"""
+Tests of seeding and reproducibility of runs and replicates
+
+Runs with same seed should give identical results, different replicates
+and different points of a parameter scan should use different random numbers
+"""
+
+import numpy as np
+import pytest
+from numba import njit
+from mainCode import MlsGroupDynamics_utilities as util
+from mainCode import MlsGroupDynamics_main as mls
+
+
+def model_par_main(**settings):
+    model_par = {
+        "maxT": 5, "maxPopSize": 1E9, "minT": 1, "sampleInt": 1,
+        "mav_window": 1, "rms_window": 1, "rms_err_trNCoop": 0, "rms_err_trNGr": 0,
+        "init_groupNum": 20, "init_fCoop": 1, "init_groupDens": 20,
+        "indv_NType": 2, "indv_asymmetry": 1, "indv_cost": 0.01, "indv_mutR": 1E-3,
+        "indv_migrR": 0.01, "indv_K": 50, "delta_indv": 1,
+        'gr_CFis': 0.05, 'gr_SFis': 0, 'grp_tau': 1,
+        'delta_grp': 0, 'K_grp': 0, 'delta_tot': 1, 'K_tot': 1000, 'delta_size': 0,
+        'offspr_size': 0.1, 'offspr_frac': 0.5}
+    model_par.update(settings)
+    return model_par
+
+
+def test_rng_reproducible_and_seed_dependent():
+    draws = []
+    for seed in (1, 1, 2):
+        rngState = util.create_rng(seed)
+        rand = np.empty(10)
+        util.fill_rand(rngState, rand)
+        draws.append(rand)
+    assert np.array_equal(draws[0], draws[1])
+    assert not np.array_equal(draws[0], draws[2])
+    assert ((draws[0] > 0) & (draws[0] < 1)).all()
+
+
+def test_rand_uniform_open_interval():
+    rngState = util.create_rng(1)
+    # fill output buffer of generator with extreme words
+    for word, isHigh in ((0xFFFFFFFF, True), (0, False)):
+        rngState[6:10] = word
+        rngState[10] = 0
+        for _ in range(2):
+            rand = util.rand_uniform(rngState)
+            assert 0 < rand < 1
+            assert (rand > 0.5) == isHigh
+
+
+def test_run_seed_depends_on_run_replicate_and_parameters():
+    model_par = model_par_main(master_seed=5, run_idx=1, replicate_idx=1)
+    states = [util.create_rng(util.get_run_seed(util.set_model_par(model_par, settings)))
+              for settings in ({}, {}, {'replicate_idx': 2}, {'run_idx': 2}, {'indv_cost': 0.02})]
+    assert np.array_equal(states[0], states[1])
+    for state in states[2:]:
+        assert not np.array_equal(states[0], state)
+
+
+def test_common_random_shares_seed_between_parameters():
+    model_par = model_par_main(master_seed=5, replicate_idx=1, common_random=True)
+    numStream = util.get_num_stream(model_par)
+    state1 = util.create_rng(util.get_run_seed(model_par), numStream)
+    state2 = util.create_rng(util.get_run_seed(util.set_model_par(model_par, {'indv_cost': 0.02})),
+                             numStream)
+    state3 = util.create_rng(util.get_run_seed(util.set_model_par(model_par, {'replicate_idx': 2})),
+                             numStream)
+    assert np.array_equal(state1, state2)
+    assert not np.array_equal(state1, state3)
+
+
+def test_ensemble_replicates_differ_with_seed():
+    output = mls.run_model_ensemble(model_par_main(seed=3), 3)[0]
+    for rr in range(1, 3):
+        assert not np.array_equal(output['NTot'][0], output['NTot'][rr], equal_nan=True)
+
+
+def test_ensemble_reproducible_with_seed():
+    output1, _, _, grSize1, _, _ = mls.run_model_ensemble(model_par_main(seed=3), 3)
+    output2, _, _, grSize2, _, _ = mls.run_model_ensemble(model_par_main(seed=3), 3)
+    assert np.array_equal(output1['NTot'], output2['NTot'], equal_nan=True)
+    for size1, size2 in zip(grSize1, grSize2):
+        assert np.array_equal(size1, size2)
+
+
+def test_ensemble_replicate_matches_run_model():
+    model_par = model_par_main(master_seed=5)
+    output, _, _, grSizeList, _, nSampleVec = mls.run_model_ensemble(model_par, 2)
+    for rr in range(2):
+        outputRun, _, _, grSizeVec, _ = \
+            mls.run_model(util.set_model_par(model_par, {'replicate_idx': rr + 1}))
+        assert nSampleVec[rr] == outputRun.size
+        assert np.array_equal(output['NTot'][rr, 0:nSampleVec[rr]], outputRun['NTot'])
+        assert np.array_equal(grSizeList[rr], grSizeVec)
+
+
+@njit
+def seed_numba_rng(seed):
+    np.random.seed(seed)
+
+
+@pytest.mark.parametrize('engine', ['direct', 'tauleap'])
+@pytest.mark.parametrize('common_random', [False, True])
+def test_run_only_depends_on_run_seed(engine, common_random):
+    # fission splits and leaps draw from run stream, not from numpy generator of compiled code
+    model_par = model_par_main(seed=4, engine=engine, common_random=common_random,
+                               indv_K=200, tau_minSize=20)
+    outputs = []
+    for numbaSeed in (1, 2):
+        seed_numba_rng(numbaSeed)
+        output, _, _, grSizeVec, _ = mls.run_model(model_par)
+        outputs.append((output['NTot'], grSizeVec))
+    assert np.array_equal(outputs[0][0], outputs[1][0], equal_nan=True)
+    assert np.array_equal(outputs[0][1], outputs[1][1])
@@ -0,0 +1,68 @@
+"""
+Tests of statistical stopping rule of main model
+
+Run should stop once mean is estimated with requested precision,
+and stopping should not change the random numbers of a run
+"""
+
+import numpy as np
+from scipy import stats
+from mainCode import MlsGroupDynamics_main as mls
+
+
+stop_nBatch = 20
+stop_tQuant = float(stats.t.ppf(0.975, stop_nBatch - 1))
+
+
+# store batch means of samples of NTot, fCoop and NGrp as run does
+def get_stopStat(samples):
+    nBatch5 = samples.shape[0] // 5
+    stopStat = np.zeros((nBatch5 + 1, 3))
+    stopStat[1:, :] = samples[:nBatch5 * 5, :].reshape(nBatch5, 5, 3).mean(1)
+    return stopStat, nBatch5
+
+
+def test_batch_means_stop_on_stationary_samples():
+    rng = np.random.default_rng(3)
+    samples = 100 + rng.normal(size=(1000, 3))
+    stopStat, nBatch5 = get_stopStat(samples)
+    assert mls.check_batch_means(stopStat, nBatch5, 0.01, stop_nBatch, stop_tQuant)
+    # too noisy for requested precision
+    assert not mls.check_batch_means(stopStat, nBatch5, 1E-4, stop_nBatch, stop_tQuant)
+
+
+def test_batch_means_wait_for_end_of_warmup():
+    rng = np.random.default_rng(3)
+    samples = 100 + rng.normal(size=(1000, 3))
+    # samples still increase, truncation point is at end of searched range
+    samples += np.linspace(0, 50, 1000)[:, None]
+    stopStat, nBatch5 = get_stopStat(samples)
+    assert not mls.check_batch_means(stopStat, nBatch5, 0.01, stop_nBatch, stop_tQuant)
+    # warm-up is removed
+    samples[500:, :] = 100 + rng.normal(size=(500, 3))
+    samples[:500, :] = np.linspace(0, 100, 500)[:, None]
+    stopStat, nBatch5 = get_stopStat(samples)
+    assert mls.check_batch_means(stopStat, nBatch5, 0.01, stop_nBatch, stop_tQuant)
+
+
+def test_batchmeans_stops_early_with_same_random_numbers():
+    model_par = {
+        "maxT": 200, "maxPopSize": 1E9, "minT": 10, "sampleInt": 0.1,
+        "mav_window": 1, "rms_window": 1, "rms_err_trNCoop": 0, "rms_err_trNGr": 0,
+        "init_groupNum": 40, "init_fCoop": 1, "init_groupDens": 50,
+        "indv_NType": 1, "indv_asymmetry": 1, "indv_cost": 0.01, "indv_mutR": 0,
+        "indv_migrR": 0, "indv_K": 50, "delta_indv": 1,
+        'gr_CFis': 0, 'gr_SFis': 0, 'grp_tau': 0,
+        'delta_grp': 0, 'K_grp': 0, 'delta_tot': 0, 'K_tot': 1, 'delta_size': 0,
+        'offspr_size': 0.1, 'offspr_frac': 0.5, 'seed': 1}
+    # rms thresholds are zero, so rms rule runs till maxT
+    outputRms = mls.run_model(model_par)[0]
+    model_par['stop_rule'] = 'batchmeans'
+    outputBm = mls.run_model(model_par)[0]
+    assert np.array_equal(outputBm['NTot'], mls.run_model(model_par)[0]['NTot'], equal_nan=True)
+
+    # output ends at last sample, and equals first samples of run till maxT
+    numSample = outputBm.size
+    assert model_par['minT'] < outputBm['time'][-1] < model_par['maxT'] / 2
+    assert np.array_equal(outputBm['time'], outputRms['time'][:numSample])
+    assert np.array_equal(outputBm['NTot'], outputRms['NTot'][:numSample])
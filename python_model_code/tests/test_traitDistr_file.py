@@ -0,0 +1,44 @@
+"""
+Tests of streaming trait distributions to .npz file
+
+Frames read back from file should equal stored frames up to float32 precision
+"""
+
+import numpy as np
+import pytest
+from mainCode import MlsGroupDynamics_utilities as util
+
+
+def random_frames(numFrame, shape):
+    rng = np.random.default_rng(4)
+    frames = rng.random((numFrame,) + shape)
+    frames[frames < 0.7] = 0
+    return frames / frames.sum(axis=(1, 2), keepdims=True)
+
+
+@pytest.mark.parametrize('decimate', [1, 3])
+def test_traitDistr_file_round_trip(tmp_path, monkeypatch, decimate):
+    # small chunks, so frames are spread over several chunks
+    monkeypatch.setattr(util, 'TRAITDISTR_CHUNK', 4)
+    fileName = tmp_path / 'traitDistr.npz'
+    frames = random_frames(11, (5, 7))
+    traitDistr = util.open_traitDistr_file(fileName, frames.shape[1:], decimate)
+    for sampleIdx, frame in enumerate(frames):
+        util.store_traitDistr_frame(traitDistr, sampleIdx, frame)
+    lastFrame = util.close_traitDistr(traitDistr, frames.shape[0])
+    assert np.array_equal(lastFrame[0], frames[-1])
+
+    # every decimate-th frame and last frame are stored
+    storedIdx = sorted(set(range(0, frames.shape[0], decimate)) | {frames.shape[0] - 1})
+    reader = util.load_traitDistr(fileName)
+    assert list(reader['sampleIdx']) == storedIdx
+    assert util.get_traitDistr_numFrame(reader) == len(storedIdx)
+    for frameIdx in [0, 2, -1, 1, len(storedIdx) - 2]:
+        frame = util.get_traitDistr_frame(reader, frameIdx)
+        assert np.allclose(frame, frames[storedIdx[frameIdx]], rtol=1e-6, atol=0)
+
+    with pytest.raises(ValueError, match='out of range'):
+        util.get_traitDistr_frame(reader, len(storedIdx))
+    with pytest.raises(ValueError, match='out of range'):
+        util.get_traitDistr_frame(reader, -len(storedIdx) - 1)
+    reader['file'].close()